@@ -0,0 +1,145 @@
+"""
+Admission control for the threaded server.
+
+Accepted connections go to a SessionPool: a bounded set of worker threads
+fed by a bounded queue. A connection that finds the queue full, or waits in
+it longer than max_wait, is answered with a single RESULT_BUSY frame and
+closed, so its client can fail over to another server right away instead of
+timing out. Players already admitted keep a bounded number of threads
+competing for the GIL, which keeps their latency flat under overload.
+"""
+import socket
+import threading
+import time
+from collections import deque
+import metrics
+from protocol import SERVER_FRAMES
+from utils import RESULT_BUSY
+
+POOL_WORKERS = 256      # sessions played at once
+POOL_QUEUE_SIZE = 256   # accepted connections waiting for a worker
+POOL_MAX_WAIT = 2.0     # seconds a connection may wait in the queue
+
+BUSY_FRAME = SERVER_FRAMES[RESULT_BUSY][0]
+
+ADMISSION_WAIT = metrics.REGISTRY.histogram(
+    'admission_wait_seconds', "time admitted connections waited for a session worker")
+ADMISSION_REJECTIONS = metrics.REGISTRY.labeled_counter(
+    'admission_rejections', 'reason', "connections answered with a busy frame, by reason")
+
+
+def reject(client_sock: socket.socket, reason: str):
+    """
+    Sends the busy frame and closes the connection.
+    """
+    ADMISSION_REJECTIONS.inc(reason)
+    try:
+        client_sock.setblocking(False)
+        client_sock.send(BUSY_FRAME)
+        # Half-close first so the frame is not lost to a reset when we close
+        # with the client's request still unread
+        client_sock.shutdown(socket.SHUT_WR)
+    except OSError:
+        pass
+    finally:
+        client_sock.close()
+
+
+class SessionPool:
+    """
+    Runs handler(client_sock, client_addr) on at most `workers` threads.
+
+    Threads are started on demand and then kept for later sessions. submit()
+    never blocks the accept loop: it queues the connection or rejects it, and
+    a reaper thread rejects connections queued for longer than max_wait.
+    """
+
+    def __init__(self, handler, workers: int = POOL_WORKERS,
+                 queue_size: int = POOL_QUEUE_SIZE, max_wait: float = POOL_MAX_WAIT):
+        self.handler = handler
+        self.workers = workers
+        self.queue_size = queue_size
+        self.max_wait = max_wait
+
+        self.queue = deque()  # (client_sock, client_addr, enqueued_at)
+        self.cond = threading.Condition()
+        self.threads = 0
+        self.idle = 0
+        self.busy = 0
+
+        metrics.REGISTRY.gauge('admission_queue_depth', "connections waiting for a session worker",
+                               function=self.queue_depth)
+        metrics.REGISTRY.gauge('admission_busy_workers', "session workers playing a session",
+                               function=lambda: self.busy)
+
+        threading.Thread(target=self._reaper, daemon=True).start()
+
+    def queue_depth(self) -> int:
+        return len(self.queue)
+
+    def load(self) -> tuple[int, int]:
+        """
+        (active sessions, capacity), as advertised in extended offers.
+        """
+        return self.busy, self.workers
+
+    def submit(self, client_sock: socket.socket, client_addr) -> bool:
+        """
+        Queues a connection for a worker. Returns False if it was rejected.
+        """
+        with self.cond:
+            if len(self.queue) >= self.queue_size:
+                full = True
+            else:
+                full = False
+                self.queue.append((client_sock, client_addr, time.monotonic()))
+                if len(self.queue) <= self.idle:
+                    self.cond.notify()
+                elif self.threads < self.workers:
+                    self.threads += 1
+                    threading.Thread(target=self._worker, daemon=True).start()
+
+        if full:
+            reject(client_sock, 'queue_full')
+            return False
+        return True
+
+    def expire(self) -> int:
+        """
+        Rejects the connections that have waited longer than max_wait.
+        The queue is in arrival order, so only its head needs checking.
+        """
+        deadline = time.monotonic() - self.max_wait
+        expired = []
+        with self.cond:
+            while self.queue and self.queue[0][2] < deadline:
+                expired.append(self.queue.popleft()[0])
+        for client_sock in expired:
+            reject(client_sock, 'queue_timeout')
+        return len(expired)
+
+    def _reaper(self):
+        while True:
+            time.sleep(self.max_wait / 4)
+            self.expire()
+
+    def _next(self):
+        with self.cond:
+            while not self.queue:
+                self.idle += 1
+                self.cond.wait()
+                self.idle -= 1
+            self.busy += 1
+            return self.queue.popleft()
+
+    def _worker(self):
+        while True:
+            client_sock, client_addr, enqueued_at = self._next()
+            try:
+                ADMISSION_WAIT.observe(time.monotonic() - enqueued_at)
+                self.handler(client_sock, client_addr)
+            except Exception as e:
+                print(f"Session worker error for {client_addr}: {e}")
+            finally:
+                with self.cond:
+                    self.busy -= 1
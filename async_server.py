@@ -0,0 +1,253 @@
+import argparse
+import asyncio
+import resource
+import time
+import metrics
+from functools import partial
+from game_session import GameSession, RequestParseError
+from leaderboard import LEADERBOARD
+from server import start_offer_threads
+from server import TCP_BIND_ADDR, READ_BUFFER_SIZE, ADMIN_PORT, METRICS_SNAPSHOT_PATH, METRICS_SNAPSHOT_INTERVAL
+from server import ROUND_LOG_PATH, open_round_log
+from roundlog import RoundLog, RoundLogLocked
+from rng import SHOE_POOL, master_seed_arg
+from capture import CaptureWriter
+from server import CONNECTIONS_ACCEPTED, SESSIONS_ACTIVE, ROUNDS_PLAYED
+from server import DECISION_LATENCY, DISCONNECTS
+from server import SessionDeadline, TIMEOUT_FRAME
+from admission import BUSY_FRAME, ADMISSION_REJECTIONS
+from timerwheel import TIMERS
+from tracing import TRACER, TRACE_SAMPLE_RATE, SESSION, RECV_WAIT, SEND
+
+ASYNC_LISTEN_BACKLOG = 4096  # a single event loop can absorb large connect bursts
+ASYNC_FD_RESERVE = 64        # descriptors kept for listeners, logs and admin connections
+
+
+def raise_fd_limit() -> int:
+    """
+    Raises the soft open-files limit to the hard limit and returns it.
+    Every session is one socket, so 10k+ players need more than the usual 1024.
+    """
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    if soft < hard:
+        resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+        soft = hard
+    return soft
+
+
+class SessionLimit:
+    """
+    Sessions playing on the event loop, and the most the server takes; by
+    default as many as the open-files limit leaves sockets for. Connections
+    beyond it are answered with a busy frame, as the threaded server's
+    SessionPool does, and load() is what the extended offers advertise.
+    """
+
+    def __init__(self, capacity: int = None):
+        if capacity is None:
+            capacity = max(1, raise_fd_limit() - ASYNC_FD_RESERVE)
+        self.capacity = capacity
+        self.active = 0
+
+    def load(self) -> tuple[int, int]:
+        """
+        (active sessions, capacity), as advertised in extended offers.
+        """
+        return self.active, self.capacity
+
+
+def time_out(writer: asyncio.StreamWriter):
+    """
+    Sends the timeout frame and closes the connection, which ends the
+    session's pending read.
+    """
+    writer.write(TIMEOUT_FRAME)
+    writer.close()
+
+
+async def game_loop(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                    round_log: RoundLog = None, capture: CaptureWriter = None):
+    """
+    Coroutine version of server.game_loop, driving the same GameSession:
+    every wait yields to the event loop instead of blocking a thread.
+    Deadlines are the same SessionDeadline, expired by the wheel's task on
+    this loop, and sampled sessions get the same tracing spans.
+
+    Returns True if all rounds were played, False if the client left mid-round.
+    """
+    def round_finished(result: int):
+        ROUNDS_PLAYED.inc()
+        LEADERBOARD.record(session.team_name, result)
+
+    session_start = time.perf_counter()
+    session_id, shoe = SHOE_POOL.take()
+    trace = TRACER.session(session_id)
+    session = GameSession(shoe, round_finished, round_log=round_log, session_id=session_id,
+                          trace=trace)
+    recorder = capture.session(session_id) if capture else None
+    deadline = SessionDeadline(session, partial(time_out, writer))
+    wait_start = None
+
+    try:
+        deadline.update()
+        while True:
+            read_start = time.perf_counter() if trace else 0.0
+            try:
+                data = await reader.read(READ_BUFFER_SIZE)
+            except ConnectionResetError:
+                data = b''
+            if not data:
+                if deadline.expired:
+                    raise asyncio.TimeoutError(f"no {deadline.expired} in time")
+                return session.connection_closed()
+            if trace:
+                trace.add(RECV_WAIT, read_start)
+            if recorder:
+                recorder.received(data)
+
+            decisions = session.decisions
+            frames = session.receive(data)
+            if wait_start is not None and session.decisions != decisions:
+                DECISION_LATENCY.observe(time.perf_counter() - wait_start)
+
+            if frames:
+                # Frames of one batch go out together before we wait again
+                send_start = time.perf_counter() if trace else 0.0
+                writer.writelines(frames)
+                try:
+                    await writer.drain()
+                except (BrokenPipeError, ConnectionResetError):
+                    print(f"Client '{session.team_name}' disconnected mid-round")
+                    return False
+                if trace:
+                    trace.add(SEND, send_start)
+                if recorder:
+                    recorder.sent(frames)
+
+            wait_start = time.perf_counter() if session.state == GameSession.WAIT_DECISION else None
+            deadline.update()
+    finally:
+        deadline.cancel()
+        if recorder:
+            recorder.closed()
+        if trace:
+            trace.add(SESSION, session_start)
+
+
+async def client_handler(reader: asyncio.StreamReader, writer: asyncio.StreamWriter,
+                         round_log: RoundLog = None, capture: CaptureWriter = None,
+                         limit: SessionLimit = None):
+    client_addr = writer.get_extra_info('peername')
+    CONNECTIONS_ACCEPTED.inc()
+    if limit and limit.active >= limit.capacity:
+        ADMISSION_REJECTIONS.inc('capacity')
+        writer.write(BUSY_FRAME)
+        writer.close()
+        return
+
+    print(f"New client connected from {client_addr}")
+    SESSIONS_ACTIVE.inc()
+    if limit:
+        limit.active += 1
+    try:
+        if await game_loop(reader, writer, round_log, capture):
+            DISCONNECTS.inc('completed')
+        else:
+            DISCONNECTS.inc('mid_round')
+
+    except asyncio.TimeoutError as e:
+        DISCONNECTS.inc('timeout')
+        print(f"Client {client_addr} timed out: {e}")
+
+    except ConnectionError:
+        DISCONNECTS.inc('disconnected')
+        print(f"Client {client_addr} disconnected")
+
+    except RequestParseError as e:
+        DISCONNECTS.inc('bad_request')
+        print(f"Error with client {client_addr}: {e}")
+
+    except Exception as e:
+        DISCONNECTS.inc('error')
+        print(f"Error with client {client_addr}: {e}")
+
+    finally:
+        SESSIONS_ACTIVE.dec()
+        if limit:
+            limit.active -= 1
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except (ConnectionError, OSError):
+            pass
+
+
+async def serve(tcp_port: int, round_log: RoundLog = None, capture: CaptureWriter = None,
+                backlog: int = ASYNC_LISTEN_BACKLOG, limit: SessionLimit = None):
+    """
+    Accepts TCP connections on a single event loop; every client is a task,
+    not a thread. asyncio already sets TCP_NODELAY on accepted sockets, which
+    is what we want since frames are coalesced per phase with writelines.
+    """
+    raise_fd_limit()
+    limit = limit or SessionLimit()
+    timers = asyncio.create_task(TIMERS.run())  # held so the task is not garbage collected
+    server = await asyncio.start_server(
+        partial(client_handler, round_log=round_log, capture=capture, limit=limit),
+        host=TCP_BIND_ADDR or None,
+        port=tcp_port,
+        backlog=backlog,
+        reuse_address=True
+    )
+
+    print(f"TCP server (asyncio) listening on port {tcp_port}, up to {limit.capacity} sessions")
+
+    async with server:
+        await server.serve_forever()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="asyncio blackjack server")
+    parser.add_argument('--port', type=int, default=2048)
+    parser.add_argument('--name', default="Chauncey Billups")
+    parser.add_argument('--backlog', type=int, default=ASYNC_LISTEN_BACKLOG)
+    parser.add_argument('--capacity', type=int,
+                        help="sessions played at once, advertised in offers "
+                             f"(default: the open-files limit less {ASYNC_FD_RESERVE})")
+    parser.add_argument('--admin-port', type=int, default=ADMIN_PORT,
+                        help="local metrics port (see metrics.py); 0 disables it")
+    parser.add_argument('--round-log', default=ROUND_LOG_PATH,
+                        help="binary log of every round, {port} is replaced by --port; empty to disable")
+    parser.add_argument('--seed', type=master_seed_arg,
+                        help="master seed of the session shuffles (default: random, printed)")
+    parser.add_argument('--capture', metavar='PATH',
+                        help="record every session's bytes to this file, for replay.py")
+    parser.add_argument('--trace', action='store_true',
+                        help="start with tracing on; SIGUSR1 toggles it, SIGUSR2 writes the trace")
+    parser.add_argument('--trace-sample', type=float, default=TRACE_SAMPLE_RATE,
+                        help="share of sessions traced")
+    args = parser.parse_args()
+
+    TRACER.sample_rate = args.trace_sample
+    TRACER.enabled = args.trace
+    TRACER.install_signals()
+
+    SHOE_POOL.start(args.seed)
+    try:
+        round_log = open_round_log(args.round_log, args.port)
+    except RoundLogLocked as e:
+        parser.error(str(e))
+    capture = CaptureWriter(args.capture, SHOE_POOL.master_seed) if args.capture else None
+
+    # UDP offers (broadcast and probe answers) stay on their own threads,
+    # the event loop only serves TCP
+    limit = SessionLimit(args.capacity)
+    start_offer_threads(args.port, args.name, limit.load)
+
+    metrics.start_metrics_threads(args.admin_port, METRICS_SNAPSHOT_PATH, METRICS_SNAPSHOT_INTERVAL)
+    LEADERBOARD.start()
+
+    try:
+        asyncio.run(serve(args.port, round_log, capture, args.backlog, limit))
+    except KeyboardInterrupt:
+        print("\nTCP server shutting down.")
@@ -0,0 +1,96 @@
+"""
+Per-round allocations and per-session memory of the card representation.
+
+Compares the old scheme (a new 52-object dataclass deck shuffled every
+round) with the integer-encoded long-lived Shoe from cards.py.
+
+Run from the repo root:
+    python -m benchmarks.bench_cards
+"""
+import random
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass
+
+from cards import RANKS, SUITS, Shoe, card_value, SHOE_DECKS, SHOE_PENETRATION
+
+ROUNDS = 20_000
+
+
+# ---- Old representation, kept here only as the comparison baseline ----
+@dataclass
+class LegacyCard:
+    rank: int
+    suit: int
+
+
+class LegacyDeck:
+    def __init__(self):
+        self.cards = [LegacyCard(r, s) for r in RANKS for s in SUITS]
+        random.shuffle(self.cards)
+
+    def draw(self):
+        return self.cards.pop()
+
+
+def legacy_value(card: LegacyCard) -> int:
+    return 10 if card.rank >= 11 else card.rank
+
+
+def legacy_round(_session):
+    deck = LegacyDeck()
+    hand = [deck.draw() for _ in range(6)]
+    return sum(legacy_value(c) for c in hand)
+
+
+def shoe_round(shoe: Shoe):
+    shoe.start_round()
+    hand = [shoe.draw() for _ in range(6)]
+    return sum(card_value(c) for c in hand)
+
+
+def measure(play_round, session) -> tuple[int, float]:
+    """
+    Returns (peak bytes allocated during one round, us per round).
+    """
+    play_round(session)  # warm up
+
+    tracemalloc.start()
+    baseline, _ = tracemalloc.get_traced_memory()
+    tracemalloc.reset_peak()
+    play_round(session)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    for _ in range(ROUNDS):
+        play_round(session)
+    per_round_us = (time.perf_counter() - start) / ROUNDS * 1e6
+    return peak - baseline, per_round_us
+
+
+def session_bytes(obj) -> int:
+    """
+    Memory held by a session's deck object between rounds.
+    """
+    if isinstance(obj, LegacyDeck):
+        return (sys.getsizeof(obj) + sys.getsizeof(obj.__dict__) + sys.getsizeof(obj.cards)
+                + sum(sys.getsizeof(c) + sys.getsizeof(c.__dict__) for c in obj.cards))
+    return sys.getsizeof(obj) + sys.getsizeof(obj.__dict__) + sys.getsizeof(obj.cards)
+
+
+def main():
+    shoe = Shoe(SHOE_DECKS, SHOE_PENETRATION)
+    rows = [
+        ('legacy Deck per round', measure(legacy_round, None), session_bytes(LegacyDeck())),
+        (f'Shoe({SHOE_DECKS} decks)', measure(shoe_round, shoe), session_bytes(shoe)),
+    ]
+
+    print(f"{'scheme':<24} {'peak bytes/round':>17} {'us/round':>9} {'session bytes':>14}")
+    for name, (peak, us), held in rows:
+        print(f"{name:<24} {peak:>17} {us:>9.2f} {held:>14}")
+
+
+if __name__ == "__main__":
+    main()
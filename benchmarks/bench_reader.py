@@ -0,0 +1,112 @@
+"""
+Recv calls, allocations and time to read one session's client traffic.
+
+The client side of a session (request, newline, N decisions) is written into
+a socketpair up front, as it piles up in the socket buffer on a loaded server,
+and then read back by the old recv_exact loop and by server.ConnectionReader,
+which hands whatever arrived to the GameSession in one piece.
+
+Run from the repo root:
+    python -m benchmarks.bench_reader
+"""
+import socket
+import struct
+import time
+import tracemalloc
+
+from server import ConnectionReader
+from protocol import REQUEST_SIZE, CLIENT_PAYLOAD_SIZE
+from utils import MAGIC_COOKIE, MSG_TYPE_REQUEST, MSG_TYPE_PAYLOAD, CMD_HIT
+
+DECISIONS = 200
+SESSIONS = 200
+
+
+class CountingSocket:
+    """
+    Wraps a socket and counts recv/recv_into calls.
+    """
+    def __init__(self, sock):
+        self.sock = sock
+        self.calls = 0
+
+    def recv(self, n):
+        self.calls += 1
+        return self.sock.recv(n)
+
+    def recv_into(self, buf):
+        self.calls += 1
+        return self.sock.recv_into(buf)
+
+
+# ---- Old read path, kept here only as the comparison baseline ----
+def legacy_recv_exact(sock, n: int) -> bytes:
+    data = b''
+    while len(data) < n:
+        chunk = sock.recv(n - len(data))
+        if not chunk:
+            raise ConnectionError("Client disconnected")
+        data += chunk
+    return data
+
+
+def legacy_session(sock):
+    legacy_recv_exact(sock, REQUEST_SIZE)
+    sock.recv(1)
+    for _ in range(DECISIONS):
+        legacy_recv_exact(sock, CLIENT_PAYLOAD_SIZE)
+
+
+def reader_session(sock):
+    reader = ConnectionReader(sock)
+    remaining = REQUEST_SIZE + 1 + DECISIONS * CLIENT_PAYLOAD_SIZE
+    while remaining:
+        remaining -= len(reader.read_available())
+
+
+def session_bytes() -> bytes:
+    request = struct.pack('!IBB32s', MAGIC_COOKIE, MSG_TYPE_REQUEST, 1, b'bench')
+    decision = struct.pack('!IB5s', MAGIC_COOKIE, MSG_TYPE_PAYLOAD, CMD_HIT.encode())
+    return request + b'\n' + decision * DECISIONS
+
+
+def run(read_session) -> tuple[float, int, float]:
+    """
+    Returns (recv calls per session, peak traced bytes, us per session).
+    """
+    traffic = session_bytes()
+    calls = 0
+    elapsed = 0.0
+    peak = 0
+    for i in range(SESSIONS):
+        server_side, client_side = socket.socketpair()
+        client_side.sendall(traffic)
+        counted = CountingSocket(server_side)
+
+        if i == 0:
+            tracemalloc.start()
+            read_session(counted)
+            _, peak = tracemalloc.get_traced_memory()
+            tracemalloc.stop()
+        else:
+            start = time.perf_counter()
+            read_session(counted)
+            elapsed += time.perf_counter() - start
+
+        calls += counted.calls
+        server_side.close()
+        client_side.close()
+
+    return calls / SESSIONS, peak, elapsed / (SESSIONS - 1) * 1e6
+
+
+def main():
+    print(f"{DECISIONS} decisions per session, {SESSIONS} sessions")
+    print(f"{'reader':<18} {'recv calls':>11} {'peak bytes':>11} {'us/session':>11}")
+    for name, fn in (('recv_exact', legacy_session), ('ConnectionReader', reader_session)):
+        calls, peak, us = run(fn)
+        print(f"{name:<18} {calls:>11.1f} {peak:>11} {us:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,69 @@
+"""
+Rounds/sec of game_session.GameSession driven in memory, with no sockets.
+
+The harness is the client: it feeds requests and, for normal games, a
+StandOn decision whenever the session waits for one, reading the hand total
+and upcard straight from the session. Games of MAX_ROUNDS rounds follow each
+other on the same session, as on a keep-alive connection.
+
+Run from the repo root:
+    python -m benchmarks.bench_session
+    python -m benchmarks.bench_session --rounds 1000000 --stand-on 15
+    python -m benchmarks.bench_session --round-log /tmp/bench_rounds.log  # cost of the round log
+"""
+import argparse
+import time
+
+from game_session import GameSession, MAX_ROUNDS
+from protocol import HIT_FRAME, STAND_FRAME, pack_request, pack_autoplay_request
+from roundlog import RoundLog
+from strategies import StandOn
+from utils import RESULT_WIN
+
+
+def run(mode: str, games: int, strategy, round_log: RoundLog = None) -> tuple[dict, float]:
+    """
+    Plays games of MAX_ROUNDS rounds; returns (counts, elapsed seconds).
+    """
+    counts = {'rounds': 0, 'wins': 0, 'frames': 0}
+
+    def round_finished(result: int):
+        counts['rounds'] += 1
+        counts['wins'] += result == RESULT_WIN
+
+    session = GameSession(on_round=round_finished, log=None, round_log=round_log)
+    if mode == 'decisions':
+        request = pack_request(MAX_ROUNDS, "bench") + b'\n'
+    else:
+        request = pack_autoplay_request(MAX_ROUNDS, "bench", strategy, mode == 'summary') + b'\n'
+
+    start = time.perf_counter()
+    for _ in range(games):
+        counts['frames'] += len(session.receive(request))
+        while session.state == GameSession.WAIT_DECISION:
+            hit = strategy.should_hit(session.client_total, session.upcard)
+            counts['frames'] += len(session.receive(HIT_FRAME if hit else STAND_FRAME))
+    return counts, time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description="In-memory GameSession throughput")
+    parser.add_argument('--rounds', type=int, default=200_000)
+    parser.add_argument('--stand-on', type=int, default=17)
+    parser.add_argument('--round-log', metavar='PATH', help="record every round to this log")
+    args = parser.parse_args()
+    round_log = RoundLog(args.round_log) if args.round_log else None
+
+    games = max(1, args.rounds // MAX_ROUNDS)
+    strategy = StandOn(args.stand_on)
+    print(f"{games * MAX_ROUNDS} rounds, {strategy}")
+    print(f"{'mode':<10} {'rounds/sec':>12} {'us/round':>9} {'frames/round':>13} {'win rate':>9}")
+    for mode in ('decisions', 'autoplay', 'summary'):
+        counts, elapsed = run(mode, games, strategy, round_log)
+        rounds = counts['rounds']
+        print(f"{mode:<10} {rounds / elapsed:>12,.0f} {elapsed / rounds * 1e6:>9.2f} "
+              f"{counts['frames'] / rounds:>13.2f} {counts['wins'] / rounds:>9.3f}")
+
+
+if __name__ == "__main__":
+    main()
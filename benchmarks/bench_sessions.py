@@ -0,0 +1,189 @@
+"""
+Compares the threaded server and the asyncio server side by side.
+
+For each mode a server is started in a child process on loopback, N sessions
+are opened and parked on their first decision, and we report:
+  - server RSS growth per open session
+  - turn latency (Hit sent -> card frame received) across all sessions
+  - sessions the server turned away with a busy frame
+
+The threaded server's SessionPool is sized to the session count by default
+(--workers, --queue), so every session can be parked at once; smaller sizes
+show admission control at work. Decision deadlines are raised to
+BENCH_DECISION_TIMEOUT so sessions parked during a long setup are not timed
+out.
+
+Run from the repo root:
+    python -m benchmarks.bench_sessions --sessions 2000
+    python -m benchmarks.bench_sessions --sessions 10000 --modes threaded --workers 256
+"""
+import argparse
+import asyncio
+import os
+import resource
+import socket
+import statistics
+import struct
+import subprocess
+import sys
+import time
+
+from utils import MAGIC_COOKIE, MSG_TYPE_REQUEST, MSG_TYPE_PAYLOAD, CMD_HIT, RESULT_BUSY
+
+BENCH_DECISION_TIMEOUT = 3600.0  # seconds
+
+SERVER_COMMANDS = {
+    'threaded': "import server, admission; server.DECISION_TIMEOUT = {decision_timeout}; "
+                "pool = admission.SessionPool(server.client_handler, {workers}, {queue}); "
+                "server.tcp_accept_loop({port}, server.client_handler, pool=pool)",
+    'asyncio': "import asyncio, server, async_server; server.DECISION_TIMEOUT = {decision_timeout}; "
+               "asyncio.run(async_server.serve({port}))",
+}
+
+
+class ServerBusy(ConnectionError):
+    pass
+
+
+def free_port() -> int:
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def rss_kb(pid: int) -> int:
+    with open(f"/proc/{pid}/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1])
+    return 0
+
+
+def start_server(mode: str, port: int, workers: int, queue: int) -> subprocess.Popen:
+    repo_root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    command = SERVER_COMMANDS[mode].format(port=port, workers=workers, queue=queue,
+                                           decision_timeout=BENCH_DECISION_TIMEOUT)
+    proc = subprocess.Popen(
+        [sys.executable, "-c", command],
+        cwd=repo_root,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL
+    )
+    # Wait until the listening socket accepts
+    deadline = time.time() + 10
+    while time.time() < deadline:
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return proc
+        except OSError:
+            time.sleep(0.05)
+    proc.kill()
+    raise RuntimeError(f"{mode} server did not start")
+
+
+async def open_session(port: int, rounds: int, limit: asyncio.Semaphore, attempts: int = 20):
+    request = struct.pack('!IBB32s', MAGIC_COOKIE, MSG_TYPE_REQUEST, rounds, b'bench')
+    for attempt in range(attempts):
+        try:
+            async with limit:
+                reader, writer = await asyncio.open_connection('127.0.0.1', port)
+                writer.write(request + b'\n')
+                await writer.drain()
+                first = await reader.readexactly(9)
+                if first[5] == RESULT_BUSY:
+                    writer.close()
+                    raise ServerBusy("server busy")
+                await reader.readexactly(18)  # dealer upcard, then 2 client cards
+            return reader, writer
+        except ServerBusy:
+            raise
+        except (ConnectionError, asyncio.IncompleteReadError):
+            # Connects that overflow the listen backlog in a burst are reset
+            await asyncio.sleep(0.05 * (attempt + 1))
+    raise ConnectionError("could not open session")
+
+
+async def try_open_session(port: int, rounds: int, limit: asyncio.Semaphore):
+    """
+    Like open_session, but returns None if the server answered busy.
+    """
+    try:
+        return await open_session(port, rounds, limit)
+    except ServerBusy:
+        return None
+
+
+async def measure_turn(reader, writer) -> float:
+    """
+    Sends one Hit and times the reply. If the hit busts, the server answers
+    with the result frame instead of a card, which is still one turn.
+    """
+    start = time.perf_counter()
+    writer.write(struct.pack('!IB5s', MAGIC_COOKIE, MSG_TYPE_PAYLOAD, CMD_HIT.encode()))
+    await writer.drain()
+    await reader.readexactly(9)
+    return time.perf_counter() - start
+
+
+async def run_mode(mode: str, sessions: int, connect_concurrency: int,
+                   workers: int, queue: int) -> dict:
+    port = free_port()
+    proc = start_server(mode, port, workers, queue)
+    try:
+        await asyncio.sleep(0.5)
+        base_rss = rss_kb(proc.pid)
+
+        # Connects are throttled so the threaded server's LISTEN_BACKLOG does not
+        # turn the setup phase into SYN retransmit backoff
+        limit = asyncio.Semaphore(connect_concurrency)
+        opened = await asyncio.gather(*(try_open_session(port, 1, limit) for _ in range(sessions)))
+        conns = [conn for conn in opened if conn is not None]
+        await asyncio.sleep(0.5)
+        loaded_rss = rss_kb(proc.pid)
+
+        latencies = await asyncio.gather(*(measure_turn(r, w) for r, w in conns))
+
+        for _, writer in conns:
+            writer.close()
+
+        latencies.sort()
+        return {
+            'mode': mode,
+            'sessions': len(conns),
+            'busy': sessions - len(conns),
+            'kb_per_session': (loaded_rss - base_rss) / max(len(conns), 1),
+            'turn_p50_ms': latencies[len(latencies) // 2] * 1000 if latencies else 0.0,
+            'turn_p99_ms': latencies[max(int(len(latencies) * 0.99) - 1, 0)] * 1000 if latencies else 0.0,
+            'turn_mean_ms': statistics.mean(latencies) * 1000 if latencies else 0.0,
+        }
+    finally:
+        proc.kill()
+        proc.wait()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--connect-concurrency', type=int, default=4)
+    parser.add_argument('--modes', nargs='+', default=list(SERVER_COMMANDS))
+    parser.add_argument('--workers', type=int,
+                        help="threaded server's session workers (default: --sessions)")
+    parser.add_argument('--queue', type=int,
+                        help="threaded server's admission queue (default: --sessions)")
+    args = parser.parse_args()
+    workers = args.workers or args.sessions
+    queue = args.queue or args.sessions
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    print(f"{'mode':<10} {'sessions':>8} {'busy':>6} {'KB/session':>11} {'p50 ms':>8} {'p99 ms':>8} "
+          f"{'mean ms':>8}")
+    for mode in args.modes:
+        r = asyncio.run(run_mode(mode, args.sessions, args.connect_concurrency, workers, queue))
+        print(f"{r['mode']:<10} {r['sessions']:>8} {r['busy']:>6} {r['kb_per_session']:>11.1f} "
+              f"{r['turn_p50_ms']:>8.2f} {r['turn_p99_ms']:>8.2f} {r['turn_mean_ms']:>8.2f}")
+
+
+if __name__ == "__main__":
+    main()
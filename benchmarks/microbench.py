@@ -0,0 +1,325 @@
+"""
+Microbenchmarks for the per-frame and per-round hot paths.
+
+    python -m benchmarks.microbench run                          # print results
+    python -m benchmarks.microbench run --save benchmarks/baselines/mine.json
+    python -m benchmarks.microbench compare benchmarks/baselines/mine.json --threshold 10
+
+The suite runs --runs times, each in its own process, since a process's
+timings drift together with its memory layout and the machine's clock; every
+benchmark keeps its median over the runs. The spread between runs (slowest
+less fastest, over the median) is that benchmark's noise. compare re-runs the
+suite, prints the change of the medians against the baseline and exits with
+status 1 if any benchmark got slower by more than --threshold percent plus
+its noise, the larger of the baseline's and this run's.
+"""
+import argparse
+import io
+import json
+import os
+import platform
+import socket
+import statistics
+import struct
+import subprocess
+import sys
+import threading
+import time
+import timeit
+
+import cards
+import game_session
+import protocol
+import server
+from client import Client
+from strategies import StandOn
+from utils import MAGIC_COOKIE, MSG_TYPE_REQUEST, MSG_TYPE_PAYLOAD, CMD_STAND
+from utils import RESULT_ACTIVE
+
+REPEAT = 3   # timeit repeats within a run, the best is kept
+RUNS = 5     # runs of the suite, each in its own process
+E2E_ROUNDS = 200
+
+REPO_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+BENCHMARKS = {}
+
+
+def bench(name: str, per_call: int = 1):
+    """
+    Registers a setup function that returns the callable to time.
+    per_call: number of operations one call performs (results are per operation).
+    """
+    def register(setup):
+        BENCHMARKS[name] = (setup, per_call)
+        return setup
+    return register
+
+
+@bench("build_server_payload")
+def _():
+    card = cards.encode_card(12, 3)
+    return lambda: game_session.build_server_payload(RESULT_ACTIVE, card)
+
+
+@bench("parse_client_payload")
+def _():
+    data = struct.pack('!IB5s', MAGIC_COOKIE, MSG_TYPE_PAYLOAD, CMD_STAND.encode())
+    return lambda: game_session.parse_client_payload(data)
+
+
+@bench("parse_request_packet")
+def _():
+    data = struct.pack('!IBB32s', MAGIC_COOKIE, MSG_TYPE_REQUEST, 10, b'Terry Rozier')
+    return lambda: game_session.parse_request_packet(data)
+
+
+@bench("build_offer_packet")
+def _():
+    return lambda: server.build_offer_packet(2048, "Chauncey Billups")
+
+
+@bench("Client._parse_offer")
+def _():
+    client = Client()
+    data = server.build_offer_packet(2048, "Chauncey Billups")
+    return lambda: client._parse_offer(data)
+
+
+@bench("cards.decode_card")
+def _():
+    data = struct.pack('!HB', 12, 3)
+    return lambda: cards.decode_card(data)
+
+
+@bench("protocol.decode_card")
+def _():
+    data = struct.pack('!HB', 12, 3)
+    return lambda: protocol.decode_card(data)
+
+
+@bench("protocol.FrameDecoder.feed x3", per_call=3)
+def _():
+    decoder = protocol.FrameDecoder()
+    data = b''.join(protocol.server_frame(RESULT_ACTIVE, code) for code in (4, 20, 55))
+    return lambda: decoder.feed(data)
+
+
+@bench("calculate_hand_total")
+def _():
+    ranks = [1, 13, 5]
+    return lambda: cards.calculate_hand_total(ranks)
+
+
+@bench("Deck()")
+def _():
+    return cards.Deck
+
+
+@bench("Deck().draw x6", per_call=6)
+def _():
+    def deal():
+        deck = cards.Deck()
+        for _ in range(6):
+            deck.draw()
+    return deal
+
+
+@bench("dealer_turn")
+def _():
+    shoe = cards.Shoe()
+
+    def play():
+        shoe.start_round()
+        game_session.dealer_turn(shoe, [shoe.draw(), shoe.draw()])
+    return play
+
+
+@bench("autoplay_round")
+def _():
+    shoe = cards.Shoe()
+    strategy = StandOn(17)
+    frames = []
+
+    def play():
+        game_session.autoplay_round(shoe, strategy, frames)
+        frames.clear()
+    return play
+
+
+@bench("decide_winner")
+def _():
+    return lambda: game_session.decide_winner(18, 17, False, False)
+
+
+@bench("e2e round (socketpair)", per_call=E2E_ROUNDS)
+def _():
+    """
+    One game of E2E_ROUNDS rounds through the real game_loop on a socketpair,
+    the client side standing on every hand.
+    """
+    request = struct.pack('!IBB32s', MAGIC_COOKIE, MSG_TYPE_REQUEST, E2E_ROUNDS, b'bench') + b'\n'
+    stand = struct.pack('!IB5s', MAGIC_COOKIE, MSG_TYPE_PAYLOAD, CMD_STAND.encode())
+    frame = struct.Struct('!IBBHB')
+
+    def play():
+        server_side, client_side = socket.socketpair()
+        worker = threading.Thread(target=server.game_loop, args=(server_side,))
+        worker.start()
+        client_side.sendall(request)
+        reader = client_side.makefile('rb')
+        for _ in range(E2E_ROUNDS):
+            reader.read(27)  # upcard + two cards: the server now waits for us
+            client_side.sendall(stand)
+            while frame.unpack(reader.read(9))[2] == RESULT_ACTIVE:
+                pass
+        client_side.shutdown(socket.SHUT_WR)  # no further game on this connection
+        worker.join()
+        reader.close()
+        server_side.close()
+        client_side.close()
+    return play
+
+
+def run_one(setup, per_call: int) -> float:
+    """
+    Returns the best time per operation in nanoseconds.
+    """
+    fn = setup()
+    timer = timeit.Timer(fn)
+    number, _ = timer.autorange()
+    best = min(timer.repeat(repeat=REPEAT, number=number))
+    return best / number / per_call * 1e9
+
+
+def sample(selected=None) -> dict:
+    """
+    One run of the suite in this process: benchmark name -> ns/op.
+    """
+    results = {}
+    real_stdout = sys.stdout
+    for name, (setup, per_call) in BENCHMARKS.items():
+        if selected and not any(s in name for s in selected):
+            continue
+        # Several hot paths print; keep that out of the terminal and the timing noise
+        sys.stdout = io.StringIO()
+        try:
+            results[name] = run_one(setup, per_call)
+        finally:
+            sys.stdout = real_stdout
+    return results
+
+
+def run_all(selected=None, runs: int = RUNS) -> dict:
+    """
+    Runs the suite `runs` times, each in a fresh process; returns
+    benchmark name -> ns/op of every run.
+    """
+    command = [sys.executable, '-m', 'benchmarks.microbench', 'sample']
+    if selected:
+        command += ['--only', *selected]
+    samples = {}
+    for run in range(runs):
+        print(f"Run {run + 1}/{runs}...", flush=True)
+        output = subprocess.run(command, cwd=REPO_ROOT, capture_output=True, text=True, check=True).stdout
+        for name, ns in json.loads(output).items():
+            samples.setdefault(name, []).append(ns)
+
+    print(f"\n{'benchmark':<28} {'median':>12} {'noise':>8}")
+    for name, values in samples.items():
+        print(f"{name:<28} {format_ns(statistics.median(values)):>12} {spread(values):>7.1f}%")
+    return samples
+
+
+def spread(values: list) -> float:
+    """
+    Slowest less fastest run, in percent of the median.
+    """
+    return (max(values) - min(values)) / statistics.median(values) * 100
+
+
+def format_ns(ns: float) -> str:
+    if ns >= 1e6:
+        return f"{ns / 1e6:.2f} ms"
+    if ns >= 1e3:
+        return f"{ns / 1e3:.2f} us"
+    return f"{ns:.0f} ns"
+
+
+def save(samples: dict, path: str):
+    with open(path, 'w') as f:
+        json.dump({
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'python': platform.python_version(),
+            'machine': platform.machine(),
+            'unit': 'ns/op',
+            'results': {name: statistics.median(values) for name, values in samples.items()},
+            'samples': samples,
+        }, f, indent=2)
+    print(f"Saved baseline to {path}")
+
+
+def compare(samples: dict, baseline_path: str, threshold: float) -> bool:
+    """
+    Prints the change of the median per benchmark; returns False if any
+    regressed by more than threshold percent plus its noise. Baselines
+    saved before runs were kept have no samples; their noise is this run's.
+    """
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    baseline_samples = baseline.get('samples', {})
+
+    ok = True
+    print(f"\n{'benchmark':<28} {'baseline':>12} {'now':>12} {'change':>8} {'allowed':>8}")
+    for name, values in samples.items():
+        now = statistics.median(values)
+        if name not in baseline['results']:
+            print(f"{name:<28} {'-':>12} {format_ns(now):>12} {'new':>8}")
+            continue
+        before = baseline_samples.get(name) or [baseline['results'][name]]
+        then = statistics.median(before)
+        change = (now - then) / then * 100
+        allowed = threshold + max(spread(before), spread(values))
+        flag = ""
+        if change > allowed:
+            flag = "  REGRESSION"
+            ok = False
+        print(f"{name:<28} {format_ns(then):>12} {format_ns(now):>12} {change:>+7.1f}% "
+              f"{allowed:>7.1f}%{flag}")
+    return ok
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hot path microbenchmarks")
+    commands = parser.add_subparsers(dest='command', required=True)
+
+    run_cmd = commands.add_parser('run')
+    run_cmd.add_argument('--save', metavar='PATH')
+    run_cmd.add_argument('--only', nargs='+', help="substrings of benchmark names")
+    run_cmd.add_argument('--runs', type=int, default=RUNS, help="runs of the suite, one process each")
+
+    compare_cmd = commands.add_parser('compare')
+    compare_cmd.add_argument('baseline')
+    compare_cmd.add_argument('--threshold', type=float, default=10.0,
+                             help="allowed slowdown in percent, on top of the measured noise")
+    compare_cmd.add_argument('--only', nargs='+', help="substrings of benchmark names")
+    compare_cmd.add_argument('--runs', type=int, default=RUNS, help="runs of the suite, one process each")
+
+    sample_cmd = commands.add_parser('sample', help="one run in this process, as JSON (used by run and compare)")
+    sample_cmd.add_argument('--only', nargs='+', help="substrings of benchmark names")
+
+    args = parser.parse_args()
+    if args.command == 'sample':
+        json.dump(sample(args.only), sys.stdout)
+        return
+
+    samples = run_all(args.only, args.runs)
+    if args.command == 'run':
+        if args.save:
+            save(samples, args.save)
+    elif not compare(samples, args.baseline, args.threshold):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
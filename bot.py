@@ -0,0 +1,54 @@
+"""
+Headless player: plays with a strategy instead of asking on stdin.
+
+    python bot.py --strategy stand:17 --rounds 20
+    python bot.py --host 127.0.0.1 --port 2048 --games 5 --strategy table:1=17,10=15
+    python bot.py --host 127.0.0.1 --rounds 255 --autoplay --summary
+    python bot.py --strategy optimal --rounds 100    # the table from solver.py
+"""
+import argparse
+import time
+from client import Client
+from strategies import parse_strategy
+
+BUSY_RETRY_DELAY = 1.0  # seconds
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Headless blackjack bot")
+    parser.add_argument('--strategy', default='stand:17',
+                        help="stand:N, table:UPCARD=N,..., optimal or file:PATH "
+                             "(see strategies.parse_strategy)")
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--games', type=int, default=1)
+    parser.add_argument('--name', default="Terry Rozier Bot")
+    parser.add_argument('--host', help="connect directly instead of waiting for an offer")
+    parser.add_argument('--port', type=int, default=2048)
+    parser.add_argument('--autoplay', action='store_true',
+                        help="send the strategy and let the server play every round")
+    parser.add_argument('--summary', action='store_true',
+                        help="with --autoplay, only get the win/loss/tie counts back")
+    args = parser.parse_args()
+
+    client = Client(strategy=parse_strategy(args.strategy), rounds=args.rounds,
+                    player_name=args.name, autoplay=args.autoplay, summary=args.summary)
+
+    # Games are played back to back on one connection; reconnect only if it drops
+    games_left = args.games
+    while games_left > 0:
+        if args.host:
+            client.server_ip, client.server_port = args.host, args.port
+        elif not (client.server_busy and client.fail_over()):
+            client.listen_for_offers()
+        played = client.connect_to_server(games_left)
+
+        # A busy reply costs no game; back off before asking a fixed host again
+        if client.server_busy:
+            if args.host:
+                time.sleep(BUSY_RETRY_DELAY)
+            continue
+        games_left -= max(played, 1)
+
+
+if __name__ == "__main__":
+    main()
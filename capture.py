@@ -0,0 +1,117 @@
+"""
+Session capture: every byte each session received and sent, with timestamps.
+
+The file starts with a header (CAPTURE_MAGIC, then the master seed of the
+session shoes, see rng.py), followed by one event per read or write:
+    [Session Id 4B] [Time 8B float, seconds since the capture started]
+    [Kind 1B] [Length 4B] [Data]
+little-endian, as in roundlog.py. Client reads are kept as they arrived, so
+their chunking (burst reads, the newline after a request) is replayed as is.
+Like the round log, events are appended to a batch in memory and written by
+a background thread.
+
+replay.py plays a capture back against a server.
+"""
+import atexit
+import struct
+import threading
+import time
+from collections import deque
+
+CAPTURE_MAGIC = b'BJCAP\x01'
+HEADER = struct.Struct('<6sQ')
+EVENT = struct.Struct('<IdBI')
+
+# Event kinds
+OPEN = 0   # the session started
+RECV = 1   # bytes read from the client
+SEND = 2   # bytes written to the client
+CLOSE = 3  # the session ended
+
+FLUSH_INTERVAL = 0.25  # seconds between batch writes
+
+
+class CaptureWriter:
+    def __init__(self, path: str, master_seed: int, flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.started = time.monotonic()
+        self.pending = deque()  # packed events (bytes)
+        self.closed = threading.Event()
+
+        self.file = open(path, 'wb')
+        self.file.write(HEADER.pack(CAPTURE_MAGIC, master_seed))
+        self.writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def session(self, session_id: int) -> 'SessionCapture':
+        return SessionCapture(self, session_id)
+
+    def event(self, session_id: int, kind: int, data=b''):
+        self.pending.append(EVENT.pack(session_id, time.monotonic() - self.started, kind, len(data))
+                            + data)
+
+    def flush(self):
+        batch = []
+        while self.pending:
+            batch.append(self.pending.popleft())
+        if batch:
+            self.file.write(b''.join(batch))
+            self.file.flush()
+
+    def _writer_loop(self):
+        while not self.closed.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.writer.join()
+        self.flush()
+        self.file.close()
+
+
+class SessionCapture:
+    """
+    The capture of one session, as the server drivers see it.
+    """
+
+    def __init__(self, writer: CaptureWriter, session_id: int):
+        self.writer = writer
+        self.session_id = session_id
+        writer.event(session_id, OPEN)
+
+    def received(self, data):
+        self.writer.event(self.session_id, RECV, bytes(data))
+
+    def sent(self, frames: list):
+        if frames:
+            self.writer.event(self.session_id, SEND, b''.join(frames))
+
+    def closed(self):
+        self.writer.event(self.session_id, CLOSE)
+
+
+def read_capture(path: str) -> tuple[int, dict]:
+    """
+    Returns (master seed, {session id: [(time, kind, data), ...]}), sessions
+    in the order they started.
+    """
+    with open(path, 'rb') as f:
+        data = f.read()
+    magic, master_seed = HEADER.unpack_from(data)
+    if magic != CAPTURE_MAGIC:
+        raise ValueError(f"{path} is not a session capture")
+
+    sessions = {}
+    offset = HEADER.size
+    while offset + EVENT.size <= len(data):
+        session_id, timestamp, kind, length = EVENT.unpack_from(data, offset)
+        offset += EVENT.size
+        if offset + length > len(data):
+            break  # cut off by a crash; keep what is complete
+        sessions.setdefault(session_id, []).append((timestamp, kind, data[offset:offset + length]))
+        offset += length
+    return master_seed, sessions
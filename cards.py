@@ -23,6 +23,25 @@ RANKS = {
 }
 
 
+def card_name(rank_val, suit_val):
+    """
+    Renders a card as a colored string.
+    """
+    rank_str = RANKS.get(rank_val, str(rank_val))
+    suit_str = SUITS.get(suit_val, 'Unknown Suit')
+
+    # Color logic
+    color = RESET
+    if suit_val == 0 or suit_val == 1:  # Hearts & Diamonds
+        color = RED
+    elif suit_val == 2:  # Clubs
+        color = GREEN
+    elif suit_val == 3:  # Spades
+        color = BLUE
+
+    return f"{color}{rank_str} of {suit_str}{RESET}"
+
+
 def decode_card(card_bytes):
     """
     Decodes the 3-byte card data into a colored string.
@@ -32,20 +51,7 @@ def decode_card(card_bytes):
 
     try:
         rank_val, suit_val = struct.unpack('!HB', card_bytes)
-
-        rank_str = RANKS.get(rank_val, str(rank_val))
-        suit_str = SUITS.get(suit_val, 'Unknown Suit')
-
-        # Color logic
-        color = RESET
-        if suit_val == 0 or suit_val == 1:  # Hearts & Diamonds
-            color = RED
-        elif suit_val == 2:  # Clubs
-            color = GREEN
-        elif suit_val == 3:  # Spades
-            color = BLUE
-
-        return f"{color}{rank_str} of {suit_str}{RESET}"
+        return card_name(rank_val, suit_val)
 
     except Exception as e:
         print(f"DEBUG ERROR: {e}")
@@ -65,29 +71,63 @@ def calculate_hand_total(ranks_list):
             total += rank
 
     return total
-from dataclasses import dataclass
 import random
 
-@dataclass
-class Card:
-    rank: int   # 1-13
-    suit: int   # 0-3
+# Cards are encoded as small ints: code = rank * 4 + suit (Ace of Hearts = 4,
+# King of Spades = 55). Code 0 is never a card and means "no card".
+NO_CARD = 0
+ONE_DECK = bytes(rank * 4 + suit for rank in RANKS for suit in SUITS)
 
-def card_value(card: Card) -> int:
-    if card.rank >= 11:       # J, Q, K
-        return 10
-    else:
-        return card.rank        # 2-10
+# Card value indexed by code: Ace is 1, J/Q/K are 10
+CARD_VALUES = bytes(min(code >> 2, 10) for code in range(56))
+
+SHOE_DECKS = 6
+SHOE_PENETRATION = 0.75  # reshuffle once this fraction of the shoe is dealt
 
-class Deck:
-    def __init__(self):
-        self.cards = [Card(r, s) for r in RANKS for s in SUITS]
-        random.shuffle(self.cards)
 
-    def draw(self) -> Card:
-        if not self.cards:
-            raise RuntimeError("Deck is empty")
-        return self.cards.pop()
+def encode_card(rank: int, suit: int) -> int:
+    return rank * 4 + suit
 
+def card_rank(card: int) -> int:
+    return card >> 2
 
+def card_suit(card: int) -> int:
+    return card & 3
 
+def card_value(card: int) -> int:
+    return CARD_VALUES[card]
+
+class Shoe:
+    """
+    num_decks shuffled decks packed in a bytearray, one byte per card.
+    A session keeps one shoe for its whole life; call start_round() before
+    each round and it reshuffles once the penetration point is passed.
+    """
+    def __init__(self, num_decks: int = SHOE_DECKS, penetration: float = SHOE_PENETRATION,
+                 rng: random.Random = None):
+        self.cards = bytearray(ONE_DECK * num_decks)
+        self.cut = int(len(self.cards) * penetration)
+        self.rng = rng or random  # module-level functions share the global Random
+        self.shuffle()
+
+    def shuffle(self):
+        self.rng.shuffle(self.cards)
+        self.position = 0
+
+    def start_round(self):
+        if self.position >= self.cut:
+            self.shuffle()
+
+    def draw(self) -> int:
+        if self.position >= len(self.cards):
+            raise RuntimeError("Shoe is empty")
+        card = self.cards[self.position]
+        self.position += 1
+        return card
+
+class Deck(Shoe):
+    """
+    A single freshly shuffled deck that is never reshuffled.
+    """
+    def __init__(self):
+        super().__init__(num_decks=1, penetration=1.0)
@@ -1,23 +1,78 @@
+import argparse
+import select
 import socket
-import struct
 import time
-from cards import decode_card, calculate_hand_total
-from utils import MAGIC_COOKIE, MSG_TYPE_OFFER, MSG_TYPE_REQUEST, MSG_TYPE_PAYLOAD
+from collections import deque
+from cards import calculate_hand_total
+from protocol import FrameDecoder, card_text, pack_request, unpack_offer_from, unpack_offer_load_from
+from protocol import OFFER_SIZE, HIT_FRAME, STAND_FRAME, PROBE_FRAME
+from protocol import SUMMARY_SIZE, SERVER_PAYLOAD_SIZE, pack_autoplay_request, unpack_summary_from
+from strategies import upcard_value, parse_strategy
+from utils import MAGIC_COOKIE, MSG_TYPE_OFFER, MSG_TYPE_PAYLOAD, MSG_TYPE_SUMMARY
 from utils import CMD_HIT, CMD_STAND
-from utils import RESULT_ACTIVE, RESULT_TIE, RESULT_LOSS, RESULT_WIN
-from utils import UDP_PORT, BUFFER_SIZE
+from utils import RESULT_ACTIVE, RESULT_TIE, RESULT_LOSS, RESULT_WIN, RESULT_BUSY, RESULT_TIMEOUT
+from utils import UDP_PORT, PROBE_PORT, BUFFER_SIZE
+
+
+OFFER_WINDOW = 1.1  # seconds to collect offers after the first one, just over one broadcast interval
+PROBE_WINDOW = 0.05  # seconds to collect probe answers after the first one
+PROBE_RETRY_INTERVAL = 0.25  # seconds between probes while no server answered
+PROBE_ADDR = '<broadcast>'
+READ_TIMEOUT = 60.0  # seconds; at a shared table (tables.py) we also wait on the other players
+
+
+def load_rank(load) -> tuple:
+    """
+    Sort key for offers: servers with room first, least loaded first;
+    servers that do not advertise their load come after those with room.
+    """
+    if load is None:
+        return (0, 1, 0.0)
+    active, capacity = load
+    if capacity == 0 or active >= capacity:
+        return (1, 0, 1.0)
+    return (0, 0, active / capacity)
+
+
+class ServerBusy(ConnectionError):
+    """
+    The server answered with RESULT_BUSY instead of starting the game.
+    """
 
 
 class Client:
-    def __init__(self):
+    def __init__(self, strategy=None, rounds=None, player_name="Terry Rozier",
+                 autoplay=False, summary=False, advisor=None):
+        """
+        strategy: optional object with should_hit(total, dealer_upcard) (see
+        strategies.py). Together with rounds it makes the client headless:
+        nothing is read from input().
+        autoplay: send the strategy with the request and let the server play
+        it, with no decision round trips; with summary the server only sends
+        the win/loss/tie counts back.
+        advisor: optional strategy whose move is shown before each input()
+        prompt when playing by hand, e.g. the solved table (strategies.OPTIMAL_TABLE).
+        """
         self.server_ip = None
         self.server_port = None
-        self.player_name = "Terry Rozier"
+        self.player_name = player_name
+        self.strategy = strategy
+        self.rounds = rounds
+        self.autoplay = autoplay and strategy is not None
+        self.summary = summary
+        self.advisor = advisor
+        # Other servers heard in the last offer window, best first
+        self.fallback_servers = []
+        self.server_busy = False
 
     def listen_for_offers(self):
         """
-        Listens for UDP broadcast offers from the server.
-        Blocking call until a valid offer is received.
+        Finds the servers: broadcasts a probe, which servers answer right away
+        with their offer, and listens for the periodic UDP broadcast offers of
+        servers that do not answer probes.
+        Blocks until a valid offer is received, keeps collecting offers for
+        PROBE_WINDOW if it answered a probe (OFFER_WINDOW if it was broadcast)
+        and then picks the least loaded server.
         """
         print(f"Client started, listening for offer requests...")
 
@@ -37,21 +92,65 @@ class Client:
 
         sock.bind(("", UDP_PORT))
 
-        while True:
+        # Probes go out from their own port, which the answers come back to
+        probe_sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        probe_sock.setsockopt(socket.SOL_SOCKET, socket.SO_BROADCAST, 1)
+        next_probe = time.monotonic()
+
+        # server (ip, port) -> (active sessions, capacity) or None for old servers
+        offers = {}
+        deadline = None
+
+        while deadline is None or time.monotonic() < deadline:
             try:
-                #blocking call
-                data, addr = sock.recvfrom(BUFFER_SIZE)
-                # Packet format: [Magic Cookie 4B] [Type 1B] [Server Port 2B] [Server Name 32B]
-                print(f"Received offer from {addr[0]}, attempting to parse...")
-                if self._parse_offer(data):
-                    self.server_ip = addr[0]
-                    # Once we have a valid offer, we break to connect
-                    break
+                now = time.monotonic()
+                if deadline is None and now >= next_probe:
+                    next_probe = now + PROBE_RETRY_INTERVAL
+                    try:
+                        probe_sock.sendto(PROBE_FRAME, (PROBE_ADDR, PROBE_PORT))
+                    except OSError as e:
+                        # e.g. no route to probe on; broadcast offers may still arrive
+                        print(f"Could not send discovery probe: {e}")
+                wait = (deadline if deadline is not None else next_probe) - now
+                readable, _, _ = select.select([sock, probe_sock], [], [], max(wait, 0.001))
+
+                for ready in readable:
+                    data, addr = ready.recvfrom(BUFFER_SIZE)
+                    # Packet format: [Magic Cookie 4B] [Type 1B] [Server Port 2B] [Server Name 32B]
+                    #                optionally followed by [Active 2B] [Capacity 2B]
+                    print(f"Received offer from {addr[0]}, attempting to parse...")
+                    if self._parse_offer(data):
+                        offers[(addr[0], self.server_port)] = unpack_offer_load_from(data)
+                        # Keep listening a little so every server gets heard once;
+                        # servers that answer probes all answer within milliseconds
+                        window = PROBE_WINDOW if ready is probe_sock else OFFER_WINDOW
+                        if deadline is None:
+                            deadline = time.monotonic() + window
 
             except Exception as e:
                 print(f"Error receiving offer: {e}")
+                time.sleep(PROBE_RETRY_INTERVAL)  # e.g. no network to probe yet
 
         sock.close()
+        probe_sock.close()
+
+        ranked = sorted(offers, key=lambda server: load_rank(offers[server]))
+        self.server_ip, self.server_port = ranked[0]
+        self.fallback_servers = ranked[1:]
+        load = offers[(self.server_ip, self.server_port)]
+        load_text = f"{load[0]}/{load[1]} sessions" if load else "load unknown"
+        print(f"Chose server {self.server_ip}:{self.server_port} ({load_text}) out of {len(offers)}")
+
+    def fail_over(self) -> bool:
+        """
+        Switches to the next server of the last offer window.
+        Returns False if there is none left.
+        """
+        if not self.fallback_servers:
+            return False
+        self.server_ip, self.server_port = self.fallback_servers.pop(0)
+        print(f"Failing over to {self.server_ip}:{self.server_port}")
+        return True
 
     def _parse_offer(self, data):
         """
@@ -60,17 +159,16 @@ class Client:
         """
         try:
             # The packet must be at least 39 bytes long (4 + 1 + 2 + 32).
-            if len(data) < 39:
+            if len(data) < OFFER_SIZE:
                 return False
 
-            # struct.unpack converts raw bytes back into Python variables.
-            # '!IBH32s' is the format string:
+            # protocol.OFFER is the precompiled '!IBH32s' format:
             #   !  = Network Byte Order (Big Endian) - Standard for networks
             #   I  = Unsigned Int (4 bytes) -> Magic Cookie
             #   B  = Unsigned Char (1 byte) -> Message Type
             #   H  = Unsigned Short (2 bytes) -> Server Port
             #   32s= String (32 bytes) -> Server Name
-            cookie, msg_type, server_port, server_name_bytes = struct.unpack('!IBH32s', data[:39])
+            cookie, msg_type, server_port, server_name_bytes = unpack_offer_from(data)
 
             # If the first 4 bytes aren't 0xabcddcba, this packet isn't from our game protocol.
             if cookie != MAGIC_COOKIE:
@@ -95,10 +193,17 @@ class Client:
             print(f"Error parsing offer: {e}")
             return False
 
-    def connect_to_server(self):
+    def connect_to_server(self, games=1):
         """
         Establishes TCP connection to the server and sends the request.
+        With games > 1 (or None for no limit) the following games are
+        requested on the same connection (keep-alive), with no new discovery
+        or handshake.
+
+        Returns the number of games fully played.
         """
+        games_played = 0
+        self.server_busy = False
         try:
             print(f"Connecting to server at {self.server_ip}:{self.server_port}...")
 
@@ -108,55 +213,116 @@ class Client:
             self.tcp_socket.connect((self.server_ip, self.server_port))
             print(f"Connected successfully!")
 
-            # 3. Ask User for Number of Rounds
-            while True:
-                try:
-                    rounds_input = input("How many rounds do you want to play? ")
-                    rounds = int(rounds_input)
-                    if rounds > 0:
-                        break
-                    print("Please enter a positive number.")
-                except ValueError:
-                    print("Invalid input. Please enter a number.")
-
-            # 4. Pack the Request Message
-            # [cite_start]Format according to [cite: 91-95]:
-            # !    = Network Endian
-            # I    = Magic Cookie (4 bytes)
-            # B    = Message Type (1 byte) -> 0x3 for Request
-            # B    = Number of Rounds (1 byte)
-            # 32s  = Team Name (32 bytes)
-
-            # Encode the team name and pad/truncate to 32 bytes handled by struct
-            packet_data = struct.pack('!IBB32s',
-                                      MAGIC_COOKIE,
-                                      MSG_TYPE_REQUEST,
-                                      rounds,
-                                      self.player_name.encode('utf-8'))
-
-            # 5. Send the data and line break
-            self.tcp_socket.sendall(packet_data)
-            self.tcp_socket.sendall(b'\n')
-
-            print(f"Sent request to play {rounds} rounds.")
-            self.play_game(rounds)
+            while games is None or games_played < games:
+                if not self.request_game():
+                    break
+                games_played += 1
 
+        except ServerBusy:
+            print("Server is busy, try another one.")
+            self.server_busy = True
 
         except Exception as e:
             print(f"Error connecting to server: {e}")
-            # Ensure socket is closed if connection fails
+
+        finally:
+            # Ensure socket is closed when we are done or if connection fails
             if hasattr(self, 'tcp_socket'):
                 self.tcp_socket.close()
 
+        return games_played
+
+    def request_game(self):
+        """
+        Sends one request on the open connection and plays it.
+        Returns True if every round was played.
+        """
+        # 3. Ask User for Number of Rounds (headless clients have it already)
+        rounds = self.rounds
+        while not rounds:
+            try:
+                rounds_input = input("How many rounds do you want to play? ")
+                rounds = int(rounds_input)
+                if rounds > 0:
+                    break
+                rounds = None
+                print("Please enter a positive number.")
+            except ValueError:
+                print("Invalid input. Please enter a number.")
+
+        # 4. Pack the Request Message
+        # [cite_start]Format according to [cite: 91-95]:
+        # !    = Network Endian
+        # I    = Magic Cookie (4 bytes)
+        # B    = Message Type (1 byte) -> 0x3 for Request
+        # B    = Number of Rounds (1 byte)
+        # 32s  = Team Name (32 bytes)
+
+        # Encode the team name and pad/truncate to 32 bytes handled by struct
+        if self.autoplay:
+            packet_data = pack_autoplay_request(rounds, self.player_name, self.strategy, self.summary)
+        else:
+            packet_data = pack_request(rounds, self.player_name)
+
+        # 5. Send the data and line break
+        self.tcp_socket.sendall(packet_data)
+        self.tcp_socket.sendall(b'\n')
+
+        print(f"Sent request to play {rounds} rounds.")
+        if self.autoplay and self.summary:
+            return self.read_summary(rounds)
+        return self.play_game(rounds)
+
+    def read_summary(self, rounds):
+        """
+        Reads the summary frame of an auto-played game.
+        """
+        self.tcp_socket.settimeout(READ_TIMEOUT)
+        data = b''
+        while len(data) < SUMMARY_SIZE:
+            chunk = self.tcp_socket.recv(SUMMARY_SIZE - len(data))
+            if not chunk:
+                break
+            data += chunk
+
+        # A busy server sends one payload frame, which is shorter, and closes
+        if len(data) == SERVER_PAYLOAD_SIZE and data[4] == MSG_TYPE_PAYLOAD and data[5] == RESULT_BUSY:
+            raise ServerBusy("Server busy")
+        if len(data) == SERVER_PAYLOAD_SIZE and data[4] == MSG_TYPE_PAYLOAD and data[5] == RESULT_TIMEOUT:
+            raise ConnectionError("Server timed out waiting for us")
+        if len(data) < SUMMARY_SIZE:
+            raise ConnectionError("Server disconnected")
+
+        cookie, msg_type, wins, losses, ties = unpack_summary_from(data)
+        if cookie != MAGIC_COOKIE or msg_type != MSG_TYPE_SUMMARY:
+            print("Received invalid summary from server.")
+            return False
+
+        win_rate = wins / rounds * 100
+        print(f"Server played {rounds} rounds for us: {wins} wins, {losses} losses, {ties} ties, "
+              f"win rate: {win_rate:.1f}%")
+        return True
+
     def play_game(self, rounds):
         """
         Handles the gameplay loop with Sum Tracking.
+        Driven by decoded frames: we ask for a move exactly when the server
+        is waiting for one, instead of polling the socket for a burst.
         """
         print(f"--- Starting Game ({rounds} rounds) ---")
         rounds_played = 0
         wins = 0
-        self.tcp_socket.settimeout(15.0)
-        leftover_packets = []
+        self.tcp_socket.settimeout(READ_TIMEOUT)
+        decoder = FrameDecoder()
+        pending = deque()
+
+        def next_frame():
+            while not pending:
+                data = self.tcp_socket.recv(BUFFER_SIZE)
+                if not data:
+                    raise ConnectionError("Server disconnected")
+                pending.extend(decoder.feed(data))
+            return pending.popleft()
 
         try:
             while rounds_played < rounds:
@@ -170,108 +336,91 @@ class Client:
                 my_turn = True
 
                 while not round_over:
-                    packets = []
-                    if len(leftover_packets) > 0:
-                        packets = leftover_packets[:]
-                        leftover_packets = []
-                    else:
-                        try:
-                            # 1. READ PHASE
-                            first_data = self.tcp_socket.recv(9)
-                            if not first_data: raise Exception("Server disconnected")
-                            packets.append(first_data)
-
-                            self.tcp_socket.settimeout(0.2)
-                            while True:
-                                try:
-                                    more_data = self.tcp_socket.recv(9)
-                                    if not more_data: break
-                                    packets.append(more_data)
-                                except socket.timeout:
-                                    break
-                                except socket.error:
-                                    break
-                            self.tcp_socket.settimeout(15.0)
-
-                        except Exception as e:
-                            print(f"Error: {e}")
-                            return
-
-                    # 2. PROCESS PHASE
-                    server_requesting_move = False
-
-                    for i, data in enumerate(packets):
-                        if len(data) < 9: continue
-
-                        cookie, msg_type, result, card_val = struct.unpack('!IBB3s', data)
-                        rank = struct.unpack('!H', card_val[:2])[0]
-
-                        if cookie != MAGIC_COOKIE or msg_type != MSG_TYPE_PAYLOAD:
-                            print("Received invalid packet from server, ignoring...")
-                            continue
-
-                        # If we got a real card, add to sum
-                        if rank > 0:
-                            cards_received_counter += 1
-                            if cards_received_counter == 1:
-                                dealer_hand_ranks.append(rank)
-                                d_sum = calculate_hand_total(dealer_hand_ranks)
-                                print(f"Dealer's visible card: {decode_card(card_val)}")
-                            elif my_turn:
-                                current_hand_ranks.append(rank)
-                                current_sum = calculate_hand_total(current_hand_ranks)
-                                print(f"Server dealt: {decode_card(card_val)} (Sum: {current_sum})")
-                            else:
-                                dealer_hand_ranks.append(rank)
-                                d_sum = calculate_hand_total(dealer_hand_ranks)
-                                print(f"Dealer dealt: {decode_card(card_val)} (Sum: {d_sum})")
-
-                        if result != RESULT_ACTIVE:
-                            if result == RESULT_WIN:
-                                print(f"Result: YOU WIN!")
-                                wins += 1
-                            elif result == RESULT_LOSS:
-                                print(f"Result: YOU LOSE!")
-                            elif result == RESULT_TIE:
-                                print(f"Result: IT'S A TIE!")
-
-                            round_over = True
-                            rounds_played += 1
-                            if i + 1 < len(packets):
-                                leftover_packets = packets[i + 1:]
-                            break
+                    cookie, msg_type, result, rank, suit = next_frame()
+
+                    if cookie != MAGIC_COOKIE or msg_type != MSG_TYPE_PAYLOAD:
+                        print("Received invalid packet from server, ignoring...")
+                        continue
+
+                    # If we got a real card, add to sum
+                    if rank > 0:
+                        cards_received_counter += 1
+                        if cards_received_counter == 1:
+                            dealer_hand_ranks.append(rank)
+                            print(f"Dealer's visible card: {card_text(rank, suit)}")
+                        elif my_turn:
+                            current_hand_ranks.append(rank)
+                            current_sum = calculate_hand_total(current_hand_ranks)
+                            print(f"Server dealt: {card_text(rank, suit)} (Sum: {current_sum})")
                         else:
-                            server_requesting_move = True
-
-                    # 3. ACTION PHASE
-                    if server_requesting_move and not round_over and len(leftover_packets) == 0:
-
-
-                        if len(current_hand_ranks) < 2:
-                            continue
-                        print("Your hand is active.")
+                            dealer_hand_ranks.append(rank)
+                            d_sum = calculate_hand_total(dealer_hand_ranks)
+                            print(f"Dealer dealt: {card_text(rank, suit)} (Sum: {d_sum})")
+
+                    if result == RESULT_BUSY:
+                        raise ServerBusy("Server busy")
+                    if result == RESULT_TIMEOUT:
+                        raise ConnectionError("Server timed out waiting for our move")
+
+                    if result != RESULT_ACTIVE:
+                        if result == RESULT_WIN:
+                            print(f"Result: YOU WIN!")
+                            wins += 1
+                        elif result == RESULT_LOSS:
+                            print(f"Result: YOU LOSE!")
+                        elif result == RESULT_TIE:
+                            print(f"Result: IT'S A TIE!")
+
+                        round_over = True
+                        rounds_played += 1
+                        continue
+
+                    # The server waits for a move after each of our cards once
+                    # we hold two, unless that card took us over 21
+                    if not my_turn or rank == 0 or len(current_hand_ranks) < 2:
+                        continue
+                    if calculate_hand_total(current_hand_ranks) > 21:
+                        continue
+
+                    # ACTION PHASE
+                    print("Your hand is active.")
+                    if self.strategy:
+                        hit = self.strategy.should_hit(calculate_hand_total(current_hand_ranks),
+                                                       upcard_value(dealer_hand_ranks[0]))
+                        move = 'h' if hit else 's'
+                    else:
+                        if self.advisor:
+                            hit = self.advisor.should_hit(calculate_hand_total(current_hand_ranks),
+                                                          upcard_value(dealer_hand_ranks[0]))
+                            print(f"Advisor says: {'Hit' if hit else 'Stand'}")
                         while True:
                             move = input("Action (h = Hit, s = Stand): ").lower()
                             if move in ['h', 's']:
                                 break
                             print("Invalid input.")
 
-                        if move == 's':
-                            my_turn = False
+                    if move == 's':
+                        my_turn = False
 
-                        decision = CMD_HIT if move == 'h' else CMD_STAND
-                        packet = struct.pack('!IB5s', MAGIC_COOKIE, MSG_TYPE_PAYLOAD, decision.encode('utf-8'))
-                        self.tcp_socket.sendall(packet)
-                        print(f"Sent decision: {decision}")
+                    # In auto-play the server makes the same move itself
+                    if self.autoplay:
+                        continue
+
+                    decision = CMD_HIT if move == 'h' else CMD_STAND
+                    self.tcp_socket.sendall(HIT_FRAME if move == 'h' else STAND_FRAME)
+                    print(f"Sent decision: {decision}")
 
             # End of all rounds
             win_rate = (wins / rounds_played * 100) if rounds_played > 0 else 0.0
             print(f"\nFinished playing {rounds_played} rounds, win rate: {win_rate:.1f}%")
+            return True
+
+        except ServerBusy:
+            raise
 
         except Exception as e:
             print(f"Game error: {e}")
-        finally:
-            if hasattr(self, 'tcp_socket'): self.tcp_socket.close()
+            return False
 
     def start(self):
         """
@@ -279,14 +428,24 @@ class Client:
         """
         while True:
             self.listen_for_offers()
-            if self.server_ip and self.server_port:
-                self.connect_to_server()
+            while self.server_ip and self.server_port:
+                # Keep playing on this connection; look for offers again only if it drops
+                self.connect_to_server(games=None)
 
-                # Reset for next game
-                self.server_ip = None
-                self.server_port = None
+                # A busy server answers at once: try the next offer without listening again
+                if not (self.server_busy and self.fail_over()):
+                    break
+
+            # Reset for next game
+            self.server_ip = None
+            self.server_port = None
 
 
 if __name__ == "__main__":
-    client = Client()
+    parser = argparse.ArgumentParser(description="Interactive blackjack client")
+    parser.add_argument('--advise', nargs='?', const='optimal', metavar='STRATEGY',
+                        help="show a strategy's move before each decision (default: optimal)")
+    args = parser.parse_args()
+
+    client = Client(advisor=parse_strategy(args.advise) if args.advise else None)
     client.start()
\ No newline at end of file
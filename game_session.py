@@ -0,0 +1,509 @@
+"""
+The server side of a game, with no I/O.
+
+GameSession is a state machine for one client connection: it is fed the
+bytes received from the client and returns the payload frames to send back.
+The threaded server, the asyncio server and socket-free harnesses
+(benchmarks/bench_session.py) all drive the same session, so the rules live
+in one place: the game rules, request and decision parsing, and the frames.
+"""
+from functools import partial
+from time import perf_counter
+from cards import card_value, Shoe, SHOE_DECKS, SHOE_PENETRATION, NO_CARD, CARD_VALUES
+from strategies import StandOn, LookupTable
+from utils import MAGIC_COOKIE, MSG_TYPE_REQUEST, MSG_TYPE_PAYLOAD, MSG_TYPE_AUTOPLAY
+from utils import CMD_HIT, CMD_STAND
+from utils import RESULT_ACTIVE, RESULT_TIE, RESULT_LOSS, RESULT_WIN
+from protocol import REQUEST_SIZE, CLIENT_PAYLOAD_SIZE, SERVER_FRAMES, HIT_FRAME, STAND_FRAME
+from protocol import unpack_request_from, unpack_client_payload_from
+from protocol import AUTOPLAY_REQUEST_SIZE, AUTOPLAY_SUMMARY, AUTOPLAY_TABLE, REQUEST_HEADER_SIZE
+from protocol import request_size, unpack_autoplay_request_from, pack_summary
+from tracing import REQUEST, DEAL, DECISION, DEALER_TURN, AUTOPLAY
+
+MAX_ROUNDS = 255
+
+ACTIVE_FRAMES = SERVER_FRAMES[RESULT_ACTIVE]  # card code -> "round goes on" frame
+
+
+def dealer_turn(deck: Shoe, dealer_cards: list) -> tuple[list, int, bool]:
+    """
+    Executes dealer logic.
+    
+    Returns:
+        dealer_cards: final list of cards
+        dealer_total: final sum
+        dealer_bust: True if sum > 21
+    """
+    dealer_total = sum(card_value(c) for c in dealer_cards)
+
+    while dealer_total < 17:
+        card = deck.draw()
+        dealer_cards.append(card)
+        dealer_total += card_value(card)
+
+    dealer_bust = dealer_total > 21
+    return dealer_cards, dealer_total, dealer_bust
+
+
+def decide_winner(client_total: int, dealer_total: int,
+                  client_bust: bool, dealer_bust: bool) -> int:
+    """
+    Returns result code:
+    0x3 → client win
+    0x2 → client loss
+    0x1 → tie
+    """
+
+    if client_bust:
+        return RESULT_LOSS  # loss
+    if dealer_bust:
+        return RESULT_WIN  # win
+
+    if client_total > dealer_total:
+        return RESULT_WIN
+    if dealer_total > client_total:
+        return RESULT_LOSS
+    return RESULT_TIE
+
+
+class RequestParseError(Exception):
+    pass
+
+
+def parse_request_packet(data: bytes):
+    """
+    Parses a client request packet.
+
+    Returns:
+        rounds (int)
+        team_name (str)
+
+    Raises:
+        RequestParseError on any validation failure.
+    """
+
+    if len(data) != REQUEST_SIZE:
+        raise RequestParseError("Invalid request length")
+
+    magic, msg_type, rounds, name_bytes = unpack_request_from(data)
+    return check_request_fields(magic, msg_type, MSG_TYPE_REQUEST, rounds, name_bytes)
+
+
+def parse_autoplay_packet(data: bytes):
+    """
+    Parses an auto-play request (see protocol.AUTOPLAY_REQUEST).
+
+    Returns:
+        rounds (int)
+        team_name (str)
+        strategy (StandOn or LookupTable)
+        summary (bool): answer with a summary frame instead of payload frames
+
+    Raises:
+        RequestParseError on any validation failure.
+    """
+
+    if len(data) != AUTOPLAY_REQUEST_SIZE:
+        raise RequestParseError("Invalid request length")
+
+    magic, msg_type, rounds, name_bytes, flags, threshold, table = unpack_autoplay_request_from(data)
+    rounds, team_name = check_request_fields(magic, msg_type, MSG_TYPE_AUTOPLAY, rounds, name_bytes)
+
+    if flags & AUTOPLAY_TABLE:
+        strategy = LookupTable.from_bytes(table)
+    else:
+        strategy = StandOn(threshold)
+
+    return rounds, team_name, strategy, bool(flags & AUTOPLAY_SUMMARY)
+
+
+def check_request_fields(magic: int, msg_type: int, expected_type: int,
+                         rounds: int, name_bytes: bytes):
+    """
+    Validation shared by both request kinds. Returns (rounds, team_name).
+    """
+    if magic != MAGIC_COOKIE:
+        raise RequestParseError("Bad magic cookie")
+
+    if msg_type != expected_type:
+        raise RequestParseError("Bad message type")
+
+    if rounds == 0 or rounds > MAX_ROUNDS:
+        raise RequestParseError("Invalid number of rounds")
+
+    team_name = name_bytes.rstrip(b'\x00').decode('utf-8', errors='ignore')
+
+    if not team_name:
+        raise RequestParseError("Empty team name")
+
+    return rounds, team_name
+
+
+def build_server_payload(result: int, card: int = NO_CARD) -> bytes:
+    """
+    card: encoded card (see cards.encode_card) or NO_CARD/None
+    If round is not over, card must be provided.
+    If round is over, rank/suit should be 0.
+    """
+    return SERVER_FRAMES[result][card or NO_CARD]
+
+
+def parse_client_payload(data: bytes) -> str:
+    # Fast path: a valid decision is one of exactly two byte strings
+    if data == STAND_FRAME:
+        return CMD_STAND
+    if data == HIT_FRAME:
+        return CMD_HIT
+
+    if len(data) != CLIENT_PAYLOAD_SIZE:
+        raise ValueError("Invalid client payload length")
+    magic, msg_type, decision = unpack_client_payload_from(data)
+    
+    # Validate the data
+    if magic != MAGIC_COOKIE:
+        raise ValueError("Bad magic cookie")
+    if msg_type != MSG_TYPE_PAYLOAD:
+        raise ValueError("Bad message type")
+
+    decision = decision.decode('ascii')
+
+    if decision not in ("Hittt", "Stand"):
+        raise ValueError("Invalid decision value")
+
+    return decision
+
+
+def autoplay_round(deck: Shoe, strategy, frames: list = None, record=None) -> int:
+    """
+    Plays one round with the client's strategy making its decisions.
+    Same deal order, rules and payload frames as a GameSession round; the frames are
+    appended to frames unless it is None. Returns the result code.
+
+    record: optional callable(client_cards, dealer_cards, client_total,
+    dealer_total, result) given the finished round, e.g. for the round log.
+    """
+    deck.start_round()
+
+    client_cards = [deck.draw(), deck.draw()]
+    dealer_cards = [deck.draw(), deck.draw()]
+    client_total = card_value(client_cards[0]) + card_value(client_cards[1])
+    upcard = card_value(dealer_cards[0])
+
+    if frames is not None:
+        frames.append(SERVER_FRAMES[RESULT_ACTIVE][dealer_cards[0]])
+        frames.append(SERVER_FRAMES[RESULT_ACTIVE][client_cards[0]])
+        frames.append(SERVER_FRAMES[RESULT_ACTIVE][client_cards[1]])
+
+    # ---- Player turn, decided here instead of over the network ----
+    while client_total <= 21 and strategy.should_hit(client_total, upcard):
+        card = deck.draw()
+        client_cards.append(card)
+        client_total += card_value(card)
+        if frames is not None:
+            frames.append(SERVER_FRAMES[RESULT_ACTIVE][card])
+
+    if client_total > 21:
+        result = RESULT_LOSS
+        dealer_total = card_value(dealer_cards[0]) + card_value(dealer_cards[1])
+    else:
+        # ---- Dealer turn ----
+        dealer_cards, dealer_total, dealer_bust = dealer_turn(deck, dealer_cards)
+        if frames is not None:
+            for card in dealer_cards[1:]:
+                frames.append(SERVER_FRAMES[RESULT_ACTIVE][card])
+        result = decide_winner(client_total, dealer_total, False, dealer_bust)
+
+    if frames is not None:
+        frames.append(SERVER_FRAMES[result][NO_CARD])
+    if record:
+        record(client_cards, dealer_cards, client_total, dealer_total, result)
+    return result
+
+
+class Player:
+    """
+    What the server keeps for one client whatever the game is run by: the
+    bytes received and not yet played, where the client is in the protocol,
+    its game counters and current hand. GameSession and tables.Seat build on
+    it, so both cut and parse requests and decisions the same way.
+    """
+
+    WAIT_REQUEST = 'request'
+    WAIT_DECISION = 'decision'
+
+    def __init__(self):
+        self.buffer = bytearray()
+        self.skip_newline = False
+        self.state = self.WAIT_REQUEST
+
+        self.games = 0
+        self.decisions = 0
+        self.team_name = None
+        self.rounds = 0
+        self.round_num = 0
+        self.games_won = 0
+
+        # Current round
+        self.client_total = 0
+        self.client_cards = None
+
+    def next_message(self, start: int) -> tuple[bytes, int]:
+        """
+        Cuts the next message out of the buffer from offset start: a decision
+        payload while WAIT_DECISION, a request (plain or auto-play) while
+        WAIT_REQUEST. Returns it with the offset after it, or (None, start)
+        if it is not complete yet or the player waits on neither. The caller
+        drops buffer[:start] when done.
+        """
+        buffer = self.buffer
+        # The newline that follows a request belongs to the request framing
+        if self.skip_newline and start < len(buffer):
+            if buffer[start] == 0x0a:
+                start += 1
+            self.skip_newline = False
+
+        pending = len(buffer) - start
+        if self.state == self.WAIT_DECISION:
+            if pending < CLIENT_PAYLOAD_SIZE:
+                return None, start
+            size = CLIENT_PAYLOAD_SIZE
+        elif self.state == self.WAIT_REQUEST:
+            if pending < REQUEST_HEADER_SIZE:
+                return None, start
+            size = request_size(buffer[start + 4])
+            if pending < size:
+                return None, start
+            self.skip_newline = True
+        else:
+            return None, start
+        return bytes(buffer[start:start + size]), start + size
+
+    def start_game(self, rounds: int, team_name: str):
+        """
+        Resets the counters for a new game on the connection.
+        """
+        self.games += 1
+        self.team_name = team_name
+        self.rounds = rounds
+        self.round_num = 0
+        self.games_won = 0
+
+
+class GameSession(Player):
+    """
+    Server side of one client connection, with no I/O.
+
+    receive(data) consumes the bytes read from the client and returns the
+    frames to write back, in order, as one batch; connection_closed() is
+    called when the client hangs up. The rules and frames are those of the
+    former blocking game loop: the dealer's second card stays hidden until
+    the client stands, a client bust ends the round without a dealer turn,
+    games may follow each other on the connection (keep-alive), and
+    auto-play requests are played without waiting on the client.
+
+    on_round: optional callable(result) invoked after every finished round.
+    log: callable for progress lines, print by default; None keeps it quiet
+    (and skips formatting them, which matters at 100k+ rounds/sec).
+    round_log: optional roundlog.RoundLog that gets a record of every round.
+    session_id: optional id logged with the first game, to find the session's
+    seed later (see rng.py).
+    trace: optional tracing.SessionTrace that gets a span for every request
+    parse, deal, decision and dealer turn.
+    """
+
+    def __init__(self, deck: Shoe = None, on_round=None, log=print, round_log=None,
+                 session_id: int = None, trace=None):
+        super().__init__()
+        # One long-lived shoe per session instead of a new deck every round
+        self.deck = deck or Shoe(SHOE_DECKS, SHOE_PENETRATION)
+        self.session_id = session_id
+        self.on_round = on_round
+        self.log = log
+        self.round_log = round_log
+        self.trace = trace
+
+        # Current round, with the client's hand
+        self.upcard = 0
+        self.dealer_cards = None
+
+    def receive(self, data) -> list:
+        """
+        Consumes received bytes; returns the frames to send, possibly none.
+        Raises RequestParseError or ValueError on a malformed message.
+        """
+        # Fast path: exactly one decision, the usual read while playing
+        if (self.state == self.WAIT_DECISION and len(data) == CLIENT_PAYLOAD_SIZE
+                and not self.buffer and not self.skip_newline):
+            frames = []
+            self._decide(parse_client_payload(bytes(data)), frames)
+            return frames
+
+        self.buffer += data
+        frames = []
+        start = 0
+
+        while True:
+            message, start = self.next_message(start)
+            if message is None:
+                break
+            if self.state == self.WAIT_DECISION:
+                self._decide(parse_client_payload(message), frames)
+            else:
+                self._start_game(message, frames)
+
+        del self.buffer[:start]
+        return frames
+
+    def connection_closed(self) -> bool:
+        """
+        Returns True if the client closed cleanly between games, False if it
+        left mid-round. Raises ConnectionError if it left before its first
+        request or in the middle of one.
+        """
+        if self.state == self.WAIT_DECISION:
+            if self.log:
+                self.log(f"Client '{self.team_name}' disconnected mid-round")
+            return False
+        if self.games == 0 or self.buffer:
+            raise ConnectionError("Client disconnected")
+        return True
+
+    def _start_game(self, request: bytes, frames: list):
+        start = perf_counter() if self.trace else 0.0
+        autoplay = request[4] == MSG_TYPE_AUTOPLAY
+        if autoplay:
+            rounds, team_name, strategy, summary = parse_autoplay_packet(request)
+        else:
+            rounds, team_name = parse_request_packet(request)
+        if self.trace:
+            self.trace.add(REQUEST, start)
+
+        self.start_game(rounds, team_name)
+        if self.log and self.games == 1 and self.session_id is not None:
+            self.log(f"Client '{team_name}' connected (session {self.session_id}), "
+                     f"playing {rounds} rounds")
+        elif self.log and self.games == 1:
+            self.log(f"Client '{team_name}' connected, playing {rounds} rounds")
+        elif self.log:
+            self.log(f"Client '{team_name}' started game {self.games} on the same connection, "
+                     f"playing {rounds} rounds")
+
+        if autoplay:
+            self._autoplay(strategy, summary, frames)
+        else:
+            self._start_round(frames)
+
+    def _autoplay(self, strategy, summary: bool, frames: list):
+        start = perf_counter() if self.trace else 0.0
+        counts = {RESULT_WIN: 0, RESULT_LOSS: 0, RESULT_TIE: 0}
+        round_frames = None if summary else frames
+        record = partial(self.round_log.record, self.team_name) if self.round_log else None
+
+        for _ in range(self.rounds):
+            result = autoplay_round(self.deck, strategy, round_frames, record)
+            counts[result] += 1
+            if self.on_round:
+                self.on_round(result)
+
+        if summary:
+            frames.append(pack_summary(counts[RESULT_WIN], counts[RESULT_LOSS], counts[RESULT_TIE]))
+        if self.trace:
+            self.trace.add(AUTOPLAY, start)
+
+        if self.log:
+            self.log(f"Client '{self.team_name}' auto-played {self.rounds} rounds with {strategy}, "
+                     f"won {counts[RESULT_WIN]}/{self.rounds} games")
+
+    def _start_round(self, frames: list):
+        start = perf_counter() if self.trace else 0.0
+        self.round_num += 1
+        if self.log:
+            self.log(f"Starting round {self.round_num}")
+
+        deck = self.deck
+        deck.start_round()
+
+        # ---- Initial deal ----
+        client_cards = [deck.draw(), deck.draw()]
+        dealer_cards = [deck.draw(), deck.draw()]
+
+        self.client_total = CARD_VALUES[client_cards[0]] + CARD_VALUES[client_cards[1]]
+        self.upcard = CARD_VALUES[dealer_cards[0]]  # second card hidden
+        self.client_cards = client_cards
+        self.dealer_cards = dealer_cards
+
+        # Dealer's visible card, then the client cards
+        frames += (ACTIVE_FRAMES[dealer_cards[0]],
+                   ACTIVE_FRAMES[client_cards[0]],
+                   ACTIVE_FRAMES[client_cards[1]])
+        if self.trace:
+            self.trace.add(DEAL, start)
+
+        self._player_turn(frames)
+
+    def _player_turn(self, frames: list):
+        if self.client_total > 21:
+            self._finish_round(frames, client_bust=True)
+        else:
+            self.state = self.WAIT_DECISION
+
+    def _decide(self, decision: str, frames: list):
+        start = perf_counter() if self.trace else 0.0
+        self.decisions += 1
+        if decision == CMD_STAND:
+            if self.trace:
+                self.trace.add(DECISION, start)
+            self._finish_round(frames, client_bust=False)
+
+        elif decision == CMD_HIT:
+            card = self.deck.draw()
+            self.client_cards.append(card)
+            self.client_total += CARD_VALUES[card]
+            frames.append(ACTIVE_FRAMES[card])
+            # Closed before the round ends, so the dealer turn and the next
+            # deal are only counted in their own spans
+            if self.trace:
+                self.trace.add(DECISION, start)
+            self._player_turn(frames)
+        else:
+            raise ValueError("Invalid client decision")
+
+    def _finish_round(self, frames: list, client_bust: bool):
+        # ---- Dealer turn ----
+        dealer_total = self.upcard  # what the client saw, if it busted
+        dealer_bust = False
+
+        if not client_bust:
+            start = perf_counter() if self.trace else 0.0
+            dealer_cards, dealer_total, dealer_bust = dealer_turn(self.deck, self.dealer_cards)
+            if self.trace:
+                self.trace.add(DEALER_TURN, start)
+
+            # Reveal hidden dealer card, then any additional dealer cards
+            for card in dealer_cards[1:]:
+                frames.append(ACTIVE_FRAMES[card])
+
+        # ---- Decide winner ----
+        result = decide_winner(self.client_total, dealer_total, client_bust, dealer_bust)
+        if result == RESULT_WIN:
+            self.games_won += 1
+
+        # ---- Dealer cards and final result go out in the same batch ----
+        frames.append(SERVER_FRAMES[result][NO_CARD])
+
+        if self.on_round:
+            self.on_round(result)
+        if self.round_log:
+            if client_bust:
+                # Log the full hand, hidden card included
+                dealer_total += CARD_VALUES[self.dealer_cards[1]]
+            self.round_log.record(self.team_name, self.client_cards, self.dealer_cards,
+                                  self.client_total, dealer_total, result)
+        if self.log:
+            self.log(f"Client '{self.team_name}' finished all rounds, "
+                     f"won {self.games_won}/{self.round_num} games")
+
+        if self.round_num < self.rounds:
+            self._start_round(frames)
+        else:
+            self.state = self.WAIT_REQUEST
@@ -0,0 +1,119 @@
+"""
+Live leaderboard of every team that played on this server.
+
+Game threads record each finished round into their own shard (metrics.ThreadShards),
+a dict of team -> [rounds, wins, losses, ties], so sessions finishing rounds
+at once never wait on each other. A merger thread folds the shards into the
+totals every MERGE_INTERVAL and updates the top K teams in place: wins never
+go down, so only teams that won since the last merge can enter or move up.
+Reading the top K is O(K), from the admin port:
+    echo leaderboard | nc 127.0.0.1 2049
+"""
+import bisect
+import threading
+import time
+import metrics
+from utils import RESULT_TIE, RESULT_LOSS, RESULT_WIN
+
+TOP_K = 10
+MERGE_INTERVAL = 0.5  # seconds
+
+ROUNDS, WINS, LOSSES, TIES = range(4)
+RESULT_COLUMNS = {RESULT_WIN: WINS, RESULT_LOSS: LOSSES, RESULT_TIE: TIES}
+
+
+def _merge_teams(into: dict, shard: dict):
+    for team, counts in list(shard.items()):
+        mine = into.get(team)
+        if mine is None:
+            into[team] = list(counts)
+        else:
+            for i, value in enumerate(counts):
+                mine[i] += value
+
+
+class Leaderboard:
+    """
+    Per-team rounds, wins, losses and ties, ranked by wins (ties of wins by
+    team name).
+    """
+
+    def __init__(self, k: int = TOP_K, merge_interval: float = MERGE_INTERVAL):
+        self.k = k
+        self.merge_interval = merge_interval
+        self._shards = metrics.ThreadShards(dict, _merge_teams)
+        self.lock = threading.Lock()  # guards the merged view; game threads never take it
+        self.totals = {}  # team -> [rounds, wins, losses, ties], as of the last merge
+        self.top = []     # (-wins, team) of the best k teams, best first
+        self.merged_at = None
+        self.started = False
+
+    def record(self, team_name: str, result: int):
+        shard = self._shards.mine()
+        counts = shard.get(team_name)
+        if counts is None:
+            counts = shard[team_name] = [0, 0, 0, 0]
+        counts[ROUNDS] += 1
+        column = RESULT_COLUMNS.get(result)
+        if column:
+            counts[column] += 1
+
+    def merge(self):
+        """
+        Folds every shard into the totals and updates the top k.
+        Costs O(shards x teams) for the merge, plus O(k) per team that won.
+        """
+        merged = self._shards.total()
+        with self.lock:
+            for team, counts in merged.items():
+                old = self.totals.get(team)
+                if old is not None and old[WINS] == counts[WINS]:
+                    continue
+                self._rank(team, old[WINS] if old else None, counts[WINS])
+            self.totals = merged
+            self.merged_at = time.time()
+
+    def _rank(self, team: str, old_wins, wins: int):
+        top = self.top
+        if old_wins is not None:
+            i = bisect.bisect_left(top, (-old_wins, team))
+            if i < len(top) and top[i] == (-old_wins, team):
+                del top[i]
+        entry = (-wins, team)
+        if len(top) < self.k or entry < top[-1]:
+            bisect.insort(top, entry)
+            if len(top) > self.k:
+                top.pop()
+
+    def snapshot(self, k: int = None) -> dict:
+        """
+        The top k teams as of the last merge.
+        """
+        with self.lock:
+            top = []
+            for _, team in self.top[:k]:
+                counts = self.totals[team]
+                top.append({
+                    'team': team, 'rounds': counts[ROUNDS], 'wins': counts[WINS],
+                    'losses': counts[LOSSES], 'ties': counts[TIES],
+                    'win_rate': counts[WINS] / counts[ROUNDS] if counts[ROUNDS] else 0.0,
+                })
+            return {'merged_at': self.merged_at, 'teams': len(self.totals), 'top': top}
+
+    def start(self):
+        """
+        Starts the merger thread and serves the leaderboard on the admin port.
+        """
+        if self.started:
+            return
+        self.started = True
+        metrics.ADMIN_COMMANDS['leaderboard'] = self.snapshot
+        threading.Thread(target=self._merge_loop, daemon=True).start()
+
+    def _merge_loop(self):
+        while True:
+            time.sleep(self.merge_interval)
+            self.merge()
+
+
+LEADERBOARD = Leaderboard()
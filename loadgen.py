@@ -0,0 +1,163 @@
+"""
+Load generator: many concurrent headless sessions against one server.
+
+Every session connects over TCP (no UDP discovery), requests --rounds rounds
+--games times on the same connection and plays them with --strategy. Reports rounds/sec, connect latency and the
+per-decision round trip (decision sent -> next frame received).
+
+    python server.py &
+    python loadgen.py --sessions 2000 --rounds 20
+"""
+import argparse
+import asyncio
+import resource
+import time
+from cards import calculate_hand_total
+from metrics import percentile
+from strategies import parse_strategy, upcard_value
+from protocol import SERVER_PAYLOAD, SERVER_PAYLOAD_SIZE, HIT_FRAME, STAND_FRAME, pack_request
+from protocol import pack_autoplay_request
+from utils import RESULT_ACTIVE, RESULT_WIN, RESULT_BUSY, RESULT_TIMEOUT
+
+
+class LoadStats:
+    def __init__(self):
+        self.connect_latencies = []
+        self.decision_latencies = []
+        self.rounds = 0
+        self.wins = 0
+        self.errors = {}
+
+    def error(self, reason: str):
+        self.errors[reason] = self.errors.get(reason, 0) + 1
+
+
+async def read_frame(reader: asyncio.StreamReader) -> tuple:
+    return SERVER_PAYLOAD.unpack(await reader.readexactly(SERVER_PAYLOAD_SIZE))
+
+
+async def play_session(host: str, port: int, rounds: int, strategy, name: str,
+                       stats: LoadStats, timeout: float, games: int = 1, autoplay: bool = False):
+    start = time.perf_counter()
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        stats.error(f"connect: {type(e).__name__}")
+        return
+    stats.connect_latencies.append(time.perf_counter() - start)
+
+    try:
+        # Every game after the first reuses the connection (keep-alive)
+        for _ in range(games):
+            if autoplay:
+                writer.write(pack_autoplay_request(rounds, name, strategy) + b'\n')
+            else:
+                writer.write(pack_request(rounds, name) + b'\n')
+
+            for _ in range(rounds):
+                cards_seen = 0
+                upcard = 0
+                hand = []
+                my_turn = True
+                sent_at = None
+
+                while True:
+                    _, _, result, rank, _ = await asyncio.wait_for(read_frame(reader), timeout)
+                    if sent_at is not None:
+                        stats.decision_latencies.append(time.perf_counter() - sent_at)
+                        sent_at = None
+
+                    if rank:
+                        cards_seen += 1
+                        if cards_seen == 1:
+                            upcard = upcard_value(rank)
+                        elif my_turn:
+                            hand.append(rank)
+
+                    if result == RESULT_BUSY:
+                        stats.error("busy")
+                        return
+                    if result == RESULT_TIMEOUT:
+                        stats.error("server timeout")
+                        return
+
+                    if result != RESULT_ACTIVE:
+                        stats.rounds += 1
+                        stats.wins += result == RESULT_WIN
+                        break
+
+                    # Same rule as Client.play_game: the server waits for a move
+                    # after each of our cards once we hold two, unless we busted
+                    if autoplay or not my_turn or not rank or len(hand) < 2:
+                        continue
+                    total = calculate_hand_total(hand)
+                    if total > 21:
+                        continue
+
+                    hit = strategy.should_hit(total, upcard)
+                    if not hit:
+                        my_turn = False
+                    sent_at = time.perf_counter()
+                    writer.write(HIT_FRAME if hit else STAND_FRAME)
+
+    except (ConnectionError, asyncio.IncompleteReadError):
+        stats.error("disconnected")
+    except asyncio.TimeoutError:
+        stats.error("timeout")
+    finally:
+        writer.close()
+
+
+async def run_load(host: str, port: int, sessions: int, rounds: int, strategy,
+                   concurrency: int, timeout: float, games: int = 1,
+                   autoplay: bool = False) -> tuple[LoadStats, float]:
+    stats = LoadStats()
+    limit = asyncio.Semaphore(concurrency)
+
+    async def limited(i: int):
+        async with limit:
+            await play_session(host, port, rounds, strategy, f"load-{i}", stats, timeout,
+                               games, autoplay)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited(i) for i in range(sessions)))
+    return stats, time.perf_counter() - start
+
+
+def report(stats: LoadStats, elapsed: float):
+    connect = sorted(stats.connect_latencies)
+    decisions = sorted(stats.decision_latencies)
+    print(f"sessions connected: {len(connect)}  rounds: {stats.rounds}  "
+          f"wins: {stats.wins}  elapsed: {elapsed:.2f}s")
+    print(f"rounds/sec: {stats.rounds / elapsed:.1f}")
+    for label, values in (("connect", connect), ("decision rtt", decisions)):
+        print(f"{label:<13} p50 {percentile(values, 50) * 1000:8.3f} ms  "
+              f"p95 {percentile(values, 95) * 1000:8.3f} ms  "
+              f"p99 {percentile(values, 99) * 1000:8.3f} ms  (n={len(values)})")
+    for reason, count in sorted(stats.errors.items()):
+        print(f"errors[{reason}]: {count}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Concurrent load generator for the blackjack server")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2048)
+    parser.add_argument('--sessions', type=int, default=1000)
+    parser.add_argument('--concurrency', type=int, default=1000,
+                        help="maximum sessions open at the same time")
+    parser.add_argument('--rounds', type=int, default=10)
+    parser.add_argument('--games', type=int, default=1,
+                        help="games played back to back on each connection")
+    parser.add_argument('--strategy', default='stand:17')
+    parser.add_argument('--timeout', type=float, default=30.0)
+    parser.add_argument('--autoplay', action='store_true',
+                        help="send the strategy with the request; the server streams every round")
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    stats, elapsed = asyncio.run(run_load(args.host, args.port, args.sessions, args.rounds,
+                                          parse_strategy(args.strategy), args.concurrency,
+                                          args.timeout, args.games, args.autoplay))
+    report(stats, elapsed)
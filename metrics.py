@@ -0,0 +1,359 @@
+"""
+In-process metrics: counters, gauges and latency histograms.
+
+Recording is lock-free: every thread updates its own shard (a plain list or
+dict reached through threading.local) and readers merge all shards. When a
+thread exits, its shard is folded into a retired total so thread churn does
+not grow memory. Recording costs a few hundred nanoseconds.
+
+Metrics are read through a local admin TCP port (plain text, or JSON when the
+request line contains "json"; HTTP GET works too) and an optional snapshot
+file rewritten periodically.
+"""
+import bisect
+import itertools
+import json
+import os
+import socket
+import threading
+import time
+
+ADMIN_BIND_ADDR = '127.0.0.1'  # admin data is local only
+
+# Latency buckets in seconds, 50us .. 30s
+LATENCY_BUCKETS = (
+    0.00005, 0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025,
+    0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0,
+)
+
+
+class _ShardHolder:
+    """
+    Thread-local owner of one shard; hands the shard back when the thread ends.
+    """
+    __slots__ = ('shard', 'owner')
+
+    def __init__(self, shard, owner):
+        self.shard = shard
+        self.owner = owner
+
+    def __del__(self):
+        self.owner._retire(self.shard)
+
+
+class ThreadShards:
+    """
+    One mutable shard per thread plus the merged shards of finished threads.
+    new_shard() builds an empty shard, merge(into, shard) adds one into another.
+    """
+
+    def __init__(self, new_shard, merge):
+        self.new_shard = new_shard
+        self.merge = merge
+        self.local = threading.local()
+        self.lock = threading.Lock()
+        self.live = []
+        self.retired = new_shard()
+
+    def mine(self):
+        try:
+            return self.local.holder.shard
+        except AttributeError:
+            shard = self.new_shard()
+            with self.lock:
+                self.live.append(shard)
+            self.local.holder = _ShardHolder(shard, self)
+            return shard
+
+    def _retire(self, shard):
+        with self.lock:
+            self.merge(self.retired, shard)
+            self.live = [s for s in self.live if s is not shard]
+
+    def total(self):
+        with self.lock:
+            shards = list(self.live)
+            total = self.new_shard()
+            self.merge(total, self.retired)
+        for shard in shards:
+            self.merge(total, shard)
+        return total
+
+
+def _merge_lists(into: list, shard: list):
+    for i, value in enumerate(shard):
+        into[i] += value
+
+
+def _merge_dicts(into: dict, shard: dict):
+    for key, value in list(shard.items()):
+        into[key] = into.get(key, 0) + value
+
+
+class Counter:
+    def __init__(self, name: str, help_text: str = ''):
+        self.name = name
+        self.help = help_text
+        self._shards = ThreadShards(lambda: [0], _merge_lists)
+
+    def inc(self, amount: int = 1):
+        self._shards.mine()[0] += amount
+
+    def value(self) -> int:
+        return self._shards.total()[0]
+
+
+class LabeledCounter:
+    """
+    A counter per label value, e.g. disconnects by reason.
+    """
+    def __init__(self, name: str, label: str, help_text: str = ''):
+        self.name = name
+        self.label = label
+        self.help = help_text
+        self._shards = ThreadShards(dict, _merge_dicts)
+
+    def inc(self, label_value: str, amount: int = 1):
+        shard = self._shards.mine()
+        shard[label_value] = shard.get(label_value, 0) + amount
+
+    def value(self) -> dict:
+        return self._shards.total()
+
+
+class Gauge:
+    """
+    A level that goes up and down (inc/dec), or is read from a callback.
+    """
+    def __init__(self, name: str, help_text: str = '', function=None):
+        self.name = name
+        self.help = help_text
+        self.function = function
+        self._shards = ThreadShards(lambda: [0], _merge_lists)
+
+    def inc(self, amount: int = 1):
+        self._shards.mine()[0] += amount
+
+    def dec(self, amount: int = 1):
+        self._shards.mine()[0] -= amount
+
+    def value(self):
+        if self.function:
+            return self.function()
+        return self._shards.total()[0]
+
+
+def percentile(sorted_values: list, p: float) -> float:
+    """
+    The p-th percentile (0-100) of already sorted samples, nearest rank;
+    0.0 for no samples. For reports over raw samples (loadgen, replay,
+    tracing) rather than a Histogram's buckets.
+    """
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(p / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+class Histogram:
+    """
+    Fixed-bucket histogram. A shard is [count per bucket..., +Inf count, sum].
+    """
+    def __init__(self, name: str, help_text: str = '', buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help_text
+        self.buckets = tuple(buckets)
+        width = len(self.buckets) + 2
+        self._sum_index = width - 1
+        self._shards = ThreadShards(lambda: [0] * width, _merge_lists)
+
+    def observe(self, value: float):
+        shard = self._shards.mine()
+        shard[bisect.bisect_left(self.buckets, value)] += 1
+        shard[self._sum_index] += value
+
+    def value(self) -> dict:
+        shard = self._shards.total()
+        counts = shard[:-1]
+        count = sum(counts)
+        cumulative = list(itertools.accumulate(counts))
+        return {
+            'count': count,
+            'sum': shard[self._sum_index],
+            # Cumulative, like Prometheus "le" buckets
+            'buckets': dict(zip([*map(str, self.buckets), '+Inf'], cumulative)),
+            'p50': self._quantile(counts, count, 0.50),
+            'p95': self._quantile(counts, count, 0.95),
+            'p99': self._quantile(counts, count, 0.99),
+        }
+
+    def _quantile(self, counts: list, count: int, q: float):
+        """
+        Upper bound of the bucket holding the q-quantile.
+        """
+        if not count:
+            return None
+        rank = q * count
+        seen = 0
+        for i, n in enumerate(counts):
+            seen += n
+            if seen >= rank:
+                return self.buckets[i] if i < len(self.buckets) else '+Inf'
+        return '+Inf'
+
+
+class MetricsRegistry:
+    def __init__(self):
+        self.metrics = {}
+        self.started = time.time()
+        self._last_counters = {}
+        self._last_time = time.monotonic()
+        self._rate_lock = threading.Lock()
+
+    def _register(self, metric):
+        self.metrics[metric.name] = metric
+        return metric
+
+    def counter(self, name: str, help_text: str = '') -> Counter:
+        return self._register(Counter(name, help_text))
+
+    def labeled_counter(self, name: str, label: str, help_text: str = '') -> LabeledCounter:
+        return self._register(LabeledCounter(name, label, help_text))
+
+    def gauge(self, name: str, help_text: str = '', function=None) -> Gauge:
+        return self._register(Gauge(name, help_text, function))
+
+    def histogram(self, name: str, help_text: str = '', buckets=LATENCY_BUCKETS) -> Histogram:
+        return self._register(Histogram(name, help_text, buckets))
+
+    def snapshot(self) -> dict:
+        """
+        Current value of every metric, plus per-second rates of the plain
+        counters since the previous snapshot (taken by any reader).
+        """
+        values = {name: metric.value() for name, metric in self.metrics.items()}
+
+        with self._rate_lock:
+            now = time.monotonic()
+            elapsed = max(now - self._last_time, 1e-9)
+            counters = {name: values[name] for name, metric in self.metrics.items()
+                        if isinstance(metric, Counter)}
+            rates = {name: (value - self._last_counters.get(name, 0)) / elapsed
+                     for name, value in counters.items()}
+            self._last_counters, self._last_time = counters, now
+
+        return {
+            'time': time.time(),
+            'uptime_seconds': time.time() - self.started,
+            'metrics': values,
+            'rates_per_second': rates,
+        }
+
+    def render_json(self) -> str:
+        return json.dumps(self.snapshot(), indent=2)
+
+    def render_text(self) -> str:
+        snap = self.snapshot()
+        lines = [f"uptime_seconds {snap['uptime_seconds']:.1f}"]
+        for name, value in snap['metrics'].items():
+            metric = self.metrics[name]
+            if metric.help:
+                lines.append(f"# {name}: {metric.help}")
+            if isinstance(metric, LabeledCounter):
+                for label_value, count in sorted(value.items()):
+                    lines.append(f'{name}{{{metric.label}="{label_value}"}} {count}')
+            elif isinstance(metric, Histogram):
+                for bound, count in value['buckets'].items():
+                    lines.append(f'{name}_bucket{{le="{bound}"}} {count}')
+                lines.append(f"{name}_count {value['count']}")
+                lines.append(f"{name}_sum {value['sum']:.6f}")
+                for q in ('p50', 'p95', 'p99'):
+                    lines.append(f"{name}_{q} {value[q]}")
+            else:
+                lines.append(f"{name} {value}")
+        for name, rate in snap['rates_per_second'].items():
+            lines.append(f"{name}_per_second {rate:.2f}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = MetricsRegistry()
+
+# Extra admin commands, e.g. {'leaderboard': callable returning a JSON-able object}
+ADMIN_COMMANDS = {}
+
+
+def handle_admin_request(request_line: str) -> tuple[str, str]:
+    """
+    Returns (content type, body) for one admin request line.
+    """
+    words = request_line.replace('/', ' ').split()
+    for name, command in ADMIN_COMMANDS.items():
+        if name in words:
+            return 'application/json', json.dumps(command(), indent=2)
+    if 'json' in words:
+        return 'application/json', REGISTRY.render_json()
+    return 'text/plain', REGISTRY.render_text()
+
+
+def admin_client_handler(conn: socket.socket):
+    try:
+        conn.settimeout(5)
+        request_line = conn.makefile('r', encoding='ascii', errors='replace').readline()
+        content_type, body = handle_admin_request(request_line)
+        payload = body.encode('utf-8')
+        if request_line.startswith('GET '):
+            header = (f"HTTP/1.0 200 OK\r\nContent-Type: {content_type}\r\n"
+                      f"Content-Length: {len(payload)}\r\n\r\n")
+            payload = header.encode('ascii') + payload
+        conn.sendall(payload)
+    except (OSError, ValueError):
+        pass
+    finally:
+        conn.close()
+
+
+def admin_server_loop(port: int):
+    """
+    Serves metrics on a local TCP port, one short request per connection:
+        echo json | nc 127.0.0.1 2049
+        curl 127.0.0.1:2049/json
+    """
+    server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    try:
+        server_sock.bind((ADMIN_BIND_ADDR, port))
+    except OSError as e:
+        # e.g. another server on this host has the port; serve without it
+        print(f"Metrics admin disabled, cannot bind {ADMIN_BIND_ADDR}:{port}: {e}")
+        server_sock.close()
+        return
+    server_sock.listen(16)
+    print(f"Metrics admin listening on {ADMIN_BIND_ADDR}:{port}")
+    try:
+        while True:
+            conn, _ = server_sock.accept()
+            admin_client_handler(conn)
+    finally:
+        server_sock.close()
+
+
+def snapshot_file_loop(path: str, interval: float):
+    """
+    Rewrites path with a JSON snapshot every interval seconds.
+    The file is replaced atomically, so readers never see a partial write.
+    """
+    tmp_path = path + '.tmp'
+    while True:
+        time.sleep(interval)
+        with open(tmp_path, 'w') as f:
+            f.write(REGISTRY.render_json())
+        os.replace(tmp_path, path)
+
+
+def start_metrics_threads(admin_port: int = None, snapshot_path: str = None,
+                          snapshot_interval: float = 10.0):
+    if admin_port:
+        threading.Thread(target=admin_server_loop, args=(admin_port,), daemon=True).start()
+    if snapshot_path:
+        threading.Thread(target=snapshot_file_loop, args=(snapshot_path, snapshot_interval),
+                         daemon=True).start()
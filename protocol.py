@@ -0,0 +1,224 @@
+"""
+Wire formats shared by client and server.
+
+All formats are precompiled struct.Struct objects. Hot paths use the
+pack_into/unpack_from helpers over buffers, and the server payload frames
+(every result x rank x suit) are built once at import time.
+"""
+import struct
+from cards import RANKS, SUITS, card_name
+from cards import decode_card as render_card_bytes
+from strategies import StandOn, LookupTable, TABLE_BYTES
+from utils import MAGIC_COOKIE, MSG_TYPE_OFFER, MSG_TYPE_REQUEST, MSG_TYPE_PAYLOAD
+from utils import MSG_TYPE_AUTOPLAY, MSG_TYPE_SUMMARY, MSG_TYPE_PROBE
+from utils import CMD_HIT, CMD_STAND
+from utils import RESULT_ACTIVE, RESULT_TIE, RESULT_LOSS, RESULT_WIN, RESULT_BUSY, RESULT_TIMEOUT
+
+# [Magic Cookie 4B] [Type 1B] [Server Port 2B] [Server Name 32B]
+OFFER = struct.Struct('!IBH32s')
+# Extended offer: the 39-byte offer followed by
+# [Active Sessions 2B] [Capacity 2B]. Old clients only read the first 39 bytes.
+OFFER_LOAD = struct.Struct('!HH')
+# Discovery probe, sent to PROBE_PORT: [Magic Cookie 4B] [Type 1B].
+# Servers answer it with an extended offer, unicast to the prober.
+PROBE = struct.Struct('!IB')
+# [Magic Cookie 4B] [Type 1B] [Rounds 1B] [Team Name 32B], then b'\n'.
+# Keep-alive: after the final result of its last round a client may send
+# another request on the same connection; closing it ends the session.
+REQUEST = struct.Struct('!IBB32s')
+# Auto-play request, type 0x5: a request followed by a strategy the server
+# plays for us, so no hit/stand decisions go over the wire.
+# [Magic Cookie 4B] [Type 1B] [Rounds 1B] [Team Name 32B]
+# [Flags 1B] [Stand-on Threshold 1B] [Hit Table 25B], then b'\n'.
+# With AUTOPLAY_TABLE the table (strategies.LookupTable.to_bytes) is used,
+# otherwise the threshold (strategies.StandOn). With AUTOPLAY_SUMMARY the
+# server answers with one SUMMARY frame instead of the payload frames.
+AUTOPLAY_REQUEST = struct.Struct(f'!IBB32sBB{TABLE_BYTES}s')
+AUTOPLAY_SUMMARY = 0x1
+AUTOPLAY_TABLE = 0x2
+# [Magic Cookie 4B] [Type 1B] [Wins 2B] [Losses 2B] [Ties 2B]
+SUMMARY = struct.Struct('!IBHHH')
+# [Magic Cookie 4B] [Type 1B] [Result 1B] [Rank 2B] [Suit 1B]
+SERVER_PAYLOAD = struct.Struct('!IBBHB')
+# [Magic Cookie 4B] [Type 1B] [Decision 5B]
+CLIENT_PAYLOAD = struct.Struct('!IB5s')
+# [Rank 2B] [Suit 1B], the card part of a server payload
+CARD = struct.Struct('!HB')
+
+OFFER_SIZE = OFFER.size                    # 39
+EXTENDED_OFFER_SIZE = OFFER_SIZE + OFFER_LOAD.size  # 43
+PROBE_SIZE = PROBE.size                    # 5
+REQUEST_SIZE = REQUEST.size                # 38
+AUTOPLAY_REQUEST_SIZE = AUTOPLAY_REQUEST.size  # 65
+SUMMARY_SIZE = SUMMARY.size                # 10
+# [Magic Cookie 4B] [Type 1B], common to both request kinds
+REQUEST_HEADER_SIZE = 5
+SERVER_PAYLOAD_SIZE = SERVER_PAYLOAD.size  # 9
+CLIENT_PAYLOAD_SIZE = CLIENT_PAYLOAD.size  # 10
+
+RESULTS = (RESULT_ACTIVE, RESULT_TIE, RESULT_LOSS, RESULT_WIN, RESULT_BUSY, RESULT_TIMEOUT)
+
+# SERVER_FRAMES[result][card code] -> the 9 bytes on the wire, where the card
+# code is rank * 4 + suit as in cards.encode_card (code 0 = no card)
+SERVER_FRAMES = [
+    [SERVER_PAYLOAD.pack(MAGIC_COOKIE, MSG_TYPE_PAYLOAD, result, code >> 2, code & 3)
+     for code in range(56)]
+    for result in range(max(RESULTS) + 1)
+]
+
+HIT_FRAME = CLIENT_PAYLOAD.pack(MAGIC_COOKIE, MSG_TYPE_PAYLOAD, CMD_HIT.encode('ascii'))
+STAND_FRAME = CLIENT_PAYLOAD.pack(MAGIC_COOKIE, MSG_TYPE_PAYLOAD, CMD_STAND.encode('ascii'))
+PROBE_FRAME = PROBE.pack(MAGIC_COOKIE, MSG_TYPE_PROBE)
+
+# Rendered card strings keyed by the 3 card bytes of a server payload,
+# and the same strings indexed by card code
+DECODED_CARDS = {
+    CARD.pack(rank, suit): card_name(rank, suit)
+    for rank in RANKS for suit in SUITS
+}
+CARD_TEXTS = [None] * 4 + [card_name(code >> 2, code & 3) for code in range(4, 56)]
+
+
+def server_frame(result: int, card: int) -> bytes:
+    """
+    Precomputed payload frame for a result and an encoded card (0 = none).
+    """
+    return SERVER_FRAMES[result][card]
+
+
+def pack_offer_into(buffer, offset: int, tcp_port: int, name_bytes: bytes):
+    OFFER.pack_into(buffer, offset, MAGIC_COOKIE, MSG_TYPE_OFFER, tcp_port, name_bytes)
+
+
+def unpack_offer_from(buffer, offset: int = 0) -> tuple:
+    """
+    Returns (cookie, msg_type, server_port, server_name_bytes).
+    """
+    return OFFER.unpack_from(buffer, offset)
+
+
+def pack_offer_load_into(buffer, offset: int, active: int, capacity: int):
+    """
+    Writes the load fields of an extended offer; offset is the offer's start.
+    """
+    OFFER_LOAD.pack_into(buffer, offset + OFFER_SIZE, min(active, 0xffff), min(capacity, 0xffff))
+
+
+def unpack_offer_load_from(buffer, offset: int = 0):
+    """
+    Returns (active_sessions, capacity), or None for a plain 39-byte offer.
+    """
+    if len(buffer) - offset < EXTENDED_OFFER_SIZE:
+        return None
+    return OFFER_LOAD.unpack_from(buffer, offset + OFFER_SIZE)
+
+
+def pack_request(rounds: int, team_name: str) -> bytes:
+    # Struct pads/truncates the name to 32 bytes
+    return REQUEST.pack(MAGIC_COOKIE, MSG_TYPE_REQUEST, rounds, team_name.encode('utf-8'))
+
+
+def unpack_request_from(buffer, offset: int = 0) -> tuple:
+    """
+    Returns (cookie, msg_type, rounds, team_name_bytes).
+    """
+    return REQUEST.unpack_from(buffer, offset)
+
+
+def request_size(msg_type: int) -> int:
+    """
+    Size of the request frame that starts with this message type.
+    """
+    return AUTOPLAY_REQUEST_SIZE if msg_type == MSG_TYPE_AUTOPLAY else REQUEST_SIZE
+
+
+def pack_autoplay_request(rounds: int, team_name: str, strategy, summary: bool = False) -> bytes:
+    """
+    strategy: a StandOn, or any strategy, which is then sent as a LookupTable.
+    """
+    flags = AUTOPLAY_SUMMARY if summary else 0
+    if isinstance(strategy, StandOn):
+        threshold, table = strategy.threshold, bytes(TABLE_BYTES)
+    else:
+        flags |= AUTOPLAY_TABLE
+        if not isinstance(strategy, LookupTable):
+            strategy = LookupTable.from_strategy(strategy)
+        threshold, table = 0, strategy.to_bytes()
+    return AUTOPLAY_REQUEST.pack(MAGIC_COOKIE, MSG_TYPE_AUTOPLAY, rounds,
+                                 team_name.encode('utf-8'), flags, threshold, table)
+
+
+def unpack_autoplay_request_from(buffer, offset: int = 0) -> tuple:
+    """
+    Returns (cookie, msg_type, rounds, team_name_bytes, flags, threshold, table_bytes).
+    """
+    return AUTOPLAY_REQUEST.unpack_from(buffer, offset)
+
+
+def pack_summary(wins: int, losses: int, ties: int) -> bytes:
+    return SUMMARY.pack(MAGIC_COOKIE, MSG_TYPE_SUMMARY, wins, losses, ties)
+
+
+def unpack_summary_from(buffer, offset: int = 0) -> tuple:
+    """
+    Returns (cookie, msg_type, wins, losses, ties).
+    """
+    return SUMMARY.unpack_from(buffer, offset)
+
+
+def unpack_client_payload_from(buffer, offset: int = 0) -> tuple:
+    """
+    Returns (cookie, msg_type, decision_bytes).
+    """
+    return CLIENT_PAYLOAD.unpack_from(buffer, offset)
+
+
+def unpack_server_payload_from(buffer, offset: int = 0) -> tuple:
+    """
+    Returns (cookie, msg_type, result, rank, suit).
+    """
+    return SERVER_PAYLOAD.unpack_from(buffer, offset)
+
+
+def card_text(rank: int, suit: int) -> str:
+    """
+    Colored card string, from the cache when the card is a real one.
+    """
+    if rank in RANKS and suit in SUITS:
+        return CARD_TEXTS[rank * 4 + suit]
+    return card_name(rank, suit)
+
+
+def decode_card(card_bytes) -> str:
+    """
+    Cached equivalent of cards.decode_card.
+    """
+    card_bytes = bytes(card_bytes)
+    text = DECODED_CARDS.get(card_bytes)
+    return text if text is not None else render_card_bytes(card_bytes)
+
+
+class FrameDecoder:
+    """
+    Incremental decoder for the 9-byte server payload frames.
+    Bytes are appended as they arrive; complete frames are unpacked in place
+    and a trailing partial frame is kept for the next feed.
+    """
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data) -> list[tuple]:
+        """
+        Appends received bytes and returns every complete frame as
+        (cookie, msg_type, result, rank, suit).
+        """
+        self.buffer += data
+        complete = len(self.buffer) - len(self.buffer) % SERVER_PAYLOAD_SIZE
+
+        with memoryview(self.buffer) as view:
+            frames = [SERVER_PAYLOAD.unpack_from(view, offset)
+                      for offset in range(0, complete, SERVER_PAYLOAD_SIZE)]
+
+        del self.buffer[:complete]
+        return frames
@@ -0,0 +1,224 @@
+"""
+Replays a session capture (capture.py) against a local server.
+
+Every captured session gets its own connection, and sends the client's
+reads in the chunks the server saw them in. With original pacing each chunk goes out
+at its captured time (scaled by --speed). With --max-speed a chunk goes out
+as soon as the server has sent what it had sent before that chunk in the
+capture.
+
+Server responses are compared with the captured ones. They can only match
+byte for byte if the server deals the same shoes: start it with the
+capture's master seed, fresh, and keep the sessions in their captured
+order. Sessions then start one after the other, each once the previous one
+got its first bytes, which is what --unordered skips. A session whose very
+first deal differs is counted as "cards differ" (the shoe was not the
+captured one); any later difference is a divergence.
+
+    python server.py --seed <master seed> --round-log '' &
+    python replay.py sessions.cap
+    python replay.py sessions.cap --max-speed --concurrency 2000
+"""
+import argparse
+import asyncio
+import resource
+import time
+from capture import read_capture, OPEN, RECV, SEND
+from metrics import percentile
+
+READ_SIZE = 65536
+
+
+class ReplayStats:
+    def __init__(self):
+        self.outcomes = {}
+        self.response_latencies = []
+        self.chunks = 0
+        self.bytes_received = 0
+        self.first_divergence = None  # (session id, offset)
+
+    def outcome(self, kind: str):
+        self.outcomes[kind] = self.outcomes.get(kind, 0) + 1
+
+
+class CapturedSession:
+    def __init__(self, session_id: int, events: list):
+        self.session_id = session_id
+        self.opened_at = events[0][0]
+        # (time, server bytes sent before it, chunk) for every client read
+        self.chunks = []
+        responses = []
+        sent = 0
+        for timestamp, kind, data in events:
+            if kind == RECV:
+                self.chunks.append((timestamp, sent, data))
+            elif kind == SEND:
+                responses.append(data)
+                sent += len(data)
+        self.expected = b''.join(responses)
+        self.first_response = len(responses[0]) if responses else 0
+
+
+def compare(session: CapturedSession, received: bytes, stats: ReplayStats):
+    expected = session.expected
+    if received == expected:
+        stats.outcome('match')
+        return
+    offset = next((i for i, (a, b) in enumerate(zip(received, expected)) if a != b),
+                  min(len(received), len(expected)))
+    if offset < session.first_response:
+        stats.outcome('cards differ')
+    else:
+        stats.outcome('diverged')
+        if stats.first_divergence is None:
+            stats.first_divergence = (session.session_id, offset)
+
+
+async def replay_session(host: str, port: int, session: CapturedSession, origin: float,
+                         speed: float, timeout: float, stats: ReplayStats, started: asyncio.Event):
+    """
+    speed: pacing factor, 0 for as fast as possible. origin: the loop time
+    at which the capture starts. started is set once the server answered.
+    """
+    loop = asyncio.get_running_loop()
+    if speed:
+        await asyncio.sleep(max(0.0, origin + session.opened_at / speed - loop.time()))
+
+    try:
+        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except (OSError, asyncio.TimeoutError) as e:
+        stats.outcome(f"error: connect {type(e).__name__}")
+        started.set()
+        return
+
+    received = bytearray()
+    progress = asyncio.Event()
+
+    async def read_all():
+        try:
+            while data := await reader.read(READ_SIZE):
+                received.extend(data)
+                progress.set()
+                started.set()
+        except ConnectionError:
+            pass
+        progress.set()
+
+    reading = asyncio.create_task(read_all())
+
+    def on_track() -> bool:
+        return received == session.expected[:len(received)]
+
+    async def wait_for_bytes(count: int):
+        deadline = loop.time() + timeout
+        while len(received) < count and not reading.done() and on_track():
+            progress.clear()
+            try:
+                await asyncio.wait_for(progress.wait(), max(0.0, deadline - loop.time()))
+            except asyncio.TimeoutError:
+                return
+
+    try:
+        session_start = loop.time()
+        sent_at = None
+        answered = 0  # server bytes expected before the last chunk we sent
+        for timestamp, before, chunk in session.chunks:
+            if speed:
+                await asyncio.sleep(max(0.0, session_start + (timestamp - session.opened_at) / speed
+                                        - loop.time()))
+            else:
+                await wait_for_bytes(before)
+                if not on_track():
+                    break  # no use sending decisions for other cards
+                # Time from our last chunk to the server's answer to it
+                if sent_at is not None and answered < before <= len(received):
+                    stats.response_latencies.append(loop.time() - sent_at)
+            writer.write(chunk)
+            sent_at, answered = loop.time(), before
+            stats.chunks += 1
+
+        await wait_for_bytes(len(session.expected))
+        if not speed and sent_at is not None and answered < len(session.expected) <= len(received):
+            stats.response_latencies.append(loop.time() - sent_at)
+        # Closing between games ends the session on the server, as in the capture
+        writer.write_eof()
+        await asyncio.wait_for(reading, timeout)
+    except (ConnectionError, OSError):
+        pass
+    except asyncio.TimeoutError:
+        stats.outcome('error: timeout')
+        return
+    finally:
+        reading.cancel()
+        writer.close()
+        started.set()
+
+    stats.bytes_received += len(received)
+    compare(session, bytes(received), stats)
+
+
+async def run_replay(host: str, port: int, sessions: list, speed: float, concurrency: int,
+                     timeout: float, ordered: bool = True) -> tuple[ReplayStats, float]:
+    stats = ReplayStats()
+    limit = asyncio.Semaphore(concurrency)
+    loop = asyncio.get_running_loop()
+    first_open = min(session.opened_at for session in sessions)
+    origin = loop.time() - first_open / speed if speed else 0.0
+    starts = [asyncio.Event() for _ in sessions]
+
+    async def limited(i: int):
+        after = starts[i - 1] if ordered and i else None
+        if after:
+            await after.wait()
+        async with limit:
+            await replay_session(host, port, sessions[i], origin, speed, timeout, stats, starts[i])
+
+    start = time.perf_counter()
+    await asyncio.gather(*(limited(i) for i in range(len(sessions))))
+    return stats, time.perf_counter() - start
+
+
+def report(stats: ReplayStats, elapsed: float, sessions: int):
+    print(f"sessions: {sessions}  elapsed: {elapsed:.2f}s  sessions/sec: {sessions / elapsed:.1f}")
+    print(f"client chunks/sec: {stats.chunks / elapsed:.1f}  "
+          f"server bytes/sec: {stats.bytes_received / elapsed:,.0f}")
+    latencies = sorted(stats.response_latencies)
+    print(f"response      p50 {percentile(latencies, 50) * 1000:8.3f} ms  "
+          f"p95 {percentile(latencies, 95) * 1000:8.3f} ms  "
+          f"p99 {percentile(latencies, 99) * 1000:8.3f} ms  (n={len(latencies)})")
+    for outcome, count in sorted(stats.outcomes.items()):
+        print(f"{outcome}: {count}")
+    if stats.first_divergence:
+        session_id, offset = stats.first_divergence
+        print(f"first divergence: session {session_id} at response byte {offset}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay captured sessions against a server")
+    parser.add_argument('capture')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=2048)
+    parser.add_argument('--max-speed', action='store_true',
+                        help="send as soon as the server has answered, ignoring captured times")
+    parser.add_argument('--speed', type=float, default=1.0,
+                        help="pacing factor for captured times, e.g. 10 for 10x faster")
+    parser.add_argument('--concurrency', type=int, default=1000,
+                        help="maximum sessions open at the same time")
+    parser.add_argument('--unordered', action='store_true',
+                        help="start sessions without waiting for the previous one; "
+                             "faster, but the server's shoes no longer line up")
+    parser.add_argument('--timeout', type=float, default=10.0)
+    args = parser.parse_args()
+
+    soft, hard = resource.getrlimit(resource.RLIMIT_NOFILE)
+    resource.setrlimit(resource.RLIMIT_NOFILE, (hard, hard))
+
+    master_seed, captured = read_capture(args.capture)
+    sessions = [CapturedSession(session_id, events) for session_id, events in sorted(captured.items())
+                if events[0][1] == OPEN]
+    print(f"{len(sessions)} sessions captured with master seed {master_seed}")
+
+    stats, elapsed = asyncio.run(run_replay(args.host, args.port, sessions,
+                                            0.0 if args.max_speed else args.speed,
+                                            args.concurrency, args.timeout, not args.unordered))
+    report(stats, elapsed, len(sessions))
@@ -0,0 +1,176 @@
+"""
+Per-session random streams and a pool of pre-shuffled shoes.
+
+Every session gets its own random.Random, seeded from the server's master
+seed and the session id (session_seed), instead of sharing the global
+Random. The master seed is printed when the server starts, so any session's
+cards can be rebuilt afterwards: the k-th shuffle of a session's shoe only
+depends on its seed and k, never on how the rounds were played.
+
+A producer thread keeps a bounded queue of sessions whose shoe is already
+shuffled; game_loop only pops one. When the queue runs dry the shoe is
+shuffled inline. Reshuffles inside a session stay inline, on the session's
+own stream.
+
+    python rng.py --master-seed 1234 --session 17               # first shoe of session 17
+    python rng.py --master-seed 1234 --session 17 --shoes 3
+    python rng.py --master-seed 1234 --session 17 --autoplay optimal --rounds 255
+    python rng.py --master-seed 1234 --worker 2 --session 17    # workers.py, from the parent's seed
+"""
+import argparse
+import hashlib
+import itertools
+import os
+import queue
+import random
+import threading
+import metrics
+from cards import Shoe, SHOE_DECKS, SHOE_PENETRATION, card_rank, card_suit, card_name
+from game_session import autoplay_round
+from strategies import parse_strategy
+from utils import RESULT_TIE, RESULT_LOSS, RESULT_WIN
+
+POOL_SIZE = 64  # pre-shuffled shoes waiting for a session
+MASTER_SEED_MAX = 2**64 - 1  # master seeds are hashed as 8 unsigned bytes
+
+SHOE_POOL_MISSES = metrics.REGISTRY.counter(
+    'shoe_pool_misses', "sessions that found no pre-shuffled shoe and shuffled inline")
+
+
+def new_master_seed() -> int:
+    return int.from_bytes(os.urandom(8), 'big')
+
+
+def check_master_seed(master_seed: int) -> int:
+    if not 0 <= master_seed <= MASTER_SEED_MAX:
+        raise ValueError(f"master seed must be between 0 and {MASTER_SEED_MAX}")
+    return master_seed
+
+
+def master_seed_arg(text: str) -> int:
+    """
+    argparse type of the --seed options.
+    """
+    try:
+        return check_master_seed(int(text))
+    except ValueError as e:
+        raise argparse.ArgumentTypeError(str(e))
+
+
+def session_seed(master_seed: int, session_id: int) -> int:
+    digest = hashlib.blake2b(master_seed.to_bytes(8, 'big') + session_id.to_bytes(8, 'big'),
+                             digest_size=8).digest()
+    return int.from_bytes(digest, 'big')
+
+
+def worker_seed(master_seed: int, worker: int) -> int:
+    """
+    The master seed of one worker process (workers.py), so workers forked
+    from the same parent do not deal the same shoes.
+    """
+    return session_seed(master_seed, worker)
+
+
+def session_shoe(master_seed: int, session_id: int) -> Shoe:
+    """
+    The shoe a session starts with, already shuffled once.
+    """
+    return Shoe(SHOE_DECKS, SHOE_PENETRATION, random.Random(session_seed(master_seed, session_id)))
+
+
+class ShoePool:
+    """
+    Hands out (session id, shuffled shoe) pairs, ids counting up from 0
+    (or from first_id in steps of id_step, see start()).
+    Before start() there is no producer and every take() shuffles inline.
+    """
+
+    def __init__(self, size: int = POOL_SIZE, master_seed: int = None):
+        self.master_seed = new_master_seed() if master_seed is None else check_master_seed(master_seed)
+        self.ready = queue.Queue(size)
+        self.ids = itertools.count()
+        self.started = False
+
+    def start(self, master_seed: int = None, label: str = "Session",
+              first_id: int = 0, id_step: int = 1):
+        """
+        first_id, id_step: the session ids this pool hands out, so that
+        several processes can share the id space without collisions.
+        """
+        if self.started:
+            return
+        self.started = True
+        if master_seed is not None:
+            self.master_seed = check_master_seed(master_seed)
+        self.ids = itertools.count(first_id, id_step)
+        print(f"{label} RNG master seed: {self.master_seed}")
+        threading.Thread(target=self._producer, daemon=True).start()
+
+    def _next(self) -> tuple:
+        session_id = next(self.ids)
+        return session_id, session_shoe(self.master_seed, session_id)
+
+    def _producer(self):
+        while True:
+            self.ready.put(self._next())
+
+    def take(self) -> tuple:
+        """
+        Never blocks, so the asyncio server can call it too.
+        """
+        try:
+            return self.ready.get_nowait()
+        except queue.Empty:
+            if self.started:
+                SHOE_POOL_MISSES.inc()
+            return self._next()
+
+
+SHOE_POOL = ShoePool()
+
+
+def cards_text(cards) -> str:
+    return ', '.join(card_name(card_rank(card), card_suit(card)) for card in cards)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rebuild a session's cards from its seed")
+    parser.add_argument('--master-seed', type=master_seed_arg, required=True,
+                        help="as printed by the server at startup")
+    parser.add_argument('--session', type=int, required=True, help="session id from the server log")
+    parser.add_argument('--worker', type=int,
+                        help="worker index, when --master-seed is the one workers.py printed")
+    parser.add_argument('--shoes', type=int, default=1, help="shuffles of the shoe to print")
+    parser.add_argument('--autoplay', metavar='STRATEGY',
+                        help="replay an auto-played game with this strategy instead")
+    parser.add_argument('--rounds', type=int, default=1)
+    args = parser.parse_args()
+
+    master_seed = args.master_seed
+    if args.worker is not None:
+        master_seed = worker_seed(master_seed, args.worker)
+    print(f"Session {args.session}: seed {session_seed(master_seed, args.session)}")
+    shoe = session_shoe(master_seed, args.session)
+
+    if args.autoplay:
+        names = {RESULT_WIN: 'win', RESULT_LOSS: 'loss', RESULT_TIE: 'tie'}
+        strategy = parse_strategy(args.autoplay)
+
+        def show(client_cards, dealer_cards, client_total, dealer_total, result):
+            print(f"  client {cards_text(client_cards)} ({client_total}) | "
+                  f"dealer {cards_text(dealer_cards)} ({dealer_total}) "
+                  f"-> {names[result]}")
+
+        for round_num in range(1, args.rounds + 1):
+            print(f"Round {round_num}:")
+            autoplay_round(shoe, strategy, record=show)
+        return
+
+    for number in range(1, args.shoes + 1):
+        if number > 1:
+            shoe.shuffle()
+        print(f"Shoe {number}: {cards_text(shoe.cards)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,253 @@
+"""
+Append-only binary log of every finished round.
+
+Each round is one fixed-width little-endian record (RECORD, 40 bytes):
+    [Timestamp 8B float] [Team Id 4B] [Client Total 1B] [Dealer Total 1B]
+    [Result 1B] [Client Cards 12B] [Dealer Cards 12B] [Flags 1B]
+Cards are encoded ints (cards.encode_card), zero padded. A hand of more than
+12 cards (possible with many Aces) is cut to 12 and flagged FLAG_TRUNCATED.
+Team names are stored once, in a "<log>.teams" sidecar of "id<TAB>name" lines,
+the name backslash-escaped so a tab or newline in it cannot break the line.
+Only one process may write a log: team ids are assigned per writer, so the
+writer holds an exclusive lock on it and a second RoundLog on the same path
+raises RoundLogLocked.
+
+The server only packs a record and appends it to an in-memory batch; a
+background thread writes the batches, so logging adds no I/O to a round.
+
+    python roundlog.py rounds-2048.log                      # win rate of every team
+    python roundlog.py rounds-2048.log --team "Terry Rozier" --last 100
+"""
+import argparse
+import atexit
+import fcntl
+import mmap
+import os
+import struct
+import threading
+import time
+from array import array
+from collections import deque
+from utils import RESULT_TIE, RESULT_LOSS, RESULT_WIN
+
+RECORD = struct.Struct('<dIBBB12s12sB')
+RECORD_SIZE = RECORD.size  # 40
+MAX_LOGGED_CARDS = 12
+FLAG_TRUNCATED = 0x1
+
+# Just the fields the index and the queries need
+_TEAM_ID = struct.Struct('<8xI28x')
+_RESULT_OFFSET = 14
+
+FLUSH_INTERVAL = 0.25  # seconds between batch writes
+
+
+class RoundLogLocked(Exception):
+    pass
+
+
+def teams_path(path: str) -> str:
+    return path + '.teams'
+
+
+def escape_team_name(name: str) -> str:
+    return name.encode('unicode_escape').decode('ascii')
+
+
+def unescape_team_name(text: str) -> str:
+    # latin-1 with backslashreplace also reads back names written unescaped
+    return text.encode('latin-1', 'backslashreplace').decode('unicode_escape')
+
+
+class RoundLog:
+    """
+    Writer side. record() is called from the game threads; it never blocks
+    on the disk.
+    """
+
+    def __init__(self, path: str, flush_interval: float = FLUSH_INTERVAL):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.file = open(path, 'ab')
+        try:
+            fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            self.file.close()
+            raise RoundLogLocked(f"{path} is written by another process; pick another round log")
+        self.team_ids = {name: team_id for team_id, name in read_teams(path).items()}
+        self.lock = threading.Lock()  # guards team id assignment
+        self.pending = deque()        # packed records (bytes)
+        self.pending_teams = deque()  # new sidecar lines
+        self.closed = threading.Event()
+
+        self.teams_file = open(teams_path(path), 'a', encoding='utf-8')
+        self.writer = threading.Thread(target=self._writer_loop, daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    def team_id(self, team_name: str) -> int:
+        team_id = self.team_ids.get(team_name)
+        if team_id is None:
+            with self.lock:
+                team_id = self.team_ids.get(team_name)
+                if team_id is None:
+                    team_id = len(self.team_ids)
+                    self.team_ids[team_name] = team_id
+                    self.pending_teams.append(f"{team_id}\t{escape_team_name(team_name)}\n")
+        return team_id
+
+    def record(self, team_name: str, client_cards: list, dealer_cards: list,
+               client_total: int, dealer_total: int, result: int):
+        flags = 0
+        if len(client_cards) > MAX_LOGGED_CARDS or len(dealer_cards) > MAX_LOGGED_CARDS:
+            flags |= FLAG_TRUNCATED
+        self.pending.append(RECORD.pack(
+            time.time(), self.team_id(team_name), client_total, dealer_total, result,
+            bytes(client_cards[:MAX_LOGGED_CARDS]), bytes(dealer_cards[:MAX_LOGGED_CARDS]), flags))
+
+    def flush(self):
+        """
+        Writes everything recorded so far. Team names go first, so a reader
+        never sees a record whose team is unknown.
+        """
+        teams = []
+        while self.pending_teams:
+            teams.append(self.pending_teams.popleft())
+        if teams:
+            self.teams_file.write(''.join(teams))
+            self.teams_file.flush()
+
+        batch = []
+        while self.pending:
+            batch.append(self.pending.popleft())
+        if batch:
+            self.file.write(b''.join(batch))
+            self.file.flush()
+
+    def _writer_loop(self):
+        while not self.closed.wait(self.flush_interval):
+            self.flush()
+
+    def close(self):
+        if self.closed.is_set():
+            return
+        self.closed.set()
+        self.writer.join()
+        self.flush()
+        self.file.close()
+        self.teams_file.close()
+
+
+def read_teams(path: str) -> dict:
+    """
+    Team id -> team name, from the sidecar of the log at path.
+    """
+    teams = {}
+    try:
+        with open(teams_path(path), encoding='utf-8') as f:
+            for line in f:
+                team_id, _, name = line.rstrip('\n').partition('\t')
+                if name:
+                    teams[int(team_id)] = unescape_team_name(name)
+    except FileNotFoundError:
+        pass
+    return teams
+
+
+class RoundLogReader:
+    """
+    Memory-mapped reader with a per-team index of record numbers.
+    refresh() maps and indexes records appended since the last call.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self.mm = None
+        self.count = 0
+        self.teams = {}
+        self.team_ids = {}
+        self.index = {}  # team id -> array of record numbers, oldest first
+        self.refresh()
+
+    def refresh(self):
+        self.teams = read_teams(self.path)
+        self.team_ids = {name: team_id for team_id, name in self.teams.items()}
+
+        count = os.path.getsize(self.path) // RECORD_SIZE
+        if count == self.count:
+            return
+        if self.mm is not None:
+            self.mm.close()
+        with open(self.path, 'rb') as f:
+            self.mm = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        start = self.count
+        records = memoryview(self.mm)[start * RECORD_SIZE:count * RECORD_SIZE]
+        for number, (team_id,) in enumerate(_TEAM_ID.iter_unpack(records), start):
+            entries = self.index.get(team_id)
+            if entries is None:
+                entries = self.index[team_id] = array('I')
+            entries.append(number)
+        records.release()
+        self.count = count
+
+    def record(self, number: int) -> dict:
+        (timestamp, team_id, client_total, dealer_total, result,
+         client_cards, dealer_cards, flags) = RECORD.unpack_from(self.mm, number * RECORD_SIZE)
+        return {
+            'time': timestamp,
+            'team': self.teams.get(team_id, str(team_id)),
+            'client_cards': list(client_cards.rstrip(b'\x00')),
+            'dealer_cards': list(dealer_cards.rstrip(b'\x00')),
+            'client_total': client_total,
+            'dealer_total': dealer_total,
+            'result': result,
+            'truncated': bool(flags & FLAG_TRUNCATED),
+        }
+
+    def team_records(self, team_name: str, last: int = None) -> array:
+        entries = self.index.get(self.team_ids.get(team_name), array('I'))
+        return entries[-last:] if last else entries
+
+    def results(self, team_name: str, last: int = None) -> dict:
+        """
+        Wins, losses and ties of a team, over its last `last` rounds if given.
+        """
+        counts = {RESULT_WIN: 0, RESULT_LOSS: 0, RESULT_TIE: 0}
+        mm = self.mm
+        for number in self.team_records(team_name, last):
+            result = mm[number * RECORD_SIZE + _RESULT_OFFSET]
+            counts[result] = counts.get(result, 0) + 1
+        return {'rounds': sum(counts.values()), 'wins': counts[RESULT_WIN],
+                'losses': counts[RESULT_LOSS], 'ties': counts[RESULT_TIE]}
+
+    def win_rate(self, team_name: str, last: int = None) -> float:
+        counts = self.results(team_name, last)
+        return counts['wins'] / counts['rounds'] if counts['rounds'] else 0.0
+
+    def close(self):
+        if self.mm is not None:
+            self.mm.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Query a binary round log")
+    parser.add_argument('path')
+    parser.add_argument('--team', help="only this team")
+    parser.add_argument('--last', type=int, help="only each team's last N rounds")
+    args = parser.parse_args()
+
+    reader = RoundLogReader(args.path)
+    teams = [args.team] if args.team else sorted(reader.team_ids)
+    print(f"{reader.count} rounds, {len(reader.teams)} teams")
+    print(f"{'team':<32} {'rounds':>8} {'wins':>7} {'losses':>7} {'ties':>6} {'win rate':>9}")
+    for team in teams:
+        counts = reader.results(team, args.last)
+        rate = counts['wins'] / counts['rounds'] if counts['rounds'] else 0.0
+        print(f"{team:<32} {counts['rounds']:>8} {counts['wins']:>7} {counts['losses']:>7} "
+              f"{counts['ties']:>6} {rate:>9.3f}")
+    reader.close()
+
+
+if __name__ == "__main__":
+    main()
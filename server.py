@@ -1,80 +1,203 @@
-import struct
+import argparse
 import socket
 import time
 import threading
-from cards import Card, card_value, Deck
-from utils import MAGIC_COOKIE, MSG_TYPE_OFFER, MSG_TYPE_REQUEST, MSG_TYPE_PAYLOAD
-from utils import CMD_HIT, CMD_STAND
-from utils import RESULT_ACTIVE, RESULT_TIE, RESULT_LOSS, RESULT_WIN
-from utils import UDP_PORT
-
-LISTEN_BACKLOG = 5
+import metrics
+from functools import partial
+from admission import SessionPool, POOL_WORKERS, POOL_QUEUE_SIZE, POOL_MAX_WAIT
+from game_session import GameSession, RequestParseError
+from leaderboard import LEADERBOARD
+from roundlog import RoundLog, RoundLogLocked
+from rng import SHOE_POOL, master_seed_arg
+from capture import CaptureWriter
+from timerwheel import TIMERS
+from tracing import TRACER, TRACE_SAMPLE_RATE, SESSION, RECV_WAIT, SEND
+from utils import MAGIC_COOKIE, MSG_TYPE_OFFER
+from utils import UDP_PORT, PROBE_PORT, BUFFER_SIZE, RESULT_TIMEOUT
+from protocol import OFFER, EXTENDED_OFFER_SIZE, SERVER_FRAMES, pack_offer_into, pack_offer_load_into
+from protocol import PROBE_FRAME, PROBE_SIZE
+
+LISTEN_BACKLOG = 128  # kernel queue of completed handshakes; the session pool queues behind it
 TCP_BIND_ADDR = ''  # all interfaces
 
 BROADCAST_INTERVAL = 1.0  # seconds
 BROADCAST_ADDR = '<broadcast>'
-OFFER_STRUCT = "!IBH32s"
-REQUEST_STRUCT = "!IBB32s"
-MAX_ROUNDS = 255
-REQUEST_SIZE = 38
-SERVER_PAYLOAD_STRUCT = "!IBBHB"
-CLIENT_PAYLOAD_STRUCT = "!IB5s"
+OFFER_REFRESH_INTERVAL = 0.1  # seconds between load checks of the cached offer
+
+# Discovery probes (udp_probe_responder_loop) answered, as token buckets
+PROBE_RATE_PER_IP = 5.0      # probes/sec per source address
+PROBE_BURST_PER_IP = 10
+PROBE_RATE_TOTAL = 2000.0    # probes/sec from everyone
+PROBE_BURST_TOTAL = 2000
+PROBE_TRACKED_IPS = 10_000   # source addresses kept before idle ones are pruned
+READ_BUFFER_SIZE = 4096
+SENDMSG_MAX_BUFFERS = 512  # well under IOV_MAX (1024 on Linux)
+
+SERVER_CAPACITY = POOL_WORKERS  # sessions played at once, advertised in extended offers
+
+ADMIN_PORT = 2049  # local metrics endpoint, see metrics.admin_server_loop
+METRICS_SNAPSHOT_PATH = 'server_metrics.json'
+METRICS_SNAPSHOT_INTERVAL = 10.0  # seconds
+ROUND_LOG_PATH = 'rounds-{port}.log'  # binary round log, see roundlog.py; one per server
+
+# Deadlines of a session, kept on the timer wheel (timerwheel.py)
+REQUEST_TIMEOUT = 10.0   # seconds from connecting to the first request
+DECISION_TIMEOUT = 15.0  # seconds for each hit/stand decision
+IDLE_TIMEOUT = 30.0      # seconds between games on a kept-alive connection
+TIMEOUT_FRAME = SERVER_FRAMES[RESULT_TIMEOUT][0]
+
+CONNECTIONS_ACCEPTED = metrics.REGISTRY.counter('connections_accepted', "TCP connections accepted")
+SESSIONS_ACTIVE = metrics.REGISTRY.gauge('sessions_active', "clients currently connected")
+ROUNDS_PLAYED = metrics.REGISTRY.counter('rounds_played', "rounds finished")
+DECISION_LATENCY = metrics.REGISTRY.histogram(
+    'decision_latency_seconds', "time the server waited for each hit/stand decision")
+DISCONNECTS = metrics.REGISTRY.labeled_counter('disconnects', 'reason', "sessions ended, by reason")
+SESSION_TIMEOUTS = metrics.REGISTRY.labeled_counter(
+    'session_timeouts', 'phase', "sessions closed for missing a deadline, by phase")
+metrics.REGISTRY.gauge('timers_pending', "session deadlines on the timer wheel",
+                       function=lambda: TIMERS.pending)
+# Socket calls per finished round, averaged over the rounds of each batch
+COUNT_BUCKETS = (1, 2, 3, 4, 5, 6, 8, 10, 15, 20, 50)
+ROUND_FRAMES = metrics.REGISTRY.histogram(
+    'frames_per_round', "payload frames sent per finished round", COUNT_BUCKETS)
+ROUND_SEND_CALLS = metrics.REGISTRY.histogram(
+    'send_calls_per_round', "send syscalls per finished round", COUNT_BUCKETS)
+ROUND_RECV_CALLS = metrics.REGISTRY.histogram(
+    'recv_calls_per_round', "recv calls per finished round", COUNT_BUCKETS)
+DISCOVERY_PROBES = metrics.REGISTRY.labeled_counter(
+    'discovery_probes', 'outcome', "discovery probes received, by outcome")
+
+
+def build_offer_packet(tcp_port: int, server_name: str) -> bytes:
+    name_bytes = server_name.encode('utf-8')
+    name_bytes = name_bytes[:32].ljust(32, b'\x00')
 
+    return OFFER.pack(MAGIC_COOKIE, MSG_TYPE_OFFER, tcp_port, name_bytes)
 
-def dealer_turn(deck: Deck, dealer_cards: list) -> tuple[list, int, bool]:
+def build_extended_offer_packet(tcp_port: int, server_name: str) -> bytearray:
     """
-    Executes dealer logic.
-    
-    Returns:
-        dealer_cards: final list of cards
-        dealer_total: final sum
-        dealer_bust: True if sum > 21
+    Offer followed by the load fields (active sessions, capacity), which
+    OfferCache fills in on a copy.
     """
-    dealer_total = sum(card_value(c) for c in dealer_cards)
-
-    while dealer_total < 17:
-        card = deck.draw()
-        dealer_cards.append(card)
-        dealer_total += card_value(card)
+    name_bytes = server_name.encode('utf-8')
+    name_bytes = name_bytes[:32].ljust(32, b'\x00')
 
-    dealer_bust = dealer_total > 21
-    return dealer_cards, dealer_total, dealer_bust
+    packet = bytearray(EXTENDED_OFFER_SIZE)
+    pack_offer_into(packet, 0, tcp_port, name_bytes)
+    return packet
 
-def decide_winner(client_total: int, dealer_total: int,
-                  client_bust: bool, dealer_bust: bool) -> int:
+def open_round_log(path: str, port: int) -> RoundLog:
     """
-    Returns result code:
-    0x3 → client win
-    0x2 → client loss
-    0x1 → tie
+    The round log at path with {port} replaced by the server's port, so
+    servers side by side in one directory each write their own; None if
+    path is empty. Raises RoundLogLocked if another process writes it.
     """
+    if not path:
+        return None
+    return RoundLog(path.replace('{port}', str(port)))
 
-    if client_bust:
-        return RESULT_LOSS  # loss
-    if dealer_bust:
-        return RESULT_WIN  # win
+def current_load() -> tuple[int, int]:
+    return SESSIONS_ACTIVE.value(), SERVER_CAPACITY
 
-    if client_total > dealer_total:
-        return RESULT_WIN
-    if dealer_total > client_total:
-        return RESULT_LOSS
-    return RESULT_TIE
+class OfferCache:
+    """
+    The extended offer, shared by the broadcast and the probe responder.
 
+    load: callable returning (active sessions, capacity). It is checked at
+    most every refresh_interval and the packet is only rebuilt when it
+    changed, so answering a probe is one sendto of a ready buffer.
 
-def build_offer_packet(tcp_port: int, server_name: str) -> bytes:
-    name_bytes = server_name.encode('utf-8')
-    name_bytes = name_bytes[:32].ljust(32, b'\x00')
+    The broadcast and probe threads both call current() without a lock, so
+    a rebuild packs the load into its own copy of the template and then
+    replaces self.packet; neither the template nor a packet already handed
+    out is ever written. If both threads rebuild at once, each packs its own
+    buffer and the last one stored wins.
+    """
 
-    return struct.pack(
-        OFFER_STRUCT,
-        MAGIC_COOKIE,
-        MSG_TYPE_OFFER,
-        tcp_port,
-        name_bytes
-    )
+    def __init__(self, tcp_port: int, server_name: str, load=current_load,
+                 refresh_interval: float = OFFER_REFRESH_INTERVAL):
+        self.template = build_extended_offer_packet(tcp_port, server_name)
+        self.load = load
+        self.refresh_interval = refresh_interval
+        self.packet = bytes(self.template)
+        self.advertised = None
+        self.checked = None
+
+    def current(self) -> bytes:
+        now = time.monotonic()
+        if self.checked is None or now - self.checked >= self.refresh_interval:
+            self.checked = now
+            load = self.load()
+            if load != self.advertised:
+                packet = bytearray(self.template)
+                pack_offer_load_into(packet, 0, *load)
+                self.packet = bytes(packet)
+                self.advertised = load
+        return self.packet
+
+
+class ProbeLimiter:
+    """
+    Token buckets for discovery probes: one per source address, and one
+    for all of them, so a flood of probes costs a dict lookup each.
+    """
 
-def udp_offer_broadcast_loop(tcp_port: int, server_name: str):
-    offer_packet = build_offer_packet(tcp_port, server_name)
+    def __init__(self, rate_per_ip: float = PROBE_RATE_PER_IP, burst_per_ip: int = PROBE_BURST_PER_IP,
+                 rate_total: float = PROBE_RATE_TOTAL, burst_total: int = PROBE_BURST_TOTAL,
+                 max_tracked: int = PROBE_TRACKED_IPS):
+        self.rate_per_ip = rate_per_ip
+        self.burst_per_ip = burst_per_ip
+        self.rate_total = rate_total
+        self.burst_total = burst_total
+        self.max_tracked = max_tracked
+        self.buckets = {}  # source address -> [tokens, last refill]
+        self.total = [burst_total, time.monotonic()]
+
+    @staticmethod
+    def _take(bucket: list, rate: float, burst: int, now: float) -> bool:
+        tokens = min(burst, bucket[0] + (now - bucket[1]) * rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1
+        return True
+
+    def allow(self, address: str, now: float = None) -> str:
+        """
+        Returns None if the probe may be answered, else why it is dropped.
+        """
+        now = time.monotonic() if now is None else now
+        bucket = self.buckets.get(address)
+        if bucket is None:
+            if len(self.buckets) >= self.max_tracked:
+                self._prune(now)
+            bucket = self.buckets[address] = [self.burst_per_ip, now]
+        if not self._take(bucket, self.rate_per_ip, self.burst_per_ip, now):
+            return 'rate_per_ip'
+        if not self._take(self.total, self.rate_total, self.burst_total, now):
+            return 'rate_total'
+        return None
+
+    def _prune(self, now: float):
+        # Addresses whose bucket has refilled are as good as new
+        refill = self.burst_per_ip / self.rate_per_ip
+        self.buckets = {address: bucket for address, bucket in self.buckets.items()
+                        if now - bucket[1] < refill}
+        if len(self.buckets) >= self.max_tracked:
+            self.buckets.clear()
+
+
+def udp_offer_broadcast_loop(tcp_port: int, server_name: str, load=current_load,
+                             offers: OfferCache = None):
+    """
+    Broadcasts an extended offer every BROADCAST_INTERVAL.
+    load: callable returning (active sessions, capacity); the packet's load
+    fields are only repacked when that changes.
+    offers: the OfferCache to send from, if shared with the probe responder.
+    """
+    if offers is None:
+        offers = OfferCache(tcp_port, server_name, load)
 
     sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
 
@@ -88,7 +211,7 @@ def udp_offer_broadcast_loop(tcp_port: int, server_name: str):
 
     try:
         while True:
-            sock.sendto(offer_packet, (BROADCAST_ADDR, UDP_PORT))
+            sock.sendto(offers.current(), (BROADCAST_ADDR, UDP_PORT))
             time.sleep(BROADCAST_INTERVAL)  # blocks → no busy waiting
 
     except KeyboardInterrupt:
@@ -98,187 +221,345 @@ def udp_offer_broadcast_loop(tcp_port: int, server_name: str):
         sock.close()
 
 
-class RequestParseError(Exception):
-    pass
-
-
-def parse_request_packet(data: bytes):
+def udp_probe_responder_loop(offers: OfferCache, limiter: ProbeLimiter = None):
     """
-    Parses a client request packet.
-
-    Returns:
-        rounds (int)
-        team_name (str)
-
-    Raises:
-        RequestParseError on any validation failure.
+    Answers discovery probes on PROBE_PORT with the cached offer, unicast to
+    the prober, so a client does not have to wait for the next broadcast.
+    Probes over the rate limits are dropped without an answer.
     """
+    if limiter is None:
+        limiter = ProbeLimiter()
 
-    if len(data) != REQUEST_SIZE:
-        raise RequestParseError("Invalid request length")
-
-    try:
-        magic, msg_type, rounds, name_bytes = struct.unpack(REQUEST_STRUCT, data)
-    except struct.error:
-        raise RequestParseError("Struct unpack failed")
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_UDP)
+    # Every server on this host can bind the port; each gets broadcast probes
+    sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    sock.bind(('', PROBE_PORT))
 
-    if magic != MAGIC_COOKIE:
-        raise RequestParseError("Bad magic cookie")
+    print(f"Answering discovery probes on UDP port {PROBE_PORT}")
 
-    if msg_type != MSG_TYPE_REQUEST:
-        raise RequestParseError("Bad message type")
+    try:
+        while True:
+            data, addr = sock.recvfrom(BUFFER_SIZE)
+            if data[:PROBE_SIZE] != PROBE_FRAME:
+                DISCOVERY_PROBES.inc('malformed')
+                continue
+            dropped = limiter.allow(addr[0])
+            if dropped:
+                DISCOVERY_PROBES.inc(dropped)
+                continue
+            try:
+                sock.sendto(offers.current(), addr)
+            except OSError as e:
+                print(f"Could not answer probe from {addr}: {e}")
+                continue
+            DISCOVERY_PROBES.inc('answered')
 
-    if rounds == 0 or rounds > MAX_ROUNDS:
-        raise RequestParseError("Invalid number of rounds")
+    except KeyboardInterrupt:
+        pass
 
-    team_name = name_bytes.rstrip(b'\x00').decode('utf-8', errors='ignore')
+    finally:
+        sock.close()
 
-    if not team_name:
-        raise RequestParseError("Empty team name")
 
-    return rounds, team_name
+def start_offer_threads(tcp_port: int, server_name: str, load=current_load):
+    """
+    Starts the offer broadcast and the probe responder in the background,
+    both sending the same OfferCache.
+    """
+    offers = OfferCache(tcp_port, server_name, load)
+    for target, args in ((udp_offer_broadcast_loop, (tcp_port, server_name, load, offers)),
+                         (udp_probe_responder_loop, (offers,))):
+        threading.Thread(target=target, args=args, daemon=True).start()
 
 
-def client_handler(client_sock: socket.socket, client_addr):
+def client_handler(client_sock: socket.socket, client_addr, on_round=None, round_log: RoundLog = None,
+                   capture: CaptureWriter = None):
+    # No socket timeout: the session's deadlines are on the timer wheel
     try:
-        client_sock.settimeout(30)
-        game_loop(client_sock)
-
-    except (ConnectionError, socket.timeout):
+        # Frames are already coalesced per phase, so Nagle would only delay
+        # the last write of a phase while waiting for an ACK
+        client_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        SESSIONS_ACTIVE.inc()
+        if game_loop(client_sock, on_round, round_log, capture):
+            DISCONNECTS.inc('completed')
+        else:
+            DISCONNECTS.inc('mid_round')
+
+    except socket.timeout as e:
+        DISCONNECTS.inc('timeout')
+        print(f"Client {client_addr} timed out: {e}")
+
+    except ConnectionError:
+        DISCONNECTS.inc('disconnected')
         print(f"Client {client_addr} disconnected")
 
+    except RequestParseError as e:
+        DISCONNECTS.inc('bad_request')
+        print(f"Error with client {client_addr}: {e}")
+
     except Exception as e:
+        DISCONNECTS.inc('error')
         print(f"Error with client {client_addr}: {e}")
 
     finally:
+        SESSIONS_ACTIVE.dec()
         client_sock.close()
 
-def recv_exact(sock: socket.socket, n: int) -> bytes:
-    data = b''
-    while len(data) < n:
-        chunk = sock.recv(n - len(data))
-        if not chunk:
+class RoundIOStats:
+    """
+    Frames queued and send syscalls made since the last report, and the
+    rounds finished in that time.
+    """
+    def __init__(self):
+        self.frames = 0
+        self.syscalls = 0
+        self.rounds = 0
+        self.recv_mark = 0  # ConnectionReader.recv_calls at the last report
+
+    def reset(self):
+        self.frames = 0
+        self.syscalls = 0
+        self.rounds = 0
+
+    def report(self, recv_calls: int):
+        """
+        Once rounds have finished, observes the frames, send syscalls and
+        recv calls per round (recv_calls: the reader's running count) and
+        starts over.
+        """
+        if not self.rounds:
+            return
+        ROUND_FRAMES.observe(self.frames / self.rounds)
+        ROUND_SEND_CALLS.observe(self.syscalls / self.rounds)
+        ROUND_RECV_CALLS.observe((recv_calls - self.recv_mark) / self.rounds)
+        self.recv_mark = recv_calls
+        self.reset()
+
+
+def send_frames(sock: socket.socket, frames: list, stats: RoundIOStats = None):
+    """
+    Writes all frames with a single vectored sendmsg (writev) call,
+    looping only if the kernel accepts a partial write. Long batches
+    (auto-play) are joined first to stay under the iovec limit.
+    """
+    if not frames:
+        return
+    if stats:
+        stats.frames += len(frames)
+
+    buffers = frames if len(frames) <= SENDMSG_MAX_BUFFERS else [b''.join(frames)]
+    while True:
+        sent = sock.sendmsg(buffers)
+        if stats:
+            stats.syscalls += 1
+
+        # Drop fully written buffers and trim the partially written one
+        while buffers and sent >= len(buffers[0]):
+            sent -= len(buffers[0])
+            buffers = buffers[1:]
+        if not buffers:
+            return
+        buffers = [memoryview(buffers[0])[sent:]] + buffers[1:]
+
+
+class ConnectionReader:
+    """
+    Receives from one client connection into a preallocated bytearray.
+    Framing is left to the GameSession the data is fed to.
+    """
+    def __init__(self, sock: socket.socket, size: int = READ_BUFFER_SIZE):
+        self.sock = sock
+        self.buffer = bytearray(size)
+        self.view = memoryview(self.buffer)
+        self.recv_calls = 0
+
+    def read_available(self) -> memoryview:
+        """
+        Receives once, as much as the socket has, and returns it as a view of
+        the buffer that is valid until the next call.
+        Raises ConnectionError when the client has closed the connection.
+        """
+        received = self.sock.recv_into(self.buffer)
+        self.recv_calls += 1
+        if not received:
             raise ConnectionError("Client disconnected")
-        data += chunk
-    return data
+        return self.view[:received]
+
 
-def game_loop(client_sock: socket.socket):
+class SessionDeadline:
     """
-    Full server-side blackjack game loop for one client.
+    The one pending deadline of a session (a GameSession, or a tables.Seat)
+    on the timer wheel.
+
+    update() is called after every batch: when the session has moved on to a
+    new wait (first request, a decision, the next game) the deadline is
+    re-armed for it; bytes that do not complete a message do not extend it.
+    If it passes, on_expire() is called from the wheel and `expired` names
+    the phase that timed out.
     """
 
-    # ---- Receive request ----
-    data = recv_exact(client_sock, REQUEST_SIZE)
-    rounds, team_name = parse_request_packet(data)
+    def __init__(self, session: GameSession, on_expire, wheel=TIMERS):
+        self.session = session
+        self.on_expire = on_expire
+        self.wheel = wheel
+        self.timer = None
+        self.progress = None
+        self.phase = None
+        self.expired = None
+
+    def update(self):
+        session = self.session
+        progress = (session.state, session.games, session.round_num, session.decisions)
+        if progress == self.progress:
+            return
+        self.progress = progress
 
+        if session.state == GameSession.WAIT_DECISION:
+            self.phase, delay = 'decision', DECISION_TIMEOUT
+        elif session.state != GameSession.WAIT_REQUEST:
+            # Waiting on the server, not the client (a seat at a shared table)
+            self.cancel()
+            return
+        elif session.games:
+            self.phase, delay = 'idle', IDLE_TIMEOUT
+        else:
+            self.phase, delay = 'request', REQUEST_TIMEOUT
+        if self.timer is None:
+            self.timer = self.wheel.schedule(delay, self._expire)
+        else:
+            self.wheel.reschedule(self.timer, delay)
+
+    def _expire(self):
+        self.expired = self.phase
+        SESSION_TIMEOUTS.inc(self.phase)
+        self.on_expire()
+
+    def cancel(self):
+        if self.timer is not None:
+            self.wheel.cancel(self.timer)
+
+
+def time_out(client_sock: socket.socket):
+    """
+    Sends the timeout frame and shuts the connection down; called from the
+    timer wheel while the session's thread is blocked reading.
+    """
     try:
-        client_sock.recv(1)
-    except:
+        client_sock.send(TIMEOUT_FRAME, socket.MSG_DONTWAIT)
+        client_sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
         pass
 
-    print(f"Client '{team_name}' connected, playing {rounds} rounds")
-    games_won = 0
-
-    for round_num in range(1, rounds + 1):
-        try:
-            print(f"Starting round {round_num}")
-
-            deck = Deck()
-
-            # ---- Initial deal ----
-            client_cards = [deck.draw(), deck.draw()]
-            dealer_cards = [deck.draw(), deck.draw()]
-
-            client_total = sum(card_value(c) for c in client_cards)
-            dealer_total = card_value(dealer_cards[0])  # second card hidden
-
-            # Send dealer's visible card
-            client_sock.sendall(
-                build_server_payload(RESULT_ACTIVE, dealer_cards[0])
-            )
-            
-            # Send client cards
-            for card in client_cards:
-                payload = build_server_payload(RESULT_ACTIVE, card)
-                client_sock.sendall(payload)
-
-            client_bust = False
-
-            # ---- Player turn ----
-            while True:
-                if client_total > 21:
-                    client_bust = True
-                    break
-
-                data = recv_exact(client_sock, 10)
-                decision = parse_client_payload(data)
-
-                if decision == CMD_STAND:
-                    break
-
-                elif decision == CMD_HIT:
-                    # Hit
-                    card = deck.draw()
-                    client_cards.append(card)
-                    client_total += card_value(card)
-
-                    client_sock.sendall(
-                        build_server_payload(RESULT_ACTIVE, card)
-                    )
-                else:
-                    raise ValueError("Invalid client decision")
-
-            # ---- Dealer turn ----
-            dealer_bust = False
-
-            if not client_bust:
-                # Reveal hidden dealer card
-                client_sock.sendall(
-                    build_server_payload(RESULT_ACTIVE, dealer_cards[1])
-                )
-
-                dealer_cards, dealer_total, dealer_bust = dealer_turn(
-                    deck, dealer_cards
-                )
-
-                # Send any additional dealer cards
-                for card in dealer_cards[2:]:
-                    client_sock.sendall(
-                        build_server_payload(RESULT_ACTIVE, card)
-                    )
-
-            # ---- Decide winner ----
-            result = decide_winner(
-                client_total,
-                dealer_total,
-                client_bust,
-                dealer_bust
-            )
-            if result == RESULT_WIN:
-                games_won += 1
-
-            # ---- Send final result ----
-            client_sock.sendall(
-                build_server_payload(result, None)
-            )
-
-            print(f"Client '{team_name}' finished all rounds, won {games_won}/{round_num} games")
-
-        except (BrokenPipeError, ConnectionResetError, ConnectionError):
-            print(f"Client '{team_name}' disconnected mid-round")
-            return
-        
 
-def tcp_accept_loop(tcp_port: int, client_handler):
+def game_loop(client_sock: socket.socket, on_round=None, round_log: RoundLog = None,
+              capture: CaptureWriter = None):
+    """
+    Full server-side blackjack session for one client: feeds what the
+    client sends to a GameSession and writes back the frames it returns.
+
+    The connection is kept alive between games: after the final result of
+    the last round the client may send another request, which is played on
+    the same connection with the same shoe. The session ends when the client
+    closes the connection between games.
+
+    on_round: optional callable(result) invoked after every finished round,
+    used by the worker processes to keep their counters.
+    round_log: optional RoundLog that records every round.
+    Every round also counts towards the team's place on the leaderboard, and
+    the frames, send syscalls and recv calls it took go to the *_per_round
+    histograms.
+    The shoe comes shuffled from rng.SHOE_POOL, on the session's own seed.
+    capture: optional capture.CaptureWriter that records the bytes read and
+    written, for replay.py.
+    Sessions sampled by tracing.TRACER also get spans for the time blocked
+    on the client, every send and the session as a whole.
+
+    Returns True if all rounds were played, False if the client left mid-round.
+    Raises TimeoutError if the client missed a deadline (see SessionDeadline).
+    """
+    def round_finished(result: int):
+        ROUNDS_PLAYED.inc()
+        LEADERBOARD.record(session.team_name, result)
+        io_stats.rounds += 1
+        if on_round:
+            on_round(result)
+
+    session_start = time.perf_counter()
+    session_id, shoe = SHOE_POOL.take()
+    trace = TRACER.session(session_id)
+    session = GameSession(shoe, round_finished, round_log=round_log, session_id=session_id,
+                          trace=trace)
+    recorder = capture.session(session_id) if capture else None
+    deadline = SessionDeadline(session, partial(time_out, client_sock))
+    reader = ConnectionReader(client_sock)
+    io_stats = RoundIOStats()
+    wait_start = None
+
+    try:
+        deadline.update()
+        while True:
+            read_start = time.perf_counter() if trace else 0.0
+            try:
+                data = reader.read_available()
+            except ConnectionError:
+                if deadline.expired:
+                    raise TimeoutError(f"no {deadline.expired} in time")
+                return session.connection_closed()
+            if trace:
+                trace.add(RECV_WAIT, read_start)
+            if recorder:
+                recorder.received(data)
+
+            decisions = session.decisions
+            frames = session.receive(data)
+            if wait_start is not None and session.decisions != decisions:
+                DECISION_LATENCY.observe(time.perf_counter() - wait_start)
+
+            send_start = time.perf_counter() if trace else 0.0
+            try:
+                send_frames(client_sock, frames, io_stats)
+            except (BrokenPipeError, ConnectionResetError):
+                print(f"Client '{session.team_name}' disconnected mid-round")
+                return False
+            if trace and frames:
+                trace.add(SEND, send_start)
+            if recorder:
+                recorder.sent(frames)
+            io_stats.report(reader.recv_calls)
+
+            # The session now waits on the client: time its decision
+            wait_start = time.perf_counter() if session.state == GameSession.WAIT_DECISION else None
+            deadline.update()
+    finally:
+        deadline.cancel()
+        if recorder:
+            recorder.closed()
+        if trace:
+            trace.add(SESSION, session_start)
+
+
+def tcp_accept_loop(tcp_port: int, client_handler, reuse_port: bool = False,
+                    backlog: int = LISTEN_BACKLOG, pool: SessionPool = None):
     """
     Accepts incoming TCP connections forever.
-    For each client, starts a new handler thread.
+    Every client is handed to a SessionPool, which plays it on a bounded set
+    of worker threads or answers it with a busy frame (see admission.py).
+
+    reuse_port: set SO_REUSEPORT so several processes can listen on the same
+    port and let the kernel spread connections between them.
+    pool: the SessionPool to use; by default one running client_handler with
+    SERVER_CAPACITY workers.
     """
+    if pool is None:
+        pool = SessionPool(client_handler, SERVER_CAPACITY)
+
     # Creates and sets up the TCP server socket
     server_sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
     server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    if reuse_port:
+        server_sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
     server_sock.bind((TCP_BIND_ADDR, tcp_port))
-    server_sock.listen(LISTEN_BACKLOG)
+    server_sock.listen(backlog)
 
     print(f"TCP server listening on port {tcp_port}")
 
@@ -286,14 +567,10 @@ def tcp_accept_loop(tcp_port: int, client_handler):
     try:
         while True:
             client_sock, client_addr = server_sock.accept()
+            CONNECTIONS_ACCEPTED.inc()
             print(f"New client connected from {client_addr}")
-            # Start a new thread to handle the client
-            thread = threading.Thread(
-                target=client_handler,
-                args=(client_sock, client_addr),
-                daemon=True
-            )
-            thread.start()
+            if not pool.submit(client_sock, client_addr):
+                print(f"Server busy, turned away {client_addr}")
     except socket.timeout:
         print(f"Client {client_addr} timed out during game")
     
@@ -303,55 +580,53 @@ def tcp_accept_loop(tcp_port: int, client_handler):
     finally:
         server_sock.close()
 
-def build_server_payload(result: int, card: Card = None) -> bytes:
-    """
-    card: Card or None
-    If round is not over, card must be provided.
-    If round is over, rank/suit should be 0.
-    """
-    if card:
-        rank, suit = card.rank, card.suit
-    else:
-        rank, suit = 0, 0
-
-    return struct.pack(
-        SERVER_PAYLOAD_STRUCT,
-        MAGIC_COOKIE,
-        MSG_TYPE_PAYLOAD,
-        result,
-        rank,
-        suit
-    )
-
-def parse_client_payload(data: bytes) -> str:
-    if len(data) != 10:
-        raise ValueError("Invalid client payload length")
-    magic, msg_type, decision = struct.unpack(CLIENT_PAYLOAD_STRUCT, data)
-    
-    # Validate the data
-    if magic != MAGIC_COOKIE:
-        raise ValueError("Bad magic cookie")
-    if msg_type != MSG_TYPE_PAYLOAD:
-        raise ValueError("Bad message type")
-
-    decision = decision.decode('ascii')
-
-    if decision not in ("Hittt", "Stand"):
-        raise ValueError("Invalid decision value")
-
-    return decision
-
 if __name__ == "__main__":
-    TCP_PORT = 2048
-    SERVER_NAME = "Chauncey Billups"
-
-    # Start UDP broadcast in background
-    udp_thread = threading.Thread(
-        target=udp_offer_broadcast_loop,
-        args=(TCP_PORT, SERVER_NAME),
-        daemon=True
-    )
-    udp_thread.start()
+    parser = argparse.ArgumentParser(description="Threaded blackjack server")
+    parser.add_argument('--port', type=int, default=2048)
+    parser.add_argument('--name', default="Chauncey Billups")
+    parser.add_argument('--workers', type=int, default=SERVER_CAPACITY,
+                        help="sessions played at once")
+    parser.add_argument('--queue', type=int, default=POOL_QUEUE_SIZE,
+                        help="connections that may wait for a free worker")
+    parser.add_argument('--max-wait', type=float, default=POOL_MAX_WAIT,
+                        help="seconds a connection may wait before it is told the server is busy")
+    parser.add_argument('--backlog', type=int, default=LISTEN_BACKLOG)
+    parser.add_argument('--admin-port', type=int, default=ADMIN_PORT,
+                        help="local metrics port (see metrics.py); 0 disables it")
+    parser.add_argument('--round-log', default=ROUND_LOG_PATH,
+                        help="binary log of every round, {port} is replaced by --port; empty to disable")
+    parser.add_argument('--seed', type=master_seed_arg,
+                        help="master seed of the session shuffles (default: random, printed)")
+    parser.add_argument('--capture', metavar='PATH',
+                        help="record every session's bytes to this file, for replay.py")
+    parser.add_argument('--trace', action='store_true',
+                        help="start with tracing on; SIGUSR1 toggles it, SIGUSR2 writes the trace")
+    parser.add_argument('--trace-sample', type=float, default=TRACE_SAMPLE_RATE,
+                        help="share of sessions traced")
+    args = parser.parse_args()
+
+    TRACER.sample_rate = args.trace_sample
+    TRACER.enabled = args.trace
+    TRACER.install_signals()
+
+    SHOE_POOL.start(args.seed)
+    handler_options = {}
+    try:
+        handler_options['round_log'] = open_round_log(args.round_log, args.port)
+    except RoundLogLocked as e:
+        parser.error(str(e))
+    if args.capture:
+        handler_options['capture'] = CaptureWriter(args.capture, SHOE_POOL.master_seed)
+    handler = partial(client_handler, **handler_options)
+    pool = SessionPool(handler, args.workers, args.queue, args.max_wait)
+
+    # UDP offers in background: the periodic broadcast and answers to probes
+    start_offer_threads(args.port, args.name, pool.load)
+
+    # Metrics on a local admin port and in a periodic snapshot file
+    metrics.start_metrics_threads(args.admin_port, METRICS_SNAPSHOT_PATH, METRICS_SNAPSHOT_INTERVAL)
+    LEADERBOARD.start()
+    TIMERS.start()
 
     # Run TCP accept loop (blocks forever)
-    tcp_accept_loop(TCP_PORT, client_handler)
\ No newline at end of file
+    tcp_accept_loop(args.port, handler, backlog=args.backlog, pool=pool)
@@ -0,0 +1,216 @@
+"""
+Vectorized Monte Carlo simulator for the server's blackjack rules.
+
+Rounds are played in large batches: every row of a NumPy array is one freshly
+shuffled 52-card deck, and the rules of game_session.GameSession are applied
+to all rows at once:
+  - Ace is always 1, face cards are 10 (cards.card_value)
+  - the client draws cards 0-1, the dealer cards 2-3 (card 3 hidden)
+  - the client busts above 21, and a bust is checked before the dealer plays
+  - the dealer draws while below 17 (game_session.dealer_turn)
+  - results follow game_session.decide_winner, ties push
+
+Batches are spread over a process pool. Requires NumPy.
+
+    python simulator.py --rounds 10000000 --stand-on 17
+    python simulator.py --check 200000        # compare with the scalar server functions
+"""
+import argparse
+import math
+import os
+import random
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from cards import card_value, Deck
+from game_session import dealer_turn, decide_winner
+from utils import RESULT_TIE, RESULT_LOSS, RESULT_WIN
+
+# Card values of one deck, 4 suits per rank, Ace = 1 and J/Q/K = 10
+DECK_VALUES = np.repeat(np.minimum(np.arange(1, 14), 10), 4).astype(np.int8)
+
+DEFAULT_BATCH_SIZE = 100_000
+DEALER_STAND = 17
+
+
+class StandOn:
+    """
+    Player policy: hit while the hand total is below threshold.
+    Policies are called with (player_totals, dealer_upcards) arrays and
+    return a boolean "hit" array; they must be picklable for the process pool.
+    """
+
+    def __init__(self, threshold: int):
+        self.threshold = threshold
+
+    def __call__(self, player_totals, dealer_upcards):
+        return player_totals < self.threshold
+
+    def __repr__(self):
+        return f"StandOn({self.threshold})"
+
+
+def shuffled_decks(rng: np.random.Generator, n: int) -> np.ndarray:
+    """
+    Returns an (n, 52) array of card values, every row an independent shuffle.
+    """
+    order = np.argsort(rng.random((n, 52)), axis=1)
+    return DECK_VALUES[order]
+
+
+def play_batch(decks: np.ndarray, policy) -> np.ndarray:
+    """
+    Plays one round per deck row and returns the result code of every row.
+    """
+    n = decks.shape[0]
+    rows = np.arange(n)
+    player = decks[:, 0].astype(np.int16) + decks[:, 1]
+    upcard = decks[:, 2].astype(np.int16)
+    next_card = np.full(n, 4)
+
+    # ---- Player turn ----
+    # The server only asks for a decision while the total is <= 21
+    asking = player <= 21
+    while True:
+        hitting = rows[asking & policy(player, upcard)]
+        if hitting.size == 0:
+            break
+        player[hitting] += decks[hitting, next_card[hitting]]
+        next_card[hitting] += 1
+        asking = np.zeros(n, dtype=bool)
+        asking[hitting] = player[hitting] <= 21
+
+    client_bust = player > 21
+
+    # ---- Dealer turn (only played when the client did not bust) ----
+    dealer = upcard + decks[:, 3]
+    drawing = rows[~client_bust & (dealer < DEALER_STAND)]
+    while drawing.size:
+        dealer[drawing] += decks[drawing, next_card[drawing]]
+        next_card[drawing] += 1
+        drawing = drawing[dealer[drawing] < DEALER_STAND]
+
+    dealer_bust = dealer > 21
+
+    # ---- Decide winner, same precedence as decide_winner ----
+    results = np.full(n, RESULT_TIE, dtype=np.int8)
+    results[player > dealer] = RESULT_WIN
+    results[dealer > player] = RESULT_LOSS
+    results[dealer_bust] = RESULT_WIN
+    results[client_bust] = RESULT_LOSS
+    return results
+
+
+def simulate_batch(n: int, policy, seed) -> tuple[int, int, int]:
+    """
+    Worker entry point: plays n rounds and returns (wins, losses, ties).
+    """
+    rng = np.random.default_rng(seed)
+    results = play_batch(shuffled_decks(rng, n), policy)
+    counts = np.bincount(results, minlength=4)
+    return int(counts[RESULT_WIN]), int(counts[RESULT_LOSS]), int(counts[RESULT_TIE])
+
+
+def simulate(rounds: int, policy, workers: int = None,
+             batch_size: int = DEFAULT_BATCH_SIZE, seed: int = None) -> dict:
+    """
+    Plays `rounds` rounds split into batches over a process pool.
+    """
+    workers = workers or os.cpu_count()
+    num_batches = math.ceil(rounds / batch_size)
+    sizes = [batch_size] * (num_batches - 1) + [rounds - batch_size * (num_batches - 1)]
+    seeds = np.random.SeedSequence(seed).spawn(num_batches)
+
+    wins = losses = ties = 0
+    if workers == 1:
+        outcomes = map(simulate_batch, sizes, [policy] * num_batches, seeds)
+        for w, l, t in outcomes:
+            wins, losses, ties = wins + w, losses + l, ties + t
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for w, l, t in pool.map(simulate_batch, sizes, [policy] * num_batches, seeds):
+                wins, losses, ties = wins + w, losses + l, ties + t
+
+    return {'rounds': rounds, 'wins': wins, 'losses': losses, 'ties': ties}
+
+
+def simulate_scalar(rounds: int, policy, seed: int = None) -> dict:
+    """
+    Reference implementation built from the server's own scalar functions,
+    one Deck per round.
+    """
+    random.seed(seed)
+    counts = {RESULT_WIN: 0, RESULT_LOSS: 0, RESULT_TIE: 0}
+    for _ in range(rounds):
+        deck = Deck()
+        client_cards = [deck.draw(), deck.draw()]
+        dealer_cards = [deck.draw(), deck.draw()]
+        client_total = sum(card_value(c) for c in client_cards)
+        dealer_total = card_value(dealer_cards[0])
+        upcard = dealer_total
+
+        client_bust = False
+        while True:
+            if client_total > 21:
+                client_bust = True
+                break
+            if not policy(np.array([client_total]), np.array([upcard]))[0]:
+                break
+            client_total += card_value(deck.draw())
+
+        dealer_bust = False
+        if not client_bust:
+            _, dealer_total, dealer_bust = dealer_turn(deck, dealer_cards)
+
+        counts[decide_winner(client_total, dealer_total, client_bust, dealer_bust)] += 1
+
+    return {'rounds': rounds, 'wins': counts[RESULT_WIN],
+            'losses': counts[RESULT_LOSS], 'ties': counts[RESULT_TIE]}
+
+
+def rates_agree(a: dict, b: dict, sigmas: float = 4.0) -> bool:
+    """
+    True if win/loss/tie rates of two runs differ by less than `sigmas`
+    standard errors of the difference of two proportions.
+    """
+    for key in ('wins', 'losses', 'ties'):
+        pa, pb = a[key] / a['rounds'], b[key] / b['rounds']
+        pooled = (a[key] + b[key]) / (a['rounds'] + b['rounds'])
+        se = math.sqrt(pooled * (1 - pooled) * (1 / a['rounds'] + 1 / b['rounds']))
+        if abs(pa - pb) > sigmas * se:
+            return False
+    return True
+
+
+def format_rates(stats: dict) -> str:
+    n = stats['rounds']
+    edge = (stats['losses'] - stats['wins']) / n
+    return (f"win {stats['wins'] / n:.4f}  loss {stats['losses'] / n:.4f}  "
+            f"tie {stats['ties'] / n:.4f}  house edge {edge:+.4f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Vectorized blackjack simulator")
+    parser.add_argument('--rounds', type=int, default=10_000_000)
+    parser.add_argument('--stand-on', type=int, default=17)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument('--seed', type=int, default=None)
+    parser.add_argument('--check', type=int, metavar='N',
+                        help="also play N rounds with the scalar server functions and compare")
+    args = parser.parse_args()
+
+    policy = StandOn(args.stand_on)
+
+    start = time.perf_counter()
+    stats = simulate(args.rounds, policy, args.workers, args.batch_size, args.seed)
+    elapsed = time.perf_counter() - start
+    print(f"{policy}: {format_rates(stats)}")
+    print(f"{stats['rounds']} rounds in {elapsed:.2f}s ({stats['rounds'] / elapsed * 60 / 1e6:.1f}M rounds/minute)")
+
+    if args.check:
+        scalar = simulate_scalar(args.check, policy, args.seed)
+        print(f"scalar:  {format_rates(scalar)}")
+        print("agree" if rates_agree(stats, scalar) else "MISMATCH")
@@ -0,0 +1,138 @@
+"""
+Exact hit/stand expected values for the server's rules, on an infinite deck.
+
+The rules are not casino blackjack, so standard charts do not apply:
+  - Ace is always 1, face cards are 10 (cards.card_value); there are no soft
+    hands and no naturals
+  - the dealer draws while below 17 (game_session.dealer_turn)
+  - a client bust loses before the dealer plays, a dealer bust then wins,
+    equal totals push (game_session.decide_winner)
+
+With an infinite deck every draw is a 1..9 with probability 1/13 and a 10
+with probability 4/13. The server deals from a 6-deck shoe, close enough that
+composition effects do not flip any decision worth measuring.
+
+The dealer's final total is worked out once per upcard, then the player's
+values are filled in from 21 down, since hitting only moves to higher totals:
+    EV_stand(t, u) = P(dealer busts) + P(dealer < t) - P(dealer > t)
+    EV_hit(t, u)   = sum over v of p(v) * (-1 if t + v > 21 else EV(t + v, u))
+    EV(t, u)       = max(EV_hit, EV_stand)
+The result is a strategies.LookupTable, saved as its 25-byte bitmap and
+shipped in strategies.OPTIMAL_TABLE.
+
+    python solver.py                       # print the table and EVs
+    python solver.py --out optimal.table   # write the bitmap, load with file:optimal.table
+    python solver.py --check               # verify strategies.OPTIMAL_TABLE
+"""
+import argparse
+from functools import lru_cache
+from strategies import LookupTable, OPTIMAL_TABLE, MIN_TOTAL, MAX_TOTAL, UPCARDS
+
+DEALER_STAND = 17
+BUST = 22  # every dealer total above 21
+
+CARD_PROBABILITIES = {value: (4 if value == 10 else 1) / 13 for value in range(1, 11)}
+
+
+@lru_cache(maxsize=None)
+def dealer_outcomes(total: int) -> dict:
+    """
+    Probability of each final dealer total (17..21, or BUST) from a hand
+    worth total that still has to draw.
+    """
+    if total > 21:
+        return {BUST: 1.0}
+    if total >= DEALER_STAND:
+        return {total: 1.0}
+    outcomes = {}
+    for value, p in CARD_PROBABILITIES.items():
+        for final, q in dealer_outcomes(total + value).items():
+            outcomes[final] = outcomes.get(final, 0.0) + p * q
+    return outcomes
+
+
+def dealer_distribution(upcard: int) -> dict:
+    """
+    Final dealer totals given the upcard; the hidden card is just a draw.
+    """
+    return dealer_outcomes(upcard)
+
+
+def stand_ev(total: int, dealer: dict) -> float:
+    ev = 0.0
+    for final, p in dealer.items():
+        if final == BUST or final < total:
+            ev += p
+        elif final > total:
+            ev -= p
+    return ev
+
+
+def solve() -> dict:
+    """
+    (total, upcard) -> (EV of hitting, EV of standing), for every decision cell.
+    """
+    values = {}
+    for upcard in UPCARDS:
+        dealer = dealer_distribution(upcard)
+        best = {}
+        for total in range(MAX_TOTAL, MIN_TOTAL - 1, -1):
+            hit = sum(p * (-1.0 if total + value > 21 else best[total + value])
+                      for value, p in CARD_PROBABILITIES.items())
+            stand = stand_ev(total, dealer)
+            best[total] = max(hit, stand)
+            values[total, upcard] = (hit, stand)
+    return values
+
+
+def optimal_table(values: dict = None) -> LookupTable:
+    values = values or solve()
+    return LookupTable(cell for cell, (hit, stand) in values.items() if hit > stand)
+
+
+def expected_value(values: dict) -> float:
+    """
+    EV per round of the optimal strategy, over the opening deal.
+    """
+    ev = 0.0
+    for upcard, pu in CARD_PROBABILITIES.items():
+        for first, p1 in CARD_PROBABILITIES.items():
+            for second, p2 in CARD_PROBABILITIES.items():
+                ev += pu * p1 * p2 * max(values[first + second, upcard])
+    return ev
+
+
+def print_table(values: dict):
+    print("H = hit, S = stand; rows are the player's total, columns the dealer's upcard")
+    print("total " + ''.join(f"{upcard:>3}" for upcard in UPCARDS))
+    for total in range(MIN_TOTAL, MAX_TOTAL + 1):
+        marks = ''.join(f"{'H' if values[total, upcard][0] > values[total, upcard][1] else 'S':>3}"
+                        for upcard in UPCARDS)
+        print(f"{total:>5} {marks}")
+    print(f"EV per round: {expected_value(values):+.4f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Solve hit/stand for the server's rules")
+    parser.add_argument('--out', metavar='PATH', help="write the table bitmap to this file")
+    parser.add_argument('--check', action='store_true',
+                        help="exit with an error if strategies.OPTIMAL_TABLE is out of date")
+    args = parser.parse_args()
+
+    values = solve()
+    table_bytes = optimal_table(values).to_bytes()
+    print_table(values)
+    print(f"table: {table_bytes.hex()}")
+
+    if args.out:
+        with open(args.out, 'wb') as f:
+            f.write(table_bytes)
+        print(f"Wrote {len(table_bytes)} bytes to {args.out}")
+    if args.check:
+        if table_bytes != OPTIMAL_TABLE:
+            raise SystemExit("strategies.OPTIMAL_TABLE differs from the solved table")
+        print("strategies.OPTIMAL_TABLE is up to date")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,121 @@
+"""
+Hit/stand strategies for headless play.
+
+A strategy is any object with should_hit(player_total, dealer_upcard) -> bool,
+where dealer_upcard is the card value of the dealer's visible card (1-10).
+"""
+
+MIN_TOTAL = 2    # two Aces
+MAX_TOTAL = 21   # the server only asks for a move while we are <= 21
+UPCARDS = range(1, 11)
+
+# Every (total, upcard) decision cell, total-major: 20 x 10 = 200 cells,
+# which fit a 25-byte bitmap (see LookupTable.to_bytes)
+TABLE_CELLS = [(total, upcard) for total in range(MIN_TOTAL, MAX_TOTAL + 1) for upcard in UPCARDS]
+TABLE_BYTES = (len(TABLE_CELLS) + 7) // 8
+
+# Best move in every cell for this ruleset (Ace always 1, dealer hits below
+# 17, ties push), as LookupTable bytes. Generated by solver.py; check with
+# python solver.py --check
+OPTIMAL_TABLE = bytes.fromhex('fffffffffffffffffffffffffe3e0f03c0f038000000000000')
+
+
+class StandOn:
+    """
+    Hits while the hand total is below threshold.
+    """
+
+    def __init__(self, threshold: int = 17):
+        self.threshold = threshold
+
+    def should_hit(self, player_total: int, dealer_upcard: int) -> bool:
+        return player_total < self.threshold
+
+    def __repr__(self):
+        return f"StandOn({self.threshold})"
+
+
+class LookupTable:
+    """
+    Hit/stand decision for every (player total, dealer upcard) pair.
+    Stored as a set of (total, upcard) pairs on which to hit.
+    """
+
+    def __init__(self, hits):
+        self.hits = frozenset(hits)
+
+    @classmethod
+    def from_strategy(cls, strategy) -> 'LookupTable':
+        return cls(
+            (total, upcard)
+            for total in range(MIN_TOTAL, MAX_TOTAL + 1)
+            for upcard in UPCARDS
+            if strategy.should_hit(total, upcard)
+        )
+
+    @classmethod
+    def from_thresholds(cls, thresholds: dict) -> 'LookupTable':
+        """
+        thresholds: dealer upcard -> stand-on total for that upcard.
+        """
+        return cls(
+            (total, upcard)
+            for upcard, threshold in thresholds.items()
+            for total in range(MIN_TOTAL, threshold)
+        )
+
+    @classmethod
+    def from_bytes(cls, data: bytes) -> 'LookupTable':
+        """
+        Inverse of to_bytes.
+        """
+        return cls(cell for i, cell in enumerate(TABLE_CELLS) if data[i >> 3] & (0x80 >> (i & 7)))
+
+    def to_bytes(self) -> bytes:
+        """
+        The table as a TABLE_BYTES bitmap: bit i (MSB first) is set when we
+        hit on TABLE_CELLS[i].
+        """
+        bits = bytearray(TABLE_BYTES)
+        for i, cell in enumerate(TABLE_CELLS):
+            if cell in self.hits:
+                bits[i >> 3] |= 0x80 >> (i & 7)
+        return bytes(bits)
+
+    def should_hit(self, player_total: int, dealer_upcard: int) -> bool:
+        return (player_total, dealer_upcard) in self.hits
+
+    def __repr__(self):
+        return f"LookupTable({len(self.hits)} hit cells)"
+
+
+def upcard_value(rank: int) -> int:
+    """
+    Card value of a rank as the server counts it: Ace 1, faces 10.
+    """
+    return min(rank, 10)
+
+
+def parse_strategy(spec: str):
+    """
+    Builds a strategy from a command line spec:
+        stand:17            -> StandOn(17)
+        table:1=17,2=13,... -> LookupTable.from_thresholds (missing upcards stand on 17)
+        optimal             -> the solved table, OPTIMAL_TABLE
+        file:PATH           -> a table written by solver.py --out
+    """
+    kind, _, arg = spec.partition(':')
+    if kind == 'stand':
+        return StandOn(int(arg or 17))
+    if kind == 'table':
+        thresholds = dict.fromkeys(UPCARDS, 17)
+        for item in filter(None, arg.split(',')):
+            upcard, threshold = item.split('=')
+            thresholds[int(upcard)] = int(threshold)
+        return LookupTable.from_thresholds(thresholds)
+    if kind == 'optimal':
+        return LookupTable.from_bytes(OPTIMAL_TABLE)
+    if kind == 'file':
+        with open(arg, 'rb') as f:
+            return LookupTable.from_bytes(f.read(TABLE_BYTES))
+    raise ValueError(f"Unknown strategy '{spec}'")
@@ -0,0 +1,542 @@
+"""
+Shared-dealer tables: up to TABLE_SEATS players share one shoe and one
+dealer hand.
+
+In server.py and async_server.py every connection plays against its own
+dealer, so dealer turns and shuffles grow with the number of players. Here a
+Table deals a round to every seated player that is ready, waits for all of
+their decisions, then plays the dealer hand once and sends the same dealer
+frames to everyone who stood. A client sees exactly the frames of the usual
+protocol; it only waits a little longer for the dealer's cards, while the
+other players decide. Auto-play requests are not accepted at a table.
+
+Like GameSession, Table does no I/O. TableServer drives it:
+  - one reactor thread reads every seat's socket (non-blocking, selectors)
+    and posts what it read to the seat's table;
+  - each table is an actor with its own inbox, run on a ThreadPoolExecutor
+    of TABLE_WORKERS threads, one thread per table at a time. A table waiting
+    on a slow player holds no thread, so it cannot hold up the others;
+  - frames are written with non-blocking sends. A seat whose socket cannot
+    take a whole batch is dropped rather than stalling its table.
+Deadlines are the usual SessionDeadline on the timer wheel; while a seat
+waits for the rest of its table it has none.
+
+    python tables.py --port 2048 --seats 6
+"""
+import argparse
+import selectors
+import socket
+import threading
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+import metrics
+from cards import Shoe, CARD_VALUES, NO_CARD
+from game_session import Player, RequestParseError, ACTIVE_FRAMES
+from game_session import dealer_turn, decide_winner, parse_request_packet, parse_client_payload
+from leaderboard import LEADERBOARD
+from protocol import SERVER_FRAMES
+from rng import SHOE_POOL, master_seed_arg
+from roundlog import RoundLog, RoundLogLocked
+from server import start_offer_threads, tcp_accept_loop
+from server import READ_BUFFER_SIZE, ADMIN_PORT, METRICS_SNAPSHOT_PATH, METRICS_SNAPSHOT_INTERVAL
+from server import ROUND_LOG_PATH, LISTEN_BACKLOG, open_round_log
+from server import SESSIONS_ACTIVE, ROUNDS_PLAYED, DISCONNECTS
+from server import SessionDeadline, TIMEOUT_FRAME
+from admission import reject
+from timerwheel import TIMERS
+from utils import MSG_TYPE_AUTOPLAY, CMD_HIT, CMD_STAND, RESULT_WIN, RESULT_LOSS
+
+TABLE_SEATS = 6     # players per table
+TABLE_WORKERS = 8   # threads running tables
+MAX_TABLES = 256    # tables open at once; players beyond them are turned away
+
+TABLE_ROUNDS = metrics.REGISTRY.counter(
+    'table_rounds', "rounds dealt at shared tables, one dealer hand each")
+
+
+class Seat(Player):
+    """
+    One player at a table: the game_session.Player state and framing, plus
+    its connection. A SessionDeadline can watch it like a GameSession.
+    """
+
+    READY = 'ready'      # in a game, waiting for the next round to be dealt
+    WAIT_DEALER = 'dealer'  # done deciding, waiting for the dealer hand
+
+    def __init__(self, sock: socket.socket, addr):
+        super().__init__()
+        self.sock = sock
+        self.addr = addr
+        self.standing = False
+
+        self.deadline = None
+        self.error = None  # the malformed message that ends this seat
+        self.closed = False
+
+
+class Table:
+    """
+    The game at one table, with no I/O.
+
+    join(seat), receive(seat, data) and leave(seat) each return the frames
+    to send as {seat: [frames]}. A round is dealt as soon as no round is in
+    progress and a seat is READY; seats that send their request during a
+    round sit out until the next one. A seat that sends a malformed message
+    gets its `error` set and plays no further; the caller should make it
+    leave.
+
+    on_round: optional callable(seat, result) invoked after every finished round.
+    log, round_log: as for GameSession.
+    """
+
+    def __init__(self, table_id: int, deck: Shoe, on_round=None, log=print, round_log=None):
+        self.table_id = table_id
+        self.deck = deck
+        self.on_round = on_round
+        self.log = log
+        self.round_log = round_log
+
+        self.seats = []
+        self.out = None
+
+        # Current round
+        self.players = []  # seats dealt in
+        self.deciding = 0  # players still to stand or bust
+        self.dealer_cards = None
+
+    def join(self, seat: Seat) -> dict:
+        self.out = {}
+        self.seats.append(seat)
+        return self.out
+
+    def receive(self, seat: Seat, data) -> dict:
+        self.out = {}
+        seat.buffer += data
+        self._settle()
+        return self.out
+
+    def leave(self, seat: Seat) -> dict:
+        self.out = {}
+        if seat in self.seats:
+            self.seats.remove(seat)
+        if seat in self.players:
+            self.players.remove(seat)
+            if seat.state == Seat.WAIT_DECISION:
+                self.deciding -= 1
+                if self.deciding == 0 and self.players:
+                    self._finish_round()
+            if not self.players:
+                self.deciding = 0
+        seat.state = None
+        self._settle()
+        return self.out
+
+    def disconnect_reason(self, seat: Seat) -> str:
+        """
+        How a seat's client hanging up is counted, as in server.client_handler.
+        """
+        if seat.state == Seat.WAIT_DEALER and not seat.standing and seat.round_num == seat.rounds:
+            return 'completed'  # busted on its last round, already has its result
+        if seat.state in (Seat.WAIT_DECISION, Seat.WAIT_DEALER, Seat.READY):
+            return 'mid_round'
+        if seat.games == 0 or seat.buffer:
+            return 'disconnected'
+        return 'completed'
+
+    def _send(self, seat: Seat, frames):
+        self.out.setdefault(seat, []).extend(frames)
+
+    def _settle(self):
+        """
+        Plays everything the buffered bytes allow, dealing new rounds as the
+        table frees up.
+        """
+        while True:
+            for seat in list(self.seats):
+                self._drain(seat)
+            if self.players or not any(seat.state == Seat.READY for seat in self.seats):
+                return
+            self._start_round()
+
+    def _drain(self, seat: Seat):
+        if seat.error:
+            return
+        start = 0
+        try:
+            # Stops in READY and WAIT_DEALER: the table plays on before this
+            # seat's next move
+            while True:
+                message, start = seat.next_message(start)
+                if message is None:
+                    break
+                if seat.state == Seat.WAIT_DECISION:
+                    self._decide(seat, parse_client_payload(message))
+                else:
+                    self._start_game(seat, message)
+        except (RequestParseError, ValueError) as e:
+            seat.error = e
+        finally:
+            del seat.buffer[:start]
+
+    def _start_game(self, seat: Seat, request: bytes):
+        if request[4] == MSG_TYPE_AUTOPLAY:
+            raise RequestParseError("Auto-play is not available at a shared table")
+        rounds, team_name = parse_request_packet(request)
+
+        seat.start_game(rounds, team_name)
+        if self.log and seat.games == 1:
+            self.log(f"Client '{team_name}' sat down at table {self.table_id}, "
+                     f"playing {rounds} rounds")
+        elif self.log:
+            self.log(f"Client '{team_name}' started game {seat.games} at table {self.table_id}, "
+                     f"playing {rounds} rounds")
+        seat.state = Seat.READY
+
+    def _start_round(self):
+        deck = self.deck
+        deck.start_round()
+        TABLE_ROUNDS.inc()
+
+        # ---- Initial deal: every player's two cards, then the dealer's ----
+        players = [seat for seat in self.seats if seat.state == Seat.READY]
+        for seat in players:
+            seat.client_cards = [deck.draw(), deck.draw()]
+        dealer_cards = [deck.draw(), deck.draw()]
+        upcard_frame = ACTIVE_FRAMES[dealer_cards[0]]  # second card hidden
+
+        for seat in players:
+            seat.round_num += 1
+            seat.client_total = CARD_VALUES[seat.client_cards[0]] + CARD_VALUES[seat.client_cards[1]]
+            seat.standing = False
+            seat.state = Seat.WAIT_DECISION
+            self._send(seat, (upcard_frame, ACTIVE_FRAMES[seat.client_cards[0]],
+                              ACTIVE_FRAMES[seat.client_cards[1]]))
+
+        self.players = players
+        self.deciding = len(players)
+        self.dealer_cards = dealer_cards
+
+    def _decide(self, seat: Seat, decision: str):
+        seat.decisions += 1
+        if decision == CMD_STAND:
+            seat.standing = True
+            self._done_deciding(seat)
+
+        elif decision == CMD_HIT:
+            card = self.deck.draw()
+            seat.client_cards.append(card)
+            seat.client_total += CARD_VALUES[card]
+            self._send(seat, (ACTIVE_FRAMES[card],))
+            if seat.client_total > 21:
+                # A bust is settled right away, no need to wait for the dealer
+                self._send(seat, (SERVER_FRAMES[RESULT_LOSS][NO_CARD],))
+                dealer_total = CARD_VALUES[self.dealer_cards[0]] + CARD_VALUES[self.dealer_cards[1]]
+                self._round_finished(seat, RESULT_LOSS, dealer_total)
+                self._done_deciding(seat)
+        else:
+            raise ValueError("Invalid client decision")
+
+    def _done_deciding(self, seat: Seat):
+        seat.state = Seat.WAIT_DEALER
+        self.deciding -= 1
+        if self.deciding == 0:
+            self._finish_round()
+
+    def _finish_round(self):
+        standing = [seat for seat in self.players if seat.standing]
+        if standing:
+            # ---- One dealer turn for the whole table ----
+            dealer_cards, dealer_total, dealer_bust = dealer_turn(self.deck, self.dealer_cards)
+            # Hidden dealer card, then any additional dealer cards: the same
+            # frames for every seat
+            dealer_frames = [ACTIVE_FRAMES[card] for card in dealer_cards[1:]]
+            for seat in standing:
+                result = decide_winner(seat.client_total, dealer_total, False, dealer_bust)
+                self._send(seat, dealer_frames)
+                self._send(seat, (SERVER_FRAMES[result][NO_CARD],))
+                self._round_finished(seat, result, dealer_total)
+
+        for seat in self.players:
+            if seat.round_num < seat.rounds:
+                seat.state = Seat.READY
+            else:
+                seat.state = Seat.WAIT_REQUEST
+                if self.log:
+                    self.log(f"Client '{seat.team_name}' finished all rounds, "
+                             f"won {seat.games_won}/{seat.round_num} games")
+        self.players = []
+        self.dealer_cards = None
+
+    def _round_finished(self, seat: Seat, result: int, dealer_total: int):
+        if result == RESULT_WIN:
+            seat.games_won += 1
+        if self.on_round:
+            self.on_round(seat, result)
+        if self.round_log:
+            self.round_log.record(seat.team_name, seat.client_cards, self.dealer_cards,
+                                  seat.client_total, dealer_total, result)
+
+
+class TableRunner:
+    """
+    A Table and its inbox of (kind, seat, data) events, played on the
+    server's executor by one thread at a time.
+    """
+
+    # Event kinds
+    JOIN = 'join'
+    DATA = 'data'
+    CLOSED = 'closed'
+    TIMEOUT = 'timeout'
+
+    def __init__(self, server: 'TableServer', table: Table):
+        self.server = server
+        self.table = table
+        self.taken = 0  # seats handed out, including joins still in the inbox
+        self.inbox = deque()
+        self.lock = threading.Lock()
+        self.scheduled = False
+
+    def post(self, kind: str, seat: Seat, data=None):
+        with self.lock:
+            self.inbox.append((kind, seat, data))
+            if self.scheduled:
+                return
+            self.scheduled = True
+        self.server.executor.submit(self._run)
+
+    def _run(self):
+        while True:
+            with self.lock:
+                if not self.inbox:
+                    self.scheduled = False
+                    return
+                kind, seat, data = self.inbox.popleft()
+            try:
+                self._handle(kind, seat, data)
+            except Exception as e:
+                print(f"Table {self.table.table_id} error: {e}")
+
+    def _handle(self, kind: str, seat: Seat, data):
+        table = self.table
+        if seat.closed:
+            return  # read or timed out before its hang-up was handled
+
+        if kind == self.JOIN:
+            SESSIONS_ACTIVE.inc()
+            seat.deadline = SessionDeadline(seat, partial(self.post, self.TIMEOUT, seat))
+            out = table.join(seat)
+            self.server.watch(seat, self)
+        elif kind == self.DATA:
+            out = table.receive(seat, data)
+        elif kind == self.CLOSED:
+            reason = table.disconnect_reason(seat)
+            if reason == 'mid_round':
+                print(f"Client '{seat.team_name}' disconnected mid-round")
+            self._drop(seat, reason)
+            return
+        else:
+            print(f"Client {seat.addr} timed out: no {seat.deadline.expired} in time")
+            self._send(seat, TIMEOUT_FRAME)
+            self._drop(seat, 'timeout')
+            return
+        self._send_all(out)
+
+    def _send(self, seat: Seat, data: bytes) -> bool:
+        try:
+            sent = seat.sock.send(data)
+        except OSError:
+            return False
+        return sent == len(data)
+
+    def _send_all(self, out: dict):
+        slow = []
+        for seat, frames in out.items():
+            if not seat.closed and not self._send(seat, b''.join(frames)):
+                slow.append(seat)
+        for seat in self.table.seats:
+            seat.deadline.update()
+        for seat in slow:
+            if not seat.closed:
+                print(f"Client {seat.addr} is not reading, dropped")
+                self._drop(seat, 'slow')
+        for seat in [seat for seat in self.table.seats if seat.error]:
+            print(f"Error with client {seat.addr}: {seat.error}")
+            self._drop(seat, 'bad_request' if isinstance(seat.error, RequestParseError) else 'error')
+
+    def _drop(self, seat: Seat, reason: str):
+        seat.closed = True
+        seat.deadline.cancel()
+        DISCONNECTS.inc(reason)
+        SESSIONS_ACTIVE.dec()
+        self.server.release(seat, self)
+        self._send_all(self.table.leave(seat))
+
+
+class TableServer:
+    """
+    Seats accepted connections at tables; a drop-in for admission.SessionPool
+    in tcp_accept_loop (submit) and in the offer broadcast (load).
+
+    New players fill the fullest table that has a free seat, so rounds are
+    shared as widely as possible. When all MAX_TABLES are full the
+    connection is answered with a busy frame.
+    """
+
+    def __init__(self, seats: int = TABLE_SEATS, workers: int = TABLE_WORKERS,
+                 max_tables: int = MAX_TABLES, round_log: RoundLog = None):
+        self.seats = seats
+        self.max_tables = max_tables
+        self.round_log = round_log
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix='table')
+
+        self.lock = threading.Lock()  # guards tables and their taken counts
+        self.tables = []
+        self.seated = 0
+
+        # Only the reactor thread touches the selector; other threads queue
+        # (watch/release) changes and wake it up
+        self.selector = selectors.DefaultSelector()
+        self.changes = deque()
+        self.wakeup_recv, self.wakeup_send = socket.socketpair()
+        self.wakeup_recv.setblocking(False)
+        self.wakeup_send.setblocking(False)
+        self.selector.register(self.wakeup_recv, selectors.EVENT_READ, None)
+
+        metrics.REGISTRY.gauge('tables_open', "shared tables with players seated",
+                               function=lambda: len(self.tables))
+        threading.Thread(target=self._reactor, daemon=True).start()
+
+    def load(self) -> tuple[int, int]:
+        """
+        (seated players, seats at MAX_TABLES tables), as advertised in offers.
+        """
+        return self.seated, self.seats * self.max_tables
+
+    def submit(self, client_sock: socket.socket, client_addr) -> bool:
+        """
+        Seats a connection at a table. Returns False if it was rejected.
+        """
+        with self.lock:
+            free = [runner for runner in self.tables if runner.taken < self.seats]
+            if free:
+                runner = max(free, key=lambda r: r.taken)
+            elif len(self.tables) < self.max_tables:
+                table_id, shoe = SHOE_POOL.take()
+                table = Table(table_id, shoe, self._round_finished, round_log=self.round_log)
+                runner = TableRunner(self, table)
+                self.tables.append(runner)
+                print(f"Opened table {table_id}")
+            else:
+                runner = None
+            if runner:
+                runner.taken += 1
+                self.seated += 1
+
+        if runner is None:
+            reject(client_sock, 'tables_full')
+            return False
+        client_sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        client_sock.setblocking(False)
+        runner.post(TableRunner.JOIN, Seat(client_sock, client_addr))
+        return True
+
+    def _round_finished(self, seat: Seat, result: int):
+        ROUNDS_PLAYED.inc()
+        LEADERBOARD.record(seat.team_name, result)
+
+    def watch(self, seat: Seat, runner: TableRunner):
+        self._change(('watch', seat, runner))
+
+    def release(self, seat: Seat, runner: TableRunner):
+        """
+        Frees the seat and closes its socket; a table with nobody left is closed.
+        """
+        with self.lock:
+            runner.taken -= 1
+            self.seated -= 1
+            if runner.taken == 0:
+                self.tables.remove(runner)
+                print(f"Closed table {runner.table.table_id}")
+        self._change(('release', seat, runner))
+
+    def _change(self, change: tuple):
+        self.changes.append(change)
+        try:
+            self.wakeup_send.send(b'\0')
+        except BlockingIOError:
+            pass  # already has wake-ups pending
+
+    def _apply_changes(self):
+        while self.changes:
+            kind, seat, runner = self.changes.popleft()
+            if kind == 'watch':
+                self.selector.register(seat.sock, selectors.EVENT_READ, (seat, runner))
+            else:
+                if seat.sock in self.selector.get_map():
+                    self.selector.unregister(seat.sock)
+                try:
+                    # Half-close first so a last frame is not lost to a reset
+                    seat.sock.shutdown(socket.SHUT_WR)
+                except OSError:
+                    pass
+                seat.sock.close()
+
+    def _reactor(self):
+        while True:
+            for key, _ in self.selector.select():
+                if key.data is None:
+                    try:
+                        self.wakeup_recv.recv(READ_BUFFER_SIZE)
+                    except BlockingIOError:
+                        pass
+                    continue
+
+                seat, runner = key.data
+                try:
+                    data = seat.sock.recv(READ_BUFFER_SIZE)
+                except BlockingIOError:
+                    continue
+                except OSError:
+                    data = b''
+                if data:
+                    runner.post(TableRunner.DATA, seat, data)
+                else:
+                    # Stop reading; the socket is closed once the table let it go
+                    self.selector.unregister(seat.sock)
+                    runner.post(TableRunner.CLOSED, seat)
+            self._apply_changes()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Blackjack server with shared-dealer tables")
+    parser.add_argument('--port', type=int, default=2048)
+    parser.add_argument('--name', default="Chauncey Billups")
+    parser.add_argument('--seats', type=int, default=TABLE_SEATS, help="players per table")
+    parser.add_argument('--workers', type=int, default=TABLE_WORKERS, help="threads running tables")
+    parser.add_argument('--max-tables', type=int, default=MAX_TABLES)
+    parser.add_argument('--backlog', type=int, default=LISTEN_BACKLOG)
+    parser.add_argument('--admin-port', type=int, default=ADMIN_PORT,
+                        help="local metrics port (see metrics.py); 0 disables it")
+    parser.add_argument('--round-log', default=ROUND_LOG_PATH,
+                        help="binary log of every round, {port} is replaced by --port; empty to disable")
+    parser.add_argument('--seed', type=master_seed_arg,
+                        help="master seed of the table shuffles (default: random, printed)")
+    args = parser.parse_args()
+
+    SHOE_POOL.start(args.seed, label="Table")
+    try:
+        round_log = open_round_log(args.round_log, args.port)
+    except RoundLogLocked as e:
+        parser.error(str(e))
+    pool = TableServer(args.seats, args.workers, args.max_tables, round_log)
+
+    # UDP offers in background: the periodic broadcast and answers to probes
+    start_offer_threads(args.port, args.name, pool.load)
+
+    metrics.start_metrics_threads(args.admin_port, METRICS_SNAPSHOT_PATH, METRICS_SNAPSHOT_INTERVAL)
+    LEADERBOARD.start()
+    TIMERS.start()
+
+    tcp_accept_loop(args.port, None, backlog=args.backlog, pool=pool)
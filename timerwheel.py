@@ -0,0 +1,166 @@
+"""
+Hierarchical timing wheel for the session deadlines.
+
+Every session has one deadline at a time: its first request, each decision,
+and the next request between games (idle). Rather than each blocked socket
+carrying its own timeout, the deadlines live in one wheel and a single
+thread (or event loop task) expires them. When one fires, the session is sent
+a RESULT_TIMEOUT frame and its socket is shut down, which wakes the blocked
+reader.
+
+The wheel has WHEEL_LEVELS levels of WHEEL_SLOTS slots. Level 0 slots are
+one tick wide, and each level above covers a whole turn of the level below.
+A timer goes in the lowest level whose range holds its deadline. Every time
+a level turns over, the next slot of the level above is poured back down.
+Level 0 spans 51.2s, longer than any session deadline (the longest is the
+30s idle timeout), so session timers go straight into their level 0 slot
+and are never cascaded; the levels above only hold longer delays.
+Scheduling and cancelling are O(1) set operations, and a tick only touches
+the timers that are due, so the cost per session stays flat however many
+sessions are waiting (see benchmarks/bench_timers.py).
+"""
+import asyncio
+import threading
+import time
+
+TICK = 0.1         # seconds
+WHEEL_SLOTS = 512  # per level, a power of two; level 0 spans 51.2s at 0.1s ticks
+WHEEL_LEVELS = 3   # 512**3 ticks, about 155 days at 0.1s
+
+SLOT_BITS = WHEEL_SLOTS.bit_length() - 1
+SLOT_MASK = WHEEL_SLOTS - 1
+
+
+class Timer:
+    __slots__ = ('expires', 'callback', 'args', 'slot')
+
+    def __init__(self, expires: int, callback, args: tuple):
+        self.expires = expires  # in ticks
+        self.callback = callback
+        self.args = args
+        self.slot = None        # the set holding it while pending
+
+
+class TimerWheel:
+    def __init__(self, tick: float = TICK, levels: int = WHEEL_LEVELS):
+        self.tick = tick
+        self.levels = levels
+        self.wheels = [[set() for _ in range(WHEEL_SLOTS)] for _ in range(levels)]
+        self.level0 = self.wheels[0]
+        self.origin = time.monotonic()
+        self.now = 0  # ticks advanced so far
+        self.pending = 0
+        self.lock = threading.Lock()
+        self.started = False
+
+    def schedule(self, delay: float, callback, *args) -> Timer:
+        """
+        Calls callback(*args) from the wheel's thread or task after delay
+        seconds, rounded up to a tick.
+        """
+        ticks = max(1, -int(-delay // self.tick))
+        with self.lock:
+            timer = Timer(self.now + ticks, callback, args)
+            self._place(timer)
+            self.pending += 1
+        return timer
+
+    def cancel(self, timer: Timer):
+        with self.lock:
+            if timer.slot is not None:
+                timer.slot.discard(timer)
+                timer.slot = None
+                self.pending -= 1
+
+    def reschedule(self, timer: Timer, delay: float) -> Timer:
+        """
+        Moves timer, pending or not, to delay seconds from now.
+        """
+        ticks = max(1, -int(-delay // self.tick))
+        with self.lock:
+            slot = timer.slot
+            if slot is not None:
+                slot.discard(timer)
+            else:
+                self.pending += 1
+            timer.expires = expires = self.now + ticks
+            if ticks < WHEEL_SLOTS:
+                # Fast path: the deadlines of a session all fit in level 0
+                slot = self.level0[expires & SLOT_MASK]
+                slot.add(timer)
+                timer.slot = slot
+            else:
+                self._place(timer)
+        return timer
+
+    def _place(self, timer: Timer):
+        level = max((timer.expires - self.now).bit_length() - 1, 0) // SLOT_BITS
+        if level >= self.levels:
+            level = self.levels - 1
+        slot = self.wheels[level][(timer.expires >> (SLOT_BITS * level)) & SLOT_MASK]
+        slot.add(timer)
+        timer.slot = slot
+
+    def advance(self, now: float = None) -> list:
+        """
+        Moves the wheel up to now and returns the expired timers, unlinked;
+        their callbacks are left to the caller so they run outside the lock.
+        """
+        target = int(((time.monotonic() if now is None else now) - self.origin) / self.tick)
+        expired = []
+        with self.lock:
+            while self.now < target:
+                self.now += 1
+                tick = self.now
+                # Pour down from the highest level that turned over, so a timer
+                # moved down twice in one tick still lands in a slot we visit
+                for level in range(self.levels - 1, 0, -1):
+                    if tick & ((1 << (SLOT_BITS * level)) - 1) == 0:
+                        slot = self.wheels[level][(tick >> (SLOT_BITS * level)) & SLOT_MASK]
+                        timers = list(slot)
+                        slot.clear()
+                        for timer in timers:
+                            self._place(timer)
+                slot = self.wheels[0][tick & SLOT_MASK]
+                for timer in slot:
+                    timer.slot = None
+                    expired.append(timer)
+                self.pending -= len(slot)
+                slot.clear()
+        return expired
+
+    def expire(self, now: float = None) -> int:
+        expired = self.advance(now)
+        for timer in expired:
+            try:
+                timer.callback(*timer.args)
+            except Exception as e:
+                print(f"Timer callback error: {e}")
+        return len(expired)
+
+    def start(self):
+        """
+        Expires timers on a background thread (threaded server).
+        """
+        if self.started:
+            return
+        self.started = True
+        threading.Thread(target=self._run, daemon=True).start()
+
+    def _run(self):
+        while True:
+            time.sleep(self.tick)
+            self.expire()
+
+    async def run(self):
+        """
+        Expires timers on the event loop (asyncio server), so callbacks may
+        touch streams directly.
+        """
+        self.started = True
+        while True:
+            await asyncio.sleep(self.tick)
+            self.expire()
+
+
+TIMERS = TimerWheel()
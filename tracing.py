@@ -0,0 +1,191 @@
+"""
+Sampled per-phase spans of sessions, exported as Chrome trace JSON.
+
+A sampled session records a span for each phase of its play: the request
+parse, every deal, every decision, each dealer turn, the time blocked waiting
+on the client and each send, all inside one span for the whole session. The
+spans go to a ring buffer of TRACE_CAPACITY entries preallocated as arrays,
+so tracing a live server allocates nothing per span and keeps only the
+latest spans.
+Sessions that are not sampled get no SessionTrace at all, so their cost is
+one `if trace` per phase.
+
+Tracing is off until switched on, at start (server.py --trace) or at runtime
+with a signal, so a live server can be profiled without a restart:
+    kill -USR1 <pid>   # tracing on/off
+    kill -USR2 <pid>   # write the buffer to trace-<pid>-<time>.json
+
+The file loads in chrome://tracing or https://ui.perfetto.dev, one track per
+session. Or summarize it here:
+    python tracing.py trace-1234-1700000000.json
+"""
+import argparse
+import json
+import os
+import random
+import signal
+import threading
+import time
+from array import array
+from metrics import percentile
+
+TRACE_CAPACITY = 65536    # spans kept, the oldest are overwritten
+TRACE_SAMPLE_RATE = 0.01  # share of sessions traced
+
+# Span names, stored as their index
+SESSION = 0
+REQUEST = 1
+DEAL = 2
+DECISION = 3
+DEALER_TURN = 4
+AUTOPLAY = 5
+RECV_WAIT = 6
+SEND = 7
+SPAN_NAMES = ('session', 'request parse', 'deal', 'decision', 'dealer turn', 'autoplay',
+              'recv wait', 'send')
+
+
+class Tracer:
+    def __init__(self, capacity: int = TRACE_CAPACITY, sample_rate: float = TRACE_SAMPLE_RATE):
+        self.capacity = capacity
+        self.sample_rate = sample_rate
+        self.enabled = False
+        self.origin = time.perf_counter()
+
+        # The ring buffer, one array per field
+        self.names = array('B', bytes(capacity))
+        self.sessions = array('q', bytes(8 * capacity))
+        self.starts = array('d', bytes(8 * capacity))
+        self.durations = array('d', bytes(8 * capacity))
+        self.recorded = 0  # spans ever recorded; the next one goes in recorded % capacity
+        self.lock = threading.Lock()
+
+    def session(self, session_id: int) -> 'SessionTrace':
+        """
+        The trace of a new session, or None if tracing is off or the session
+        is not sampled.
+        """
+        if self.enabled and random.random() < self.sample_rate:
+            return SessionTrace(self, session_id)
+        return None
+
+    def record(self, name: int, session_id: int, start: float, duration: float):
+        if not self.enabled:
+            return
+        with self.lock:
+            slot = self.recorded % self.capacity
+            self.recorded += 1
+            self.names[slot] = name
+            self.sessions[slot] = session_id
+            self.starts[slot] = start
+            self.durations[slot] = duration
+
+    def toggle(self) -> bool:
+        self.enabled = not self.enabled
+        return self.enabled
+
+    def spans(self) -> list[tuple]:
+        """
+        The buffered spans, oldest first, as (name, session id, start, duration).
+        """
+        with self.lock:
+            count = min(self.recorded, self.capacity)
+            first = self.recorded - count
+            slots = [(first + i) % self.capacity for i in range(count)]
+            return [(SPAN_NAMES[self.names[slot]], self.sessions[slot], self.starts[slot],
+                     self.durations[slot]) for slot in slots]
+
+    def export(self, path: str) -> int:
+        """
+        Writes the buffered spans as Chrome trace JSON ("X" complete events,
+        microseconds); returns how many.
+        """
+        pid = os.getpid()
+        spans = self.spans()
+        events = [
+            {'name': name, 'ph': 'X', 'pid': pid, 'tid': session_id,
+             'ts': round((start - self.origin) * 1e6, 3), 'dur': round(duration * 1e6, 3)}
+            for name, session_id, start, duration in spans
+        ]
+        # Name each session's track
+        events += [{'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': session_id,
+                    'args': {'name': f"session {session_id}"}}
+                   for session_id in sorted({span[1] for span in spans})]
+        with open(path, 'w') as f:
+            json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+        return len(spans)
+
+    def install_signals(self):
+        """
+        SIGUSR1 switches tracing on and off, SIGUSR2 writes the buffer out
+        (on its own thread, so the main thread is not held up). Call from
+        the main thread.
+        """
+        if not hasattr(signal, 'SIGUSR1'):
+            return
+
+        def on_toggle(signum, frame):
+            state = f"on (sampling {self.sample_rate:.0%} of sessions)" if self.toggle() else "off"
+            print(f"Tracing {state}")
+
+        def on_dump(signum, frame):
+            threading.Thread(target=self._dump, daemon=True).start()
+
+        signal.signal(signal.SIGUSR1, on_toggle)
+        signal.signal(signal.SIGUSR2, on_dump)
+
+    def _dump(self):
+        path = f"trace-{os.getpid()}-{int(time.time())}.json"
+        try:
+            count = self.export(path)
+        except OSError as e:
+            print(f"Could not write trace: {e}")
+            return
+        print(f"Wrote {count} spans to {path}")
+
+
+class SessionTrace:
+    """
+    Records the spans of one sampled session.
+    """
+    __slots__ = ('tracer', 'session_id')
+
+    def __init__(self, tracer: Tracer, session_id: int):
+        self.tracer = tracer
+        self.session_id = session_id
+
+    def add(self, name: int, start: float, end: float = None):
+        """
+        A span from start (time.perf_counter()) to end, or to now.
+        """
+        if end is None:
+            end = time.perf_counter()
+        self.tracer.record(name, self.session_id, start, end - start)
+
+
+TRACER = Tracer()
+
+
+def summarize(path: str):
+    with open(path) as f:
+        events = [event for event in json.load(f)['traceEvents'] if event['ph'] == 'X']
+    durations = {}
+    for event in events:
+        durations.setdefault(event['name'], []).append(event['dur'])
+
+    sessions = len({event['tid'] for event in events})
+    print(f"{len(events)} spans of {sessions} sessions")
+    print(f"{'phase':<14} {'count':>8} {'total ms':>10} {'mean us':>9} {'p50 us':>9} {'p99 us':>9}")
+    for name in SPAN_NAMES:
+        values = sorted(durations.get(name, ()))
+        if not values:
+            continue
+        print(f"{name:<14} {len(values):>8} {sum(values) / 1000:>10.1f} {sum(values) / len(values):>9.1f} "
+              f"{percentile(values, 50):>9.1f} {percentile(values, 99):>9.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time per phase in a trace written by the server")
+    parser.add_argument('trace')
+    args = parser.parse_args()
+    summarize(args.trace)
@@ -1,9 +1,13 @@
 UDP_PORT = 13122 # listening port for UDP offers (Hardcoded per instructions)
+PROBE_PORT = 13123  # servers listen here for discovery probes and answer with an offer
 BUFFER_SIZE = 1024
 MAGIC_COOKIE = 0xabcddcba
 MSG_TYPE_OFFER = 0x2     # Byte value indicating the packet is a Server Offer.
 MSG_TYPE_REQUEST = 0x3   # Byte value indicating the packet is a Client Request.
 MSG_TYPE_PAYLOAD = 0x4   # Byte value indicating the packet is a Game Payload (move/result).
+MSG_TYPE_AUTOPLAY = 0x5  # Byte value indicating a Request that carries a strategy for the server to play.
+MSG_TYPE_SUMMARY = 0x6   # Byte value indicating the win/loss/tie summary of an auto-played game.
+MSG_TYPE_PROBE = 0x7     # Byte value indicating a client's discovery probe, answered with an offer.
 
 CMD_HIT = "Hittt"
 CMD_STAND = "Stand"
@@ -11,4 +15,6 @@ CMD_STAND = "Stand"
 RESULT_ACTIVE = 0x0
 RESULT_TIE = 0x1
 RESULT_LOSS = 0x2
-RESULT_WIN = 0x3
\ No newline at end of file
+RESULT_WIN = 0x3
+RESULT_BUSY = 0x4     # Sent instead of a game when the server has no room; the connection is closed.
+RESULT_TIMEOUT = 0x5  # Sent when the client took too long to send a request or decision; the connection is closed.
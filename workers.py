@@ -0,0 +1,168 @@
+import argparse
+import multiprocessing
+import os
+import socket
+import threading
+import time
+from functools import partial
+from server import client_handler, tcp_accept_loop, start_offer_threads
+from server import SERVER_CAPACITY
+from rng import SHOE_POOL, worker_seed, master_seed_arg
+from timerwheel import TIMERS
+from utils import RESULT_TIE, RESULT_LOSS, RESULT_WIN
+
+# Columns of the shared counter table, one row per worker
+COUNTER_FIELDS = ('sessions', 'active', 'rounds', 'wins', 'losses', 'ties')
+RESULT_FIELDS = {RESULT_WIN: 'wins', RESULT_LOSS: 'losses', RESULT_TIE: 'ties'}
+
+REPORT_INTERVAL = 5.0  # seconds
+
+
+class SharedCounters:
+    """
+    A (workers x fields) table of unsigned counters in shared memory.
+
+    Every worker only writes its own row, so there is no cross-process lock;
+    the parent reads all rows and merges them into one view.
+    """
+
+    def __init__(self, num_workers: int):
+        self.num_workers = num_workers
+        self.table = multiprocessing.Array('Q', num_workers * len(COUNTER_FIELDS), lock=False)
+
+    def row(self, worker: int) -> 'WorkerCounters':
+        return WorkerCounters(self.table, worker * len(COUNTER_FIELDS))
+
+    def snapshot(self) -> list[dict]:
+        values = list(self.table)
+        width = len(COUNTER_FIELDS)
+        return [
+            dict(zip(COUNTER_FIELDS, values[w * width:(w + 1) * width]))
+            for w in range(self.num_workers)
+        ]
+
+    def merged(self) -> dict:
+        totals = dict.fromkeys(COUNTER_FIELDS, 0)
+        for row in self.snapshot():
+            for field, value in row.items():
+                totals[field] += value
+        return totals
+
+
+class WorkerCounters:
+    """
+    One worker's row of the shared table.
+    Handler threads inside the worker share it, so updates take a local lock.
+    """
+
+    def __init__(self, table, offset: int):
+        self.table = table
+        self.offset = offset
+        self.lock = threading.Lock()
+
+    def add(self, field: str, amount: int = 1):
+        index = self.offset + COUNTER_FIELDS.index(field)
+        with self.lock:
+            self.table[index] += amount
+
+    def record_round(self, result: int):
+        with self.lock:
+            self.table[self.offset + COUNTER_FIELDS.index('rounds')] += 1
+            field = RESULT_FIELDS.get(result)
+            if field:
+                self.table[self.offset + COUNTER_FIELDS.index(field)] += 1
+
+
+def counting_handler(counters: WorkerCounters, client_sock: socket.socket, client_addr):
+    counters.add('sessions')
+    counters.add('active')
+    try:
+        client_handler(client_sock, client_addr, on_round=counters.record_round)
+    finally:
+        counters.add('active', -1)
+
+
+def run_worker(index: int, tcp_port: int, server_name: str, counters: SharedCounters,
+               master_seed: int):
+    """
+    Entry point of one worker process.
+    Only worker 0 broadcasts UDP offers and answers probes, advertising the
+    load of all workers; every worker accepts on the shared port.
+    Each worker shuffles from its own seed (rng.worker_seed) and hands out
+    the session ids index, index + workers, ..., so ids stay unique across
+    workers.
+    """
+    if index == 0:
+        def load():
+            return counters.merged()['active'], SERVER_CAPACITY * counters.num_workers
+
+        start_offer_threads(tcp_port, server_name, load)
+
+    SHOE_POOL.start(worker_seed(master_seed, index), label=f"Worker {index} session",
+                    first_id=index, id_step=counters.num_workers)
+    TIMERS.start()
+    handler = partial(counting_handler, counters.row(index))
+    tcp_accept_loop(tcp_port, handler, reuse_port=True)
+
+
+def report_loop(counters: SharedCounters, interval: float):
+    """
+    Prints the merged counters and the total rounds/sec every interval.
+    """
+    last_rounds = 0
+    last_time = time.monotonic()
+    while True:
+        time.sleep(interval)
+        now = time.monotonic()
+        totals = counters.merged()
+        rate = (totals['rounds'] - last_rounds) / (now - last_time)
+        per_worker = ' '.join(str(row['rounds']) for row in counters.snapshot())
+        print(f"[workers] sessions={totals['sessions']} active={totals['active']} rounds={totals['rounds']} "
+              f"wins={totals['wins']} rounds/sec={rate:.1f} per-worker rounds=[{per_worker}]")
+        last_rounds, last_time = totals['rounds'], now
+
+
+def run_workers(num_workers: int, tcp_port: int, server_name: str,
+                report_interval: float = REPORT_INTERVAL, master_seed: int = None):
+    if not hasattr(socket, 'SO_REUSEPORT'):
+        raise RuntimeError("SO_REUSEPORT is not supported on this platform")
+
+    counters = SharedCounters(num_workers)
+    if master_seed is None:
+        master_seed = SHOE_POOL.master_seed
+    print(f"Workers RNG master seed: {master_seed}")
+    processes = [
+        multiprocessing.Process(
+            target=run_worker,
+            args=(i, tcp_port, server_name, counters, master_seed),
+            daemon=True
+        )
+        for i in range(num_workers)
+    ]
+    for proc in processes:
+        proc.start()
+
+    print(f"Started {num_workers} workers sharing TCP port {tcp_port}")
+
+    try:
+        report_loop(counters, report_interval)
+    except KeyboardInterrupt:
+        print("\nStopping workers.")
+    finally:
+        for proc in processes:
+            proc.terminate()
+        for proc in processes:
+            proc.join()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-process blackjack server")
+    parser.add_argument('--workers', type=int, default=os.cpu_count())
+    parser.add_argument('--port', type=int, default=2048)
+    parser.add_argument('--name', default="Chauncey Billups")
+    parser.add_argument('--report-interval', type=float, default=REPORT_INTERVAL)
+    parser.add_argument('--seed', type=master_seed_arg,
+                        help="master seed the workers' seeds derive from (default: random, printed)")
+    args = parser.parse_args()
+
+    run_workers(args.workers, args.port, args.name, args.report_interval, args.seed)